@@ -1,34 +1,81 @@
+import csv
+import os
 import re
+import sys
 
-def convert_oui():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.engine.oui import ENGINE_DIR, INDEX_PATH, VENDORS_TXT, build_index, parse_prefix, read_vendors_txt
+
+# IEEE registry downloads, any of which may be present in src/engine/, and
+# the block size (prefix bits) each one lists:
+#   oui.txt                  MA-L, "00-00-00   (hex)           XEROX CORPORATION"
+#   oui.csv, mam.csv, oui36.csv  MA-L/MA-M/MA-S, "Registry,Assignment,Organization Name,..."
+IEEE_SOURCES = {"oui.txt": 24, "oui.csv": 24, "mam.csv": 28, "oui36.csv": 36}
+
+def read_ieee(path):
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf8", errors="replace") as f:
+            for row in csv.DictReader(f):
+                yield row.get("Assignment", ""), (row.get("Organization Name") or "").strip()
+        return
+
+    pattern = re.compile(rb'([0-9A-F]{2}-[0-9A-F]{2}-[0-9A-F]{2})\s+\(hex\)\s+(.*)')
+    with open(path, "rb") as f:
+        for line in f:
+            match = pattern.search(line)
+            if match:
+                yield match.group(1).decode("utf8"), match.group(2).strip().decode("utf8", "replace")
+
+def convert_oui(engine_dir: str = ENGINE_DIR, vendors_txt: str = VENDORS_TXT):
+    """
+    Regenerates mac-vendors.txt from whichever IEEE files are present. Each
+    registry replaces only its own block size; entries of sizes with no
+    registry file here (e.g. MA-M and MA-S when only oui.csv was downloaded)
+    are kept from the existing file.
+    """
+    sources = [(os.path.join(engine_dir, name), bits) for name, bits in IEEE_SOURCES.items()]
+    sources = [(p, bits) for p, bits in sources if os.path.exists(p)]
+    if not sources:
+        print("No IEEE registry files found, keeping existing mac-vendors.txt.")
+        return
+
+    replaced = {bits for _, bits in sources}
+    entries = {}
+    if os.path.exists(vendors_txt):
+        for prefix, vendor in read_vendors_txt(vendors_txt):
+            parsed = parse_prefix(prefix)
+            if parsed and parsed[0] not in replaced:
+                entries[prefix.strip().upper()] = vendor
+    kept = len(entries)
+
+    for path, _ in sources:
+        for prefix, vendor in read_ieee(path):
+            if not vendor or not parse_prefix(prefix):
+                continue
+            # Sanitize prefix to 000000 / 0000000 / 000000000 (no separators, upper)
+            entries[prefix.replace("-", "").replace(":", "").upper()] = vendor
+
+    tmp = vendors_txt + ".tmp"
+    with open(tmp, "wb") as out:
+        for prefix, vendor in entries.items():
+            out.write(prefix.encode("utf8") + b":" + vendor.encode("utf8") + b"\n")
+    os.replace(tmp, vendors_txt)
+    print(f"Converted {len(entries) - kept} entries, kept {kept} for block sizes with no registry file.")
+
+def compile_index():
+    """Builds the binary longest-prefix index the scanner memory-maps."""
+    data = build_index(read_vendors_txt(VENDORS_TXT))
+    tmp = INDEX_PATH + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, INDEX_PATH)
+    print(f"Wrote {INDEX_PATH} ({len(data)} bytes).")
+
+if __name__ == "__main__":
     try:
-        with open("src/engine/oui.txt", "rb") as f:
-            content = f.read()
-            
-        with open("src/engine/mac-vendors.txt", "wb") as out:
-            # IEEE format: "00-00-00   (hex)           XEROX CORPORATION"
-            # Regex: ([0-9A-F]{2}-[0-9A-F]{2}-[0-9A-F]{2})\s+\(hex\)\s+(.*)
-            
-            pattern = re.compile(rb'([0-9A-F]{2}-[0-9A-F]{2}-[0-9A-F]{2})\s+\(hex\)\s+(.*)')
-            
-            count = 0
-            for line in content.splitlines():
-                match = pattern.search(line)
-                if match:
-                    # Sanitize prefix to 000000 (no separators, upper)
-                    raw_prefix = match.group(1).decode("utf8")
-                    vendor = match.group(2).strip()
-                    
-                    prefix = raw_prefix.replace("-", "").upper()
-                    
-                    # Library expects bytes line: prefix:vendor
-                    out.write(prefix.encode("utf8") + b":" + vendor + b"\n")
-                    count += 1
-                    
-        print(f"Converted {count} entries.")
-        
+        if "--index-only" not in sys.argv:
+            convert_oui()
+        compile_index()
     except Exception as e:
         print(f"Error: {e}")
-
-if __name__ == "__main__":
-    convert_oui()
+        sys.exit(1)
@@ -2,6 +2,22 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional, List, Set, Dict
 
+from src.events import EventBus, DeviceEventType
+from src.pending import PendingObservations
+
+def device_key(mac: str, segment: str = "") -> str:
+    """Store key of a device: the MAC itself on the default segment, "segment/MAC" elsewhere."""
+    return f"{segment}/{mac}" if segment else mac
+
+def split_key(key: str):
+    """Inverse of device_key: (segment, mac)."""
+    segment, _, mac = key.rpartition("/")
+    return segment, mac
+
+def ip_key(ip: str, segment: str = "") -> str:
+    """IP index key; VLANs may reuse the same address ranges."""
+    return f"{segment}/{ip}" if segment else ip
+
 class DeviceCategory(Enum):
     UNKNOWN = "Unknown"
     MOBILE = "Mobile"          # iPhone, Android
@@ -17,12 +33,14 @@ class Device:
     ip: str
     mac: str
     vendor: str = "Unknown"
+    segment: str = "" # Network segment (interface) it was seen on; "" is the primary one
     hostname: str = ""
     
     # Categorization
     category: DeviceCategory = DeviceCategory.UNKNOWN
     confidence: int = 0
     os_guess: str = ""
+    model: str = "" # "Manufacturer ModelName" from the UPnP description
     open_ports: List[int] = field(default_factory=list)
     mdns_services: List[str] = field(default_factory=list)
     
@@ -47,29 +65,123 @@ class Device:
     last_known_ip: str = "" # Persistent even if current IP is blank
     last_seen: float = 0.0
 
-    def to_dict(self):
-        return {
+    # Identity (see src/identity.py)
+    logical_id: str = "" # Stable ID shared by all MACs of one physical device
+    fingerprints: Dict[str, str] = field(default_factory=dict) # Passive signals, e.g. "dhcp", "tls", "tcp"
+
+    # Seqlock for the traffic counters: odd while the sniffer is mid-update
+    _seq = 0
+    # Bumped whenever an identity signal (hostname, mDNS, fingerprints, domains) changes
+    _signals_rev = 0
+
+    @property
+    def key(self) -> str:
+        return device_key(self.mac, self.segment)
+
+    def add_traffic(self, up: int = 0, down: int = 0):
+        """Single-writer counter update (capture thread only)."""
+        self._seq += 1
+        self.total_up += up
+        self.total_down += down
+        self._seq += 1
+
+    def counters(self):
+        """Lock-free consistent (total_up, total_down) read; retries if a write was in flight."""
+        while True:
+            seq = self._seq
+            up, down = self.total_up, self.total_down
+            if seq % 2 == 0 and seq == self._seq:
+                return up, down
+
+    def __getattr__(self, name):
+        # Only reached for missing attributes: cold fields of a device loaded
+        # from a binary snapshot are decoded on first access.
+        from src.snapshot import COLD_FIELDS
+        if name not in COLD_FIELDS:
+            raise AttributeError(name)
+        self._decode_cold()
+        if name in self.__dict__:
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        # Assigning a cold field of an undecoded device decodes the rest first,
+        # so cold_blob() can't hand the stale snapshot bytes to the next save
+        if "_cold" in self.__dict__:
+            from src.snapshot import COLD_FIELDS
+            if name in COLD_FIELDS:
+                self._decode_cold()
+        object.__setattr__(self, name, value)
+
+    def _decode_cold(self):
+        blob = self.__dict__.get("_cold")
+        if blob is None:
+            return # Another thread finished decoding between our lookup and here
+        import json
+        from src.snapshot import COLD_FIELDS
+        values = json.loads(blob) if blob else {}
+        # Fields first, blob last: a concurrent reader always finds one or the other
+        for key, factory in COLD_FIELDS.items():
+            self.__dict__.setdefault(key, values.get(key) or factory())
+        self.__dict__.pop("_cold", None)
+
+    def signals_changed(self):
+        """Tells IdentityResolver.refresh() to re-resolve this device."""
+        self._signals_rev += 1
+
+    def cold_value(self, name: str):
+        """A cold field's value without decoding the blob into the device (read-only scans)."""
+        blob = self.__dict__.get("_cold")
+        if blob is None:
+            return getattr(self, name)
+        import json
+        from src.snapshot import COLD_FIELDS
+        return (json.loads(blob) if blob else {}).get(name) or COLD_FIELDS[name]()
+
+    @property
+    def cold_decoded(self) -> bool:
+        """False while the cold fields are still the undecoded snapshot blob."""
+        return "_cold" not in self.__dict__
+
+    def cold_blob(self) -> bytes:
+        """Encoded cold fields, reusing the raw snapshot bytes if never decoded."""
+        blob = self.__dict__.get("_cold")
+        if blob is not None:
+            return blob
+        from src.snapshot import encode_cold
+        return encode_cold(self.to_dict())
+
+    def to_dict(self, include_cold: bool = True):
+        data = {
             "ip": self.ip,
             "mac": self.mac,
+            "segment": self.segment,
             "vendor": self.vendor,
             "hostname": self.hostname,
             "category": self.category.value,
             "confidence": self.confidence,
             "os_guess": self.os_guess,
-            "open_ports": self.open_ports,
-            "mdns_services": self.mdns_services,
+            "model": self.model,
             "total_up": self.total_up,
             "total_down": self.total_down,
-            "history_up": self.history_up,
-            "history_down": self.history_down,
-            "domains": self.domains,
             "last_sni": self.last_sni,
             "is_blocked": self.is_blocked,
             "schedule_start": self.schedule_start,
             "schedule_end": self.schedule_end,
             "last_known_ip": self.last_known_ip,
-            "last_seen": self.last_seen
+            "last_seen": self.last_seen,
+            "logical_id": self.logical_id
         }
+        if include_cold:
+            data.update({
+                "open_ports": list(self.open_ports),
+                "mdns_services": list(self.mdns_services),
+                "history_up": list(self.history_up),
+                "history_down": list(self.history_down),
+                "domains": list(self.domains),
+                "fingerprints": dict(self.fingerprints),
+            })
+        return data
 
     @classmethod
     def from_dict(cls, data):
@@ -82,11 +194,13 @@ class Device:
         dev = cls(
             ip=data.get("ip", ""),
             mac=data.get("mac", ""),
+            segment=data.get("segment", ""),
             vendor=data.get("vendor", "Unknown"),
             hostname=data.get("hostname", ""),
             category=cat,
             confidence=data.get("confidence", 0),
             os_guess=data.get("os_guess", ""),
+            model=data.get("model", ""),
             open_ports=data.get("open_ports", []),
             mdns_services=data.get("mdns_services", []),
             total_up=data.get("total_up", 0),
@@ -99,114 +213,423 @@ class Device:
             schedule_start=data.get("schedule_start", ""),
             schedule_end=data.get("schedule_end", ""),
             last_known_ip=data.get("last_known_ip", ""),
-            last_seen=data.get("last_seen", 0.0)
+            last_seen=data.get("last_seen", 0.0),
+            logical_id=data.get("logical_id", ""),
+            fingerprints=data.get("fingerprints", {})
         )
+        if data.get("_cold") is not None:
+            # Defer decoding of cold fields until something reads them
+            from src.snapshot import COLD_FIELDS
+            for key in COLD_FIELDS:
+                del dev.__dict__[key]
+            dev.__dict__["_cold"] = data["_cold"]
         return dev
 
+class StoreView:
+    """
+    Immutable, versioned view of the store. Writers build a new view after
+    every structural change (device added/removed, IP moved) and publish it
+    with a single attribute assignment, so readers never take a lock.
+    The Device objects themselves are shared; see Device.counters().
+    """
+    __slots__ = ("version", "devices", "by_ip")
+
+    def __init__(self, version: int, devices: Dict[str, Device], by_ip: Dict[str, str]):
+        from types import MappingProxyType
+        self.version = version
+        self.devices = MappingProxyType(devices) # device_key -> Device
+        self.by_ip = MappingProxyType(by_ip) # ip_key -> device_key of its current owner
+
 class DeviceStore:
     def __init__(self, settings_manager=None):
         import threading
-        self.devices: Dict[str, Device] = {} # Keyed by MAC
-        self.lock = threading.Lock()
+        self.devices: Dict[str, Device] = {} # Keyed by device_key (writer side, guarded by lock)
+        self._by_ip: Dict[str, str] = {} # ip_key -> device_key
+        self.lock = threading.Lock() # Serializes writers only
+        self.view = StoreView(0, {}, {})
         self.settings = settings_manager # Reference to global settings
+        self.storage = None # DeviceStorage, attached by load_from_file/save_to_file
+        self._dirty: Set[str] = set() # MACs changed since the last flush; never replaced, see _take_dirty
+        self._persist_lock = threading.RLock() # Serializes flush() and save_to_file() end to end
+        self.events = EventBus() # Typed change notifications for push-based consumers
+        self.pending = PendingObservations() # Discovery data waiting for its IP to be bound
+        self.loaded = threading.Event() # Set once persisted devices are in memory
+        self._loading = False
+        self.load_stats = {}
+
+    def _publish(self):
+        """Publishes a fresh view. Caller holds self.lock."""
+        self.view = StoreView(self.view.version + 1, dict(self.devices), dict(self._by_ip))
+
+    def _set_ip(self, dev: Device, ip: str):
+        """Moves a device to a new IP, keeping the IP index in step. Caller holds self.lock."""
+        if dev.ip and self._by_ip.get(ip_key(dev.ip, dev.segment)) == dev.key:
+            del self._by_ip[ip_key(dev.ip, dev.segment)]
+        dev.ip = ip
+        if ip:
+            self._by_ip[ip_key(ip, dev.segment)] = dev.key
+
+    def mark_dirty(self, mac: str):
+        """Flags a device for the next incremental flush. Cheap enough for per-packet use."""
+        self._dirty.add(mac)
+
+    def _take_dirty(self) -> Set[str]:
+        """
+        Empties the dirty set and returns its keys. The set is drained with
+        atomic pop() calls rather than swapped out, so a lock-free
+        mark_dirty() racing with a flush lands either here or in the next one.
+        """
+        taken = set()
+        while True:
+            try:
+                taken.add(self._dirty.pop())
+            except KeyError:
+                return taken
+
+    def get(self, mac: str) -> Optional[Device]:
+        return self.view.devices.get(mac)
 
-    def add_or_update(self, ip: str, mac: str, vendor: str = None):
+    def get_by_ip(self, ip: str, segment: str = "") -> Optional[Device]:
+        """O(1) lookup of the device currently holding an IP on a segment."""
+        view = self.view
+        key = view.by_ip.get(ip_key(ip, segment))
+        return view.devices.get(key) if key else None
+
+    def add_or_update(self, ip: str, mac: str, vendor: str = None, segment: str = ""):
         now = __import__("time").time()
+        events = [] # Published after the lock is released
+        key = device_key(mac, segment)
         
         with self.lock:
+            structural = False
             # IP Conflict Resolution: 
             # If this IP is already owned by a DIFFERENT mac, we only take it 
             # if the other mac hasn't been seen for a significant window (e.g. 30s)
-            for existing_mac, dev in self.devices.items():
-                if dev.ip == ip and existing_mac != mac:
-                    # If the existing device was seen very recently (last 30s),
-                    # we don't steal the IP yet. This prevents flickering.
-                    if now - dev.last_seen < 30:
-                        # Continue - let the existing one keep the IP for now
-                        pass 
-                    else:
-                        dev.ip = "" # Clear stale IP since it's "old enough"
+            owner_key = self._by_ip.get(ip_key(ip, segment)) if ip else None
+            owner = self.devices.get(owner_key) if owner_key and owner_key != key else None
+            if owner is not None and now - owner.last_seen >= 30:
+                # Clear stale IP since it's "old enough"
+                self._set_ip(owner, "")
+                structural = True
+                events.append((DeviceEventType.IP_CHANGED, owner.key, {"old_ip": ip, "ip": ""}))
+                owner = None
+            # If the existing device was seen very recently (last 30s),
+            # we don't steal the IP yet. This prevents flickering.
+            active_owner = owner is not None
             
-            if mac in self.devices:
-                dev = self.devices[mac]
+            if key in self.devices:
+                dev = self.devices[key]
                 # Only take the IP if no one else is currently "locking" it
-                active_owner = any(d.ip == ip and d.mac != mac and (now - d.last_seen < 30) for d in self.devices.values())
                 if not active_owner:
-                    dev.ip = ip
+                    if dev.ip != ip:
+                        events.append((DeviceEventType.IP_CHANGED, key, {"old_ip": dev.ip, "ip": ip}))
+                        self._set_ip(dev, ip)
+                        structural = True
                     if ip: dev.last_known_ip = ip
                 
                 dev.last_seen = now
-                if vendor and (dev.vendor == "Unknown" or dev.vendor == "Private/Random"):
+                if vendor and (dev.vendor == "Unknown" or dev.vendor == "Private/Random") and dev.vendor != vendor:
                     dev.vendor = vendor
+                    events.append((DeviceEventType.VENDOR_CHANGED, key, {"vendor": vendor}))
+                self._dirty.add(key)
             else:
                 # Only assign IP if not active elsewhere
-                active_owner = any(d.ip == ip and (now - d.last_seen < 30) for d in self.devices.values())
                 assigned_ip = ip if not active_owner else ""
                 
                 # Check Paranoid Mode (Auto-Block)
                 is_blocked = False
                 if self.settings and self.settings.get("paranoid_mode", False):
                     is_blocked = True
-                    __import__("logging").info(f"PARANOID MODE: Auto-blocking new device {mac}")
+                    __import__("logging").info(f"PARANOID MODE: Auto-blocking new device {key}")
 
-                self.devices[mac] = Device(
-                    ip=assigned_ip, 
+                dev = Device(
+                    ip="", 
                     mac=mac, 
+                    segment=segment,
                     vendor=vendor or "Unknown",
                     last_known_ip=assigned_ip,
                     last_seen=now,
                     is_blocked=is_blocked
                 )
-            return self.devices[mac]
+                self.devices[key] = dev
+                self._set_ip(dev, assigned_ip)
+                structural = True
+                self._dirty.add(key)
+                events.append((DeviceEventType.ADDED, key, {"ip": assigned_ip, "vendor": vendor or "Unknown"}))
+            if structural:
+                self._publish()
+
+        for event_type, event_mac, data in events:
+            self.events.emit(event_type, event_mac, **data)
+        if dev.ip and self.pending:
+            self._merge_pending(dev)
+        return dev
+
+    def buffer_discovery(self, ip: str, hostname: str = None, service: str = None, segment: str = ""):
+        """Holds discovery data for an IP no device owns yet; merged when add_or_update binds it."""
+        self.pending.add(ip_key(ip, segment), hostname=hostname, service=service)
+        dev = self.get_by_ip(ip, segment)
+        if dev is not None: # Bound while we were buffering
+            self._merge_pending(dev)
+
+    def _merge_pending(self, dev: Device):
+        buffered = self.pending.take(ip_key(dev.ip, dev.segment))
+        if buffered is None:
+            return
+        hostname, services = buffered
+        self.update_discovery_info(dev.key, hostname=hostname)
+        for service in services:
+            self.update_discovery_info(dev.key, service=service)
 
     def cleanup_stale_devices(self, threshold_seconds: float):
         """Clears IP for devices not seen in the last X seconds to mark them as stale."""
         now = __import__("time").time()
+        # Cheap lock-free pass first; most ticks find nothing to do
+        if not any(d.ip and now - d.last_seen > threshold_seconds for d in self.view.devices.values()):
+            return
+        stale = []
         with self.lock:
             for dev in self.devices.values():
                 if dev.ip and (now - dev.last_seen > threshold_seconds):
-                    __import__("logging").info(f"Marking device {dev.mac} ({dev.ip}) as stale due to inactivity timeout.")
-                    dev.ip = ""
+                    __import__("logging").info(f"Marking device {dev.key} ({dev.ip}) as stale due to inactivity timeout.")
+                    stale.append((dev.key, dev.ip))
+                    self._set_ip(dev, "")
+                    self._dirty.add(dev.key)
+            if stale:
+                self._publish()
+        for mac, old_ip in stale:
+            self.events.emit(DeviceEventType.STALE, mac, old_ip=old_ip)
 
-    def get_all(self) -> List[Device]:
+    # Attribute setters below don't change the view's shape, so they run
+    # without the writer lock and are safe to call from the event loop.
+    # Their `mac` is the device key (see device_key), i.e. Device.key.
+
+    def set_blocked(self, mac: str, blocked: bool) -> Optional[Device]:
+        """Sets the manual block flag and publishes BLOCKED/UNBLOCKED. Returns None for unknown MACs."""
+        dev = self.get(mac)
+        if dev is None:
+            return None
+        changed = dev.is_blocked != blocked
+        dev.is_blocked = blocked
+        self._dirty.add(mac)
+        if changed:
+            self.events.emit(DeviceEventType.BLOCKED if blocked else DeviceEventType.UNBLOCKED, mac, ip=dev.ip)
+        return dev
+
+    def set_schedule(self, mac: str, start: str, end: str) -> Optional[Device]:
+        dev = self.get(mac)
+        if dev is None:
+            return None
+        if (dev.schedule_start, dev.schedule_end) != (start, end):
+            dev.schedule_start = start
+            dev.schedule_end = end
+            self._dirty.add(mac)
+            self.events.emit(DeviceEventType.ATTRIBUTES_CHANGED, mac, fields=["schedule_start", "schedule_end"])
+        return dev
+
+    def set_classification(self, mac: str, category: "DeviceCategory", confidence: int) -> bool:
+        """Stores a classifier result; publishes CLASSIFIED only when it actually changed."""
+        dev = self.get(mac)
+        if dev is None or (dev.category == category and dev.confidence == confidence):
+            return False
+        old = dev.category
+        dev.category = category
+        dev.confidence = confidence
+        self._dirty.add(mac)
+        self.events.emit(DeviceEventType.CLASSIFIED, mac, category=category.value, old_category=old.value, confidence=confidence)
+        return True
+
+    def update_discovery_info(self, mac: str, hostname: str = None, service: str = None, max_services: int = 10) -> List[str]:
+        """
+        Records a discovered hostname (first one wins) and service name.
+        Publishes ATTRIBUTES_CHANGED listing the fields that actually changed.
+        """
+        dev = self.get(mac)
+        if dev is None:
+            return []
+        changed = []
+        if hostname and not dev.hostname:
+            dev.hostname = hostname
+            changed.append("hostname")
+        if service and service not in dev.mdns_services:
+            dev.mdns_services.append(service)
+            if len(dev.mdns_services) > max_services:
+                dev.mdns_services.pop(0)
+            changed.append("mdns_services")
+        if changed:
+            dev.signals_changed()
+            self._dirty.add(mac)
+            self.events.emit(DeviceEventType.ATTRIBUTES_CHANGED, mac, fields=changed)
+        return changed
+
+    def set_os_guess(self, mac: str, os_guess: str) -> bool:
+        """Stores a passive OS inference; publishes ATTRIBUTES_CHANGED when it changed."""
+        dev = self.get(mac)
+        if dev is None or dev.os_guess == os_guess:
+            return False
+        dev.os_guess = os_guess
+        self._dirty.add(mac)
+        self.events.emit(DeviceEventType.ATTRIBUTES_CHANGED, mac, fields=["os_guess"])
+        return True
+
+    def set_model(self, mac: str, model: str) -> bool:
+        """Stores the UPnP manufacturer/model; publishes ATTRIBUTES_CHANGED when it changed."""
+        dev = self.get(mac)
+        if dev is None or dev.model == model:
+            return False
+        dev.model = model
+        self._dirty.add(mac)
+        self.events.emit(DeviceEventType.ATTRIBUTES_CHANGED, mac, fields=["model"])
+        return True
+
+    def set_open_ports(self, mac: str, ports: List[int]) -> bool:
+        """Stores probe results; publishes ATTRIBUTES_CHANGED when the port set changed."""
+        dev = self.get(mac)
+        if dev is None or list(dev.open_ports) == list(ports):
+            return False
+        dev.open_ports = list(ports)
+        self._dirty.add(mac)
+        self.events.emit(DeviceEventType.ATTRIBUTES_CHANGED, mac, fields=["open_ports"])
+        return True
+
+    def remove_devices(self, macs: List[str]) -> List[Device]:
+        """Drops devices from the store; the next flush journals their deletion."""
+        removed = []
         with self.lock:
-            return list(self.devices.values())
+            for mac in macs:
+                dev = self.devices.pop(mac, None)
+                if dev is not None:
+                    if dev.ip and self._by_ip.get(ip_key(dev.ip, dev.segment)) == mac:
+                        del self._by_ip[ip_key(dev.ip, dev.segment)]
+                    removed.append(dev)
+                    self._dirty.add(mac)
+            if removed:
+                self._publish()
+        for dev in removed:
+            self.events.emit(DeviceEventType.REMOVED, dev.key, ip=dev.ip)
+        return removed
+
+    def get_all(self) -> List[Device]:
+        return list(self.view.devices.values())
             
-    def get_snapshot(self) -> Dict[str, Device]:
-        """Returns a snapshot of the devices dict for safe iteration outside locks."""
-        with self.lock:
-            return self.devices.copy()
+    def get_snapshot(self):
+        """Returns the current read-only MAC -> Device mapping; safe to iterate without locks."""
+        return self.view.devices
+
+    def _attach_storage(self, filename: str):
+        from src.storage import DeviceStorage
+        if self.storage is None or self.storage.filename != filename:
+            self.storage = DeviceStorage(filename)
+        return self.storage
+
+    def flush(self):
+        """
+        Appends devices changed since the last flush to the storage journal.
+        Write cost scales with the number of dirty devices, not the store size.
+        """
+        import logging
+        if self.storage is None or self._loading:
+            # Journaling half-built devices mid-load would shadow persisted state
+            return
+        if not self._dirty:
+            return
+        # Held across take, encode and append so a concurrent save_to_file()
+        # can't snapshot an older view and then truncate these entries away
+        with self._persist_lock:
+            dirty = self._take_dirty()
+            # Serialize from the published view so writers aren't held up
+            devices = self.view.devices
+            changes = {mac: (devices[mac].to_dict() if mac in devices else None) for mac in dirty}
+            live = len(devices)
+            try:
+                self.storage.append(changes)
+            except Exception as e:
+                logging.error(f"Failed to flush devices: {e}")
+                self._dirty.update(dirty)
+                return
+
+            if self.storage.needs_compaction(live):
+                self.save_to_file(self.storage.filename)
 
     def save_to_file(self, filename: str):
-        import json
+        """Writes a full binary snapshot atomically, compacting away the journal."""
         import logging
-        try:
-            data = {mac: dev.to_dict() for mac, dev in self.devices.items()}
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
-            logging.info(f"Saved {len(data)} devices to {filename}")
-        except Exception as e:
-            logging.error(f"Failed to save devices: {e}")
+        from src import snapshot
+        with self._persist_lock:
+            storage = self._attach_storage(filename)
+            # Taken before the view is read: later changes stay dirty for the next flush
+            self._take_dirty()
+            devices = self.view.devices
+            try:
+                count = len(devices)
+                data = snapshot.encode(devices.values())
+                storage.compact(data)
+                logging.info(f"Saved {count} devices to {storage.snapshot_path}")
+            except Exception as e:
+                logging.error(f"Failed to save devices: {e}")
+                self._dirty.update(devices.keys()) # Retry through the journal
 
     def load_from_file(self, filename: str):
-        import json
+        """
+        Loads persisted devices and merges them into the store. Devices that
+        engines already added since startup keep their live IP and last_seen.
+        """
         import logging
-        import os
-        if not os.path.exists(filename):
-            return
-            
+        import time
+        started = time.time()
+        storage = self._attach_storage(filename)
+        count = 0
         try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-                
-            count = 0
+            data = storage.load()
+            loaded = {}
             for mac, dev_data in data.items():
                 try:
-                    self.devices[mac] = Device.from_dict(dev_data)
-                    count += 1
+                    loaded[mac] = Device.from_dict(dev_data)
                 except Exception as e:
                     logging.error(f"Error loading device {mac}: {e}")
-                    
-            logging.info(f"Loaded {count} devices from {filename}")
+
+            with self.lock:
+                for mac, dev in loaded.items():
+                    live = self.devices.get(mac)
+                    if live:
+                        dev.ip = live.ip
+                        dev.last_known_ip = live.last_known_ip or dev.last_known_ip
+                        dev.last_seen = max(dev.last_seen, live.last_seen)
+                        dev.total_up += live.total_up
+                        dev.total_down += live.total_down
+                        if live.vendor != "Unknown":
+                            dev.vendor = live.vendor
+                        self._dirty.add(mac)
+                    elif dev.ip and self._by_ip.get(ip_key(dev.ip, dev.segment), mac) != mac:
+                        dev.ip = "" # Someone live holds this IP now
+                    self.devices[mac] = dev
+                    if dev.ip:
+                        self._by_ip[ip_key(dev.ip, dev.segment)] = mac
+                    count += 1
+                self._publish()
+
+            logging.info(f"Loaded {count} devices from {filename} ({storage.journal_records} journal entries)")
+            if storage.needs_migration:
+                logging.info(f"Migrating legacy {filename} to binary snapshot {storage.snapshot_path}")
+                self.save_to_file(filename)
         except Exception as e:
             logging.error(f"Failed to load devices: {e}")
+        finally:
+            self.load_stats = {"devices": count, "seconds": round(time.time() - started, 3)}
+            self._loading = False
+            self.loaded.set()
+
+    def load_in_background(self, filename: str, phase=None):
+        """
+        Starts load_from_file on a daemon thread; `loaded` is set once it
+        finishes. `phase` is an optional context manager wrapped around the
+        load (startup profiling).
+        """
+        import contextlib
+        import threading
+        self.loaded.clear()
+        self._loading = True
+        def load():
+            with phase or contextlib.nullcontext():
+                self.load_from_file(filename)
+        threading.Thread(target=load, daemon=True).start()
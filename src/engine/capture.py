@@ -0,0 +1,523 @@
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Tuple
+
+from src.device_store import Device, DeviceStore, ip_key
+from src.events import DeviceEventType
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("=III4x") # slots ever used (high-water mark), capacity, updates dropped when full
+SLOT = struct.Struct("=I4x48sQQd") # seq, device key, bytes up, bytes down, last seen
+SEQ = struct.Struct("=I")
+COUNTERS = struct.Struct("=QQd")
+KEY_OFFSET = 8
+COUNTERS_OFFSET = KEY_OFFSET + 48
+
+class CounterTable:
+    """
+    Per-device traffic counters in shared memory.
+
+    The capture process is the only writer: it assigns a slot per device
+    key and updates it under a per-slot seqlock (odd while mid-write), the
+    same scheme as Device.counters(). Slots of removed devices are blanked
+    and reused. The web process scans the used slots without any locking
+    or syscalls. Updates for new keys while every slot is taken are dropped
+    and counted in the header's overflow field.
+    """
+    def __init__(self, slots: int = 4096, name: str = None):
+        size = HEADER.size + slots * SLOT.size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, 0, slots, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.capacity = HEADER.unpack_from(self.shm.buf, 0)[1]
+        self.index: Dict[str, int] = {} # Writer side: key -> slot
+        self.free_slots: List[int] = [] # Writer side: blanked slots to reuse
+
+    def used(self) -> int:
+        return min(HEADER.unpack_from(self.shm.buf, 0)[0], self.capacity)
+
+    @property
+    def overflow(self) -> int:
+        return HEADER.unpack_from(self.shm.buf, 0)[2]
+
+    def _offset(self, slot: int) -> int:
+        return HEADER.size + slot * SLOT.size
+
+    def add(self, key: str, up: int = 0, down: int = 0, last_seen: float = 0.0):
+        """Writer only. Adds to the key's counters, taking a new slot on first use."""
+        slot = self.index.get(key)
+        buf = self.shm.buf
+        if slot is None:
+            used, capacity, overflow = HEADER.unpack_from(buf, 0)
+            if self.free_slots:
+                slot = self.index[key] = self.free_slots.pop()
+                self._write_slot(slot, key)
+            elif used < capacity:
+                slot = self.index[key] = used
+                SLOT.pack_into(buf, self._offset(slot), 0, key.encode()[:48], 0, 0, 0.0)
+                HEADER.pack_into(buf, 0, used + 1, capacity, overflow) # Publish only once the key is in place
+            else:
+                if not overflow:
+                    logger.warning(f"Counter table full ({capacity} devices); traffic of new devices is not counted")
+                HEADER.pack_into(buf, 0, used, capacity, overflow + 1)
+                return
+        offset = self._offset(slot)
+        seq = SEQ.unpack_from(buf, offset)[0]
+        total_up, total_down, _ = COUNTERS.unpack_from(buf, offset + COUNTERS_OFFSET)
+        SEQ.pack_into(buf, offset, seq + 1)
+        COUNTERS.pack_into(buf, offset + COUNTERS_OFFSET, total_up + up, total_down + down, last_seen)
+        SEQ.pack_into(buf, offset, seq + 2)
+
+    def free(self, key: str):
+        """Writer only. Blanks the key's slot (its device was removed) for reuse."""
+        slot = self.index.pop(key, None)
+        if slot is not None:
+            self._write_slot(slot, "")
+            self.free_slots.append(slot)
+
+    def _write_slot(self, slot: int, key: str):
+        # Key and counters change together under the seqlock, so a reader never
+        # sees one device's totals under another's key
+        buf, offset = self.shm.buf, self._offset(slot)
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, seq + 1)
+        SLOT.pack_into(buf, offset, seq + 1, key.encode()[:48], 0, 0, 0.0)
+        SEQ.pack_into(buf, offset, seq + 2)
+
+    def read(self) -> Iterator[Tuple[str, int, int, float]]:
+        """Reader side: (key, up, down, last_seen) per used slot, each read consistently."""
+        buf = self.shm.buf
+        for slot in range(self.used()):
+            offset = self._offset(slot)
+            for _ in range(100): # Bounded: a writer killed mid-update leaves the seq odd
+                seq, key, up, down, last_seen = SLOT.unpack_from(buf, offset)
+                if seq % 2 == 0 and seq == SEQ.unpack_from(buf, offset)[0]:
+                    if key[:1] != b"\x00": # Blank: freed and not reused yet
+                        yield key.rstrip(b"\x00").decode(), up, down, last_seen
+                    break
+
+    def close(self, unlink: bool = False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class ReplicaStore(DeviceStore):
+    """
+    The capture process's copy of the devices on its segment. The web
+    process pushes the fields spoofing decisions need (IP, block flag,
+    schedule); store writes made by the monitor are mirrored back as events.
+    """
+    def __init__(self, outbox):
+        super().__init__()
+        self.outbox = outbox
+
+    def apply(self, data: dict):
+        incoming = Device.from_dict(data)
+        with self.lock:
+            dev = self.devices.get(incoming.key)
+            if dev is None:
+                dev, ip = incoming, incoming.ip
+                dev.ip = ""
+                self.devices[dev.key] = dev
+            else:
+                ip = incoming.ip
+                dev.is_blocked = incoming.is_blocked
+                dev.schedule_start, dev.schedule_end = incoming.schedule_start, incoming.schedule_end
+            if dev.ip != ip:
+                self._set_ip(dev, ip)
+            self._publish()
+
+    def remove(self, key: str):
+        with self.lock:
+            dev = self.devices.pop(key, None)
+            if dev is not None:
+                if dev.ip and self._by_ip.get(ip_key(dev.ip, dev.segment)) == key:
+                    del self._by_ip[ip_key(dev.ip, dev.segment)]
+                self._publish()
+
+    def add_or_update(self, ip: str, mac: str, vendor: str = None, segment: str = ""):
+        dev = super().add_or_update(ip, mac, vendor, segment)
+        self.outbox.send(("seen", ip, mac, vendor))
+        return dev
+
+    def update_discovery_info(self, mac: str, hostname: str = None, service: str = None):
+        changed = super().update_discovery_info(mac, hostname=hostname, service=service)
+        if changed:
+            self.outbox.send(("discovery", mac, hostname, service))
+        return changed
+
+    def set_os_guess(self, mac: str, os_guess: str) -> bool:
+        if not super().set_os_guess(mac, os_guess):
+            return False
+        self.outbox.send(("os", mac, os_guess))
+        return True
+
+class Outbox:
+    """Thread-safe sender: the sniffer and spoofing threads share one pipe end."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            self.conn.send(message)
+
+def _child_monitor_class():
+    # Scapy is only imported in the capture process
+    from src.engine.monitor import BandwidthMonitor
+
+    class ChildMonitor(BandwidthMonitor):
+        """BandwidthMonitor whose per-packet results go to shared memory and the pipe."""
+        def __init__(self, device_store, table: CounterTable, outbox: Outbox, **kwargs):
+            super().__init__(device_store, **kwargs)
+            self.table = table
+            self.outbox = outbox
+
+        def _record_traffic(self, dev, up: int = 0, down: int = 0):
+            self.table.add(dev.key, up, down, time.time())
+
+        def _record_domain(self, dev, domain: str):
+            if domain != dev.last_sni or domain not in dev.domains:
+                self.outbox.send(("domain", dev.key, domain))
+            super()._record_domain(dev, domain)
+
+        def _record_fingerprint(self, dev, kind: str, value: str):
+            if dev.fingerprints.get(kind) != value:
+                self.outbox.send(("fingerprint", dev.key, kind, value))
+            super()._record_fingerprint(dev, kind, value)
+
+        def _record_ipv6(self, mac: str, address: str):
+            super()._record_ipv6(mac, address)
+            self.outbox.send(("ipv6", mac, address))
+
+        def _record_restore(self, progress):
+            super()._record_restore(progress)
+            self.outbox.send(("restore", progress.to_dict()))
+
+    return ChildMonitor
+
+def capture_main(conn, table_name: str, config: dict):
+    """Entry point of the capture process."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - capture - %(levelname)s - %(message)s')
+    parent = os.getppid()
+    table = CounterTable(name=table_name)
+    outbox = Outbox(conn)
+    store = ReplicaStore(outbox)
+    monitor = _child_monitor_class()(store, table, outbox, gateway_ip=config["gateway_ip"],
+                                     interface=config["interface"], segment=config["segment"])
+    monitor.host_ip = config.get("host_ip")
+    monitor.daemon = True
+    monitor.start()
+
+    try:
+        while monitor.running:
+            if not conn.poll(1.0):
+                if os.getppid() != parent:
+                    break # Web process is gone; don't keep poisoning the network
+                continue
+            message = conn.recv()
+            kind = message[0]
+            if kind == "device":
+                store.apply(message[1])
+            elif kind == "remove":
+                store.remove(message[1])
+                table.free(message[1])
+            elif kind == "target":
+                (monitor.enable_monitoring if message[2] else monitor.disable_monitoring)(message[1])
+            elif kind == "set":
+                setattr(monitor, message[1], message[2])
+            elif kind == "ipv6":
+                monitor.ipv6_targets[message[1]] = message[2]
+            elif kind == "unblock":
+                threading.Thread(target=monitor.unblock_target, args=(message[1],), daemon=True).start()
+            elif kind == "stop":
+                break
+    except (EOFError, OSError):
+        pass
+    finally:
+        monitor.running = False
+        monitor.join(timeout=2.0)
+        table.close()
+
+class CaptureProcess(threading.Thread):
+    """
+    Runs a group's BandwidthMonitor (sniffing and spoofing) in a child
+    process, so per-packet work no longer competes with the API for the GIL.
+
+    This thread is the web-process stand-in for the monitor: it has the
+    same control surface (targets, gateway_ip, host_ip, global_kill_switch,
+    ipv6_targets, unblock_target), forwards it over a pipe, replays the
+    segment's devices to the child, applies the child's events (new MACs,
+    domains, fingerprints, OS guesses) to the store and folds the shared
+    counters into devices every `poll_interval`. A crashed child is
+    restarted with backoff on a fresh counter table.
+
+    The child is started with "spawn": forking a process that already runs
+    threads could inherit locks held mid-operation.
+    """
+    BACKOFF = (1, 2, 5, 10, 30) # Seconds before restart n (last value repeats)
+    STORE_EVENTS = [DeviceEventType.ADDED, DeviceEventType.IP_CHANGED, DeviceEventType.BLOCKED,
+                    DeviceEventType.UNBLOCKED, DeviceEventType.ATTRIBUTES_CHANGED, DeviceEventType.REMOVED]
+
+    def __init__(self, device_store, gateway_ip: str, interface: str = None, segment: str = "",
+                 slots: int = 4096, poll_interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.device_store = device_store
+        self.interface = interface
+        self.segment = segment
+        self.slots = slots
+        self.poll_interval = poll_interval
+        self.targets = set()
+        self.ipv6_targets = {} # Shared with the scanner like BandwidthMonitor's; synced to the child
+        self._sent_ipv6 = {}
+        self._settings = {"gateway_ip": gateway_ip, "host_ip": None, "global_kill_switch": False}
+        self.running = True
+        self.process = None
+        self.conn = None
+        self.table = None
+        self._baseline = {} # key -> (up, down) already folded in from the current table
+        self._replayed_loaded = False
+        self.starts = 0
+        self.restarts = 0
+        self.last_exit_code = None
+        self.events_received = 0
+        self.host_mac = None
+        self.restores = collections.deque(maxlen=16) # Restoration results as dicts, from either process
+        self.lock = threading.Lock()
+
+    # Monitor control surface
+
+    def _setting(name):
+        def get(self):
+            return self._settings[name]
+        def set(self, value):
+            self._settings[name] = value
+            self._send(("set", name, value))
+        return property(get, set)
+
+    gateway_ip = _setting("gateway_ip")
+    host_ip = _setting("host_ip")
+    global_kill_switch = _setting("global_kill_switch")
+    del _setting
+
+    def enable_monitoring(self, target_ip: str):
+        with self.lock:
+            self.targets.add(target_ip)
+        self._send(("target", target_ip, True))
+
+    def disable_monitoring(self, target_ip: str):
+        with self.lock:
+            self.targets.discard(target_ip)
+        self._send(("target", target_ip, False))
+
+    def unblock_target(self, target_ip: str):
+        self._send(("unblock", target_ip))
+
+    def restore_all(self, targets=None, reason: str = "shutdown", budget: float = 1.0):
+        """Restores from the web process; meant for after the child has stopped spoofing."""
+        from src.engine.restore import restore_targets
+        if targets is None:
+            with self.lock:
+                targets = list(self.targets)
+        progress = restore_targets(self.device_store, self.segment, self.interface, self.gateway_ip, targets,
+                                   host_ip=self.host_ip, host_mac=self.host_mac, reason=reason, budget=budget)
+        self.restores.append(progress.to_dict())
+        return progress
+
+    def restore_stats(self) -> list:
+        return list(self.restores)
+
+    def _send(self, message):
+        conn = self.conn
+        if conn is None:
+            return # Replayed on (re)start
+        try:
+            with self.lock:
+                conn.send(message)
+        except (OSError, ValueError):
+            pass # Child died; the supervisor restarts it with full state
+
+    # Supervisor
+
+    def run(self):
+        events = self.device_store.events.subscribe(types=self.STORE_EVENTS, maxsize=8192)
+        try:
+            failures, started = 0, 0
+            while self.running:
+                if self.process is None or not self.process.is_alive():
+                    if self.process is not None:
+                        self._reap()
+                        failures += 1
+                        delay = self.BACKOFF[min(failures, len(self.BACKOFF)) - 1]
+                        logger.error(f"Capture process on {self.interface} exited ({self.last_exit_code}); restarting in {delay}s.")
+                        time.sleep(delay)
+                        if not self.running:
+                            break
+                        self.restarts += 1
+                    self._spawn()
+                    started = time.time()
+                elif failures and time.time() - started > 60:
+                    failures = 0 # Stable again
+
+                deadline = time.time() + self.poll_interval
+                while time.time() < deadline and self.conn.poll(max(0.0, deadline - time.time())):
+                    try:
+                        self._handle(self.conn.recv())
+                    except (EOFError, OSError):
+                        break
+                for event in events.drain():
+                    self._forward(event)
+                if not self._replayed_loaded and self.device_store.loaded.is_set():
+                    self._replayed_loaded = True
+                    self._replay_devices() # The background load doesn't emit per-device events
+                self._sync_ipv6()
+                self.fold_counters()
+        finally:
+            events.close()
+            self._shutdown()
+
+    def _spawn(self):
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        self.table = CounterTable(self.slots)
+        self._baseline = {}
+        self.conn, child_conn = ctx.Pipe()
+        config = dict(self._settings, interface=self.interface, segment=self.segment)
+        self.process = ctx.Process(target=capture_main, args=(child_conn, self.table.name, config),
+                                   name=f"agentx-capture-{self.interface}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.starts += 1
+        logger.info(f"Capture process {self.process.pid} started on {self.interface}")
+
+        # Replay everything the child needs; it starts from an empty replica
+        self._replay_devices()
+        for mac, address in list(self.ipv6_targets.items()):
+            self._send(("ipv6", mac, address))
+        self._sent_ipv6 = dict(self.ipv6_targets)
+        with self.lock:
+            targets = list(self.targets)
+        for ip in targets:
+            self._send(("target", ip, True))
+        self._send(("set", "global_kill_switch", self.global_kill_switch))
+
+    def _replay_devices(self):
+        for dev in self.device_store.get_all():
+            if dev.segment == self.segment:
+                self._send(("device", self._replica_fields(dev)))
+
+    @staticmethod
+    def _replica_fields(dev) -> dict:
+        return {"ip": dev.ip, "mac": dev.mac, "segment": dev.segment, "vendor": dev.vendor, "last_seen": dev.last_seen,
+                "is_blocked": dev.is_blocked, "schedule_start": dev.schedule_start, "schedule_end": dev.schedule_end}
+
+    def _forward(self, event):
+        """Store change in the web process -> replica update in the child."""
+        dev = self.device_store.get(event.mac)
+        if event.type == DeviceEventType.REMOVED:
+            self._baseline.pop(event.mac, None) # Its slot is freed and may come back zeroed
+            self._send(("remove", event.mac))
+        elif dev is not None and dev.segment == self.segment:
+            if event.type == DeviceEventType.ATTRIBUTES_CHANGED and "schedule_start" not in event.data.get("fields", ()):
+                return
+            self._send(("device", self._replica_fields(dev)))
+
+    def _handle(self, message):
+        """Child event -> store write in the web process."""
+        self.events_received += 1
+        kind, store = message[0], self.device_store
+        if kind == "seen":
+            _, ip, mac, vendor = message
+            if vendor is None:
+                from src.engine import oui
+                vendor = oui.get_vendor(mac)
+            store.add_or_update(ip, mac, vendor, segment=self.segment)
+        elif kind == "discovery":
+            store.update_discovery_info(message[1], hostname=message[2], service=message[3])
+        elif kind == "os":
+            store.set_os_guess(message[1], message[2])
+        elif kind == "ipv6":
+            self.ipv6_targets[message[1]] = self._sent_ipv6[message[1]] = message[2]
+        elif kind == "restore":
+            self.restores.append(message[1])
+        else:
+            dev = store.get(message[1])
+            if dev is None:
+                return
+            if kind == "domain":
+                domain = message[2]
+                dev.last_sni = domain
+                if domain not in dev.domains:
+                    dev.domains.append(domain)
+                    if len(dev.domains) > 20:
+                        dev.domains.pop(0)
+                    dev.signals_changed()
+            elif kind == "fingerprint":
+                if dev.fingerprints.get(message[2]) != message[3]:
+                    dev.fingerprints[message[2]] = message[3]
+                    dev.signals_changed()
+            store.mark_dirty(dev.key)
+
+    def _sync_ipv6(self):
+        for mac, address in list(self.ipv6_targets.items()):
+            if self._sent_ipv6.get(mac) != address:
+                self._sent_ipv6[mac] = address
+                self._send(("ipv6", mac, address))
+
+    def fold_counters(self):
+        """Adds the child's counter growth since the last call to the store's devices."""
+        if self.table is None:
+            return
+        for key, up, down, last_seen in self.table.read():
+            base_up, base_down = self._baseline.get(key, (0, 0))
+            if up < base_up or down < base_down:
+                base_up, base_down = 0, 0 # Slot freed and taken again by the same key
+            if (up, down) == (base_up, base_down):
+                continue
+            dev = self.device_store.get(key)
+            if dev is None:
+                continue # Not known here (yet); folded in once it is
+            self._baseline[key] = (up, down)
+            dev.add_traffic(up=up - base_up, down=down - base_down) # This thread is the segment's only counter writer
+            dev.last_seen = max(dev.last_seen, last_seen)
+            self.device_store.mark_dirty(key)
+
+    def _reap(self):
+        self.last_exit_code = self.process.exitcode
+        self.fold_counters() # Whatever the child counted before it died
+        self.table.close(unlink=True)
+        self.table = None
+        self.conn.close()
+        self.conn = None
+
+    def _shutdown(self):
+        if self.process is None or self.conn is None:
+            return # Never started, or already reaped after a crash
+        self._send(("stop",))
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=0.5)
+        self._reap()
+
+    def stats(self) -> dict:
+        return {
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "starts": self.starts,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "events_received": self.events_received,
+            "counter_slots": self.table.used() if self.table else 0,
+            "counter_capacity": self.slots,
+            "counter_overflow": self.table.overflow if self.table else 0,
+        }
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Set
+
+from src.engine.classifier import DeviceClassifier
+from src.events import DeviceEventType
+
+logger = logging.getLogger(__name__)
+
+# Confidence of categories set by hand (or for our own host); above anything the classifier returns
+MANUAL_CONFIDENCE = 100
+
+class ClassificationWorker(threading.Thread):
+    """
+    Re-classifies devices when, and only when, a classifier input changes.
+
+    Listens for ADDED, VENDOR_CHANGED and ATTRIBUTES_CHANGED (hostname, mDNS
+    services, OS guess, open ports, ...) store events; REMOVED drops the
+    device's remembered inputs. A burst of events is collected for
+    `debounce` seconds and then classified as one batch. Devices whose
+    inputs are unchanged since their last classification are skipped, and
+    so are devices whose category was set with MANUAL_CONFIDENCE.
+    Runs as a thread, or as a task on an EngineRuntime via `attach()`.
+    """
+    EVENT_TYPES = [DeviceEventType.ADDED, DeviceEventType.VENDOR_CHANGED, DeviceEventType.ATTRIBUTES_CHANGED,
+                   DeviceEventType.REMOVED]
+    INPUT_FIELDS = {"vendor", "hostname", "mdns_services", "os_guess", "open_ports", "model"}
+
+    def __init__(self, device_store, classifier: DeviceClassifier = None, debounce: float = 0.5):
+        super().__init__(daemon=True)
+        self.device_store = device_store
+        self.classifier = classifier or DeviceClassifier()
+        self.debounce = debounce
+        self.running = True
+        self._inputs: Dict[str, tuple] = {} # mac -> inputs at last classification
+        self.classified = 0
+        self.unchanged = 0
+        self.batches = 0
+        # Subscribe up front so devices added before run() starts aren't missed
+        self.events = device_store.events.subscribe(types=self.EVENT_TYPES, maxsize=4096)
+
+    def _inputs_of(self, dev) -> tuple:
+        return (dev.vendor, dev.hostname, tuple(dev.mdns_services), dev.os_guess, tuple(dev.open_ports), dev.model)
+
+    def classify_macs(self, macs: Set[str]):
+        devices = [d for d in (self.device_store.get(mac) for mac in macs) if d is not None and d.confidence < MANUAL_CONFIDENCE]
+        devices = [d for d in devices if self._inputs.get(d.key) != self._inputs_of(d)]
+        self.unchanged += len(macs) - len(devices)
+        if not devices:
+            return
+        self.batches += 1
+        for dev, (category, confidence) in zip(devices, self.classifier.classify_many(devices)):
+            self._inputs[dev.key] = self._inputs_of(dev)
+            if self.device_store.set_classification(dev.key, category, confidence):
+                logger.info(f"Classified {dev.key} as {category.value} ({confidence}%)")
+            self.classified += 1
+
+    def _wants(self, event) -> bool:
+        return event.type != DeviceEventType.ATTRIBUTES_CHANGED or bool(self.INPUT_FIELDS & set(event.data.get("fields", ())))
+
+    def _collect(self, event, pending: Set[str]):
+        if event.type == DeviceEventType.REMOVED:
+            # Evicted (e.g. a rotated-away randomized MAC): don't keep its inputs forever
+            self._inputs.pop(event.mac, None)
+            pending.discard(event.mac)
+        elif self._wants(event):
+            pending.add(event.mac)
+
+    def _unknown_macs(self) -> Set[str]:
+        # Persisted devices carry their category; only fill in the unknown ones
+        return {d.key for d in self.device_store.get_all() if d.category.value == "Unknown"}
+
+    def attach(self, runtime):
+        runtime.spawn("classification", self._serve, runtime)
+
+    async def _serve(self, runtime):
+        while self.running and not self.device_store.loaded.is_set():
+            await asyncio.sleep(0.5)
+        await runtime.offload(self.classify_macs, self._unknown_macs()) # Whole store: keep it off the loop
+
+        while self.running:
+            event = await self.events.aget()
+            if event is None:
+                break # Closed by stop()
+            pending = set()
+            deadline = time.time() + self.debounce
+            while event is not None:
+                self._collect(event, pending)
+                try:
+                    event = await asyncio.wait_for(self.events.aget(), max(0.0, deadline - time.time()))
+                except asyncio.TimeoutError:
+                    event = None
+            try:
+                self.classify_macs(pending)
+            except Exception as e:
+                logger.error(f"Classification failed: {e}")
+
+    def run(self):
+        while self.running and not self.device_store.loaded.wait(1.0):
+            pass
+        self.classify_macs(self._unknown_macs())
+
+        while self.running:
+            event = self.events.get(timeout=1.0)
+            if event is None:
+                continue
+            pending = set()
+            deadline = time.time() + self.debounce
+            while event is not None:
+                self._collect(event, pending)
+                remaining = deadline - time.time()
+                event = self.events.get(timeout=remaining) if remaining > 0 else None
+            try:
+                self.classify_macs(pending)
+            except Exception as e:
+                logger.error(f"Classification failed: {e}")
+
+    def stop(self):
+        self.running = False
+        self.events.close()
+
+    def stats(self) -> dict:
+        return {
+            "classified": self.classified,
+            "unchanged": self.unchanged,
+            "batches": self.batches,
+            "cache": self.classifier.cache_stats(),
+        }
@@ -1,86 +1,90 @@
+import json
 import logging
+import os
 import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
 from src.device_store import Device, DeviceCategory
 
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "classifier_rules.json")
+
 class DeviceClassifier:
-    def __init__(self):
-        # Weighted Keyword Map: (Category, Confidence Bonus)
-        self.vendor_map = {
-            # Mobile
-            "apple": (DeviceCategory.MOBILE, 50), # Ambiguous (Mac vs iPhone)
-            "samsung": (DeviceCategory.MOBILE, 40), # Ambiguous (TV vs Phone)
-            "google": (DeviceCategory.MOBILE, 50),
-            "xiaomi": (DeviceCategory.MOBILE, 60),
-            "oppo": (DeviceCategory.MOBILE, 70),
-            "vivo": (DeviceCategory.MOBILE, 70),
-            "oneplus": (DeviceCategory.MOBILE, 80),
-            "motorola": (DeviceCategory.MOBILE, 80),
-            "huawei": (DeviceCategory.MOBILE, 50),
-            
-            # PC/Laptop
-            "intel": (DeviceCategory.PC, 60),
-            "dell": (DeviceCategory.PC, 80),
-            "hp": (DeviceCategory.PC, 80),
-            "lenovo": (DeviceCategory.PC, 80),
-            "microsoft": (DeviceCategory.PC, 80),
-            "msi": (DeviceCategory.PC, 90),
-            "asus": (DeviceCategory.PC, 70),
-            "acer": (DeviceCategory.PC, 80),
-            "razer": (DeviceCategory.PC, 90),
-            
-            # IoT / Smart Home
-            "espressif": (DeviceCategory.IOT, 90),
-            "tuya": (DeviceCategory.IOT, 90),
-            "nest": (DeviceCategory.IOT, 90),
-            "ring": (DeviceCategory.IOT, 90),
-            "wyze": (DeviceCategory.IOT, 90),
-            "belkin": (DeviceCategory.IOT, 80),
-            "lifx": (DeviceCategory.IOT, 95),
-            "philips lighting": (DeviceCategory.IOT, 95),
-            "signify": (DeviceCategory.IOT, 90), # Philips Hue
-            "google home": (DeviceCategory.IOT, 95),
-            "amazon technologies": (DeviceCategory.IOT, 60), # Echo or Kindle
-            "ecobee": (DeviceCategory.IOT, 95),
-            "august": (DeviceCategory.IOT, 95),
-            "lutron": (DeviceCategory.IOT, 95),
-            
-            # Media
-            "roku": (DeviceCategory.MEDIA, 95),
-            "sonos": (DeviceCategory.MEDIA, 95),
-            "vizio": (DeviceCategory.MEDIA, 90),
-            "lg electronics": (DeviceCategory.MEDIA, 70), # Likely TV
-            "tcl": (DeviceCategory.MEDIA, 80), # TV
-            "hisense": (DeviceCategory.MEDIA, 80),
-            "nvidia": (DeviceCategory.MEDIA, 60), # Shield or GPU?
-            "bose": (DeviceCategory.MEDIA, 90),
-            
-            # Networking
-            "cisco": (DeviceCategory.ROUTER, 80),
-            "ubiquiti": (DeviceCategory.ROUTER, 80),
-            "netgear": (DeviceCategory.ROUTER, 80),
-            "synology": (DeviceCategory.SERVER, 80),
-            "qnap": (DeviceCategory.SERVER, 80),
-            "raspberry": (DeviceCategory.SERVER, 90),
-            
-            # Game Consoles
-            "nintendo": (DeviceCategory.MEDIA, 95),
-            "sony interactive": (DeviceCategory.MEDIA, 90), # PlayStation
-        }
-        
-    def classify(self, device: Device, tcp_signature: dict = None) -> DeviceCategory:
+    def __init__(self, rules_path: str = RULES_PATH):
+        self.rules_path = rules_path
+        self.load_rules(rules_path)
+
+    def load_rules(self, path: str):
+        """
+        Loads keyword rules from JSON and compiles the vendor keywords into one
+        regex. Each keyword sits in a zero-width lookahead, so a single pass
+        reports a match at every offset (overlapping keywords included), and
+        the earliest-listed keyword among them wins, exactly like walking the
+        list in order.
+        """
+        with open(path, "r") as f:
+            rules = json.load(f)
+
+        # Weighted Keyword Map: (Category, Confidence Bonus), in priority order
+        self.vendor_map = {}
+        for keyword, category, score in rules.get("vendor", []):
+            self.vendor_map.setdefault(keyword.lower(), (DeviceCategory[category], score))
+        self.vendor_priority = {key: i for i, key in enumerate(self.vendor_map)}
+        alternatives = "|".join(re.escape(key) for key in self.vendor_map)
+        self.vendor_pattern = re.compile(f"(?=({alternatives}))") if alternatives else None
+
+        self.os_rules = [(prefix.lower(), DeviceCategory[category], score) for prefix, category, score in rules.get("os", [])]
+        self.model_rules = [(keyword.lower(), DeviceCategory[category], score) for keyword, category, score in rules.get("model", [])]
+        self.port_rules = sorted(((int(port), DeviceCategory[category], score) for port, category, score in rules.get("ports", [])), key=lambda r: -r[2])
+        self.service_rules = [(keyword, DeviceCategory[category], score) for keyword, category, score in rules.get("services", [])]
+
+        self._classify_cached = lru_cache(maxsize=4096)(self._classify_inputs)
+        logger.info(f"Loaded {len(self.vendor_map)} vendor and {len(self.service_rules)} service rules from {path}")
+
+    def _match_vendor(self, vendor_lower: str):
+        if not self.vendor_pattern:
+            return None
+        best = None
+        for match in self.vendor_pattern.finditer(vendor_lower):
+            key = match.group(1)
+            if best is None or self.vendor_priority[key] < self.vendor_priority[best]:
+                best = key
+        return best
+
+    def classify(self, device: Device, tcp_signature: dict = None) -> Tuple[DeviceCategory, int]:
+        # Memoized on the inputs, so unchanged devices cost one dict lookup
+        # `tcp_signature` ({"os": ...}) overrides the device's stored passive OS guess
+        os_guess = (tcp_signature or {}).get("os") or getattr(device, 'os_guess', "") or ""
+        return self._classify_cached(
+            device.vendor or "",
+            device.hostname or "",
+            tuple(getattr(device, 'mdns_services', ()) or ()),
+            os_guess,
+            tuple(getattr(device, 'open_ports', ()) or ()),
+            getattr(device, 'model', "") or "",
+        )
+
+    def classify_many(self, devices: Iterable[Device]) -> List[Tuple[DeviceCategory, int]]:
+        """Classifies a batch; devices sharing the same inputs are computed once."""
+        return [self.classify(dev) for dev in devices]
+
+    def cache_stats(self) -> dict:
+        info = self._classify_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+    def _classify_inputs(self, vendor: str, hostname: str, services: Tuple[str, ...], os_guess: str = "", ports: Tuple[int, ...] = (), model: str = "") -> Tuple[DeviceCategory, int]:
         cat = DeviceCategory.UNKNOWN
         confidence = 0
-        
-        vendor_lower = device.vendor.lower() if device.vendor else ""
-        name_lower = device.hostname.lower()
-        
+
+        vendor_lower = vendor.lower()
+        name_lower = hostname.lower()
+
         # 1. Vendor Analysis
-        for key, (category, score) in self.vendor_map.items():
-            if key in vendor_lower:
-                cat = category
-                confidence = score
-                break
-        
+        key = self._match_vendor(vendor_lower)
+        if key:
+            cat, confidence = self.vendor_map[key]
+
         # 2. Refinements based on Name/Ambiguity
         if cat == DeviceCategory.MOBILE:
             if "tv" in name_lower:
@@ -89,11 +93,11 @@ class DeviceClassifier:
             elif "macbook" in name_lower or "imac" in name_lower:
                 cat = DeviceCategory.PC
                 confidence = 95
-        
+
         elif cat == DeviceCategory.PC:
             if "android" in name_lower: # Intel/Asus Android devices?
                 cat = DeviceCategory.MOBILE
-        
+
         elif "apple" in vendor_lower:
              # Apple is tricky. Default to Mobile (iPhone is most common)
              # But check OUI ranges? (To Hard). Check Name.
@@ -114,22 +118,45 @@ class DeviceClassifier:
                  confidence = 40
 
         # 3. Special Cases (Private MAC)
-        if device.vendor == "Private/Random":
+        if vendor == "Private/Random":
             cat = DeviceCategory.MOBILE # 99% of random MACs are phones
             confidence = 60 # Pretty sure, but could be a laptop
 
-        # 4. Service Discovery overrides (Strongest signal)
-        if hasattr(device, 'mdns_services'):
-            for svc in device.mdns_services:
-                if "googlecast" in svc:
-                    cat = DeviceCategory.MEDIA
-                    confidence = 99
-                if "printer" in svc or "ipp" in svc:
-                    cat = DeviceCategory.PRINTER
-                    confidence = 99
-        
+        # 4. UPnP model, when it is surer than the vendor guess
+        model_lower = model.lower()
+        for keyword, category, score in self.model_rules if model_lower else ():
+            if keyword in model_lower:
+                if score > confidence:
+                    cat = category
+                    confidence = score
+                break
+
+        # 5. Passive OS fingerprint, same rule
+        os_lower = os_guess.lower()
+        for prefix, category, score in self.os_rules if os_lower else ():
+            if os_lower.startswith(prefix):
+                if category != DeviceCategory.UNKNOWN and score > confidence:
+                    cat = category
+                    confidence = score
+                break
+
+        # 6. Probed open ports (PortProber), same rule
+        for port, category, score in self.port_rules if ports else ():
+            if port in ports:
+                if score > confidence:
+                    cat = category
+                    confidence = score
+                break
+
+        # 7. Service Discovery overrides (Strongest signal)
+        for svc in services:
+            for keyword, category, score in self.service_rules:
+                if keyword in svc:
+                    cat = category
+                    confidence = score
+
         # Final Assignment
         if cat != DeviceCategory.UNKNOWN and confidence == 0:
             confidence = 50 # Default baseline if matched
-            
+
         return cat, confidence
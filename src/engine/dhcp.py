@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import socket
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dhcp_fingerprints.json")
+
+MAGIC_COOKIE = b"\x63\x82\x53\x63"
+OPTIONS_OFFSET = 240 # 236-byte BOOTP header + cookie
+
+# Option codes we read; everything else is skipped by length
+OPT_PAD, OPT_END = 0, 255
+OPT_HOSTNAME = 12
+OPT_REQUESTED_IP = 50
+OPT_MESSAGE_TYPE = 53
+OPT_PARAM_LIST = 55
+OPT_VENDOR_CLASS = 60
+
+DHCPDISCOVER, DHCPREQUEST, DHCPINFORM = 1, 3, 8
+
+def parse_dhcp(payload: bytes) -> Optional[dict]:
+    """
+    Decodes a client BOOTP/DHCP message straight from the UDP payload.
+    Returns None for anything that isn't a well-formed BOOTREQUEST.
+    """
+    if len(payload) < OPTIONS_OFFSET or payload[0] != 1 or payload[236:240] != MAGIC_COOKIE:
+        return None
+    info = {
+        "mac": ":".join(f"{b:02x}" for b in payload[28:34]),
+        "ciaddr": socket.inet_ntoa(payload[12:16]),
+        "message_type": None,
+        "requested_ip": None,
+        "hostname": None,
+        "vendor_class": None,
+        "param_list": [],
+    }
+    cursor = OPTIONS_OFFSET
+    end = len(payload)
+    while cursor < end:
+        code = payload[cursor]
+        if code == OPT_END:
+            break
+        if code == OPT_PAD:
+            cursor += 1
+            continue
+        if cursor + 1 >= end:
+            break
+        length = payload[cursor + 1]
+        value = payload[cursor + 2:cursor + 2 + length]
+        cursor += 2 + length
+        if len(value) < length:
+            break # Truncated capture
+
+        if code == OPT_MESSAGE_TYPE and length == 1:
+            info["message_type"] = value[0]
+        elif code == OPT_REQUESTED_IP and length == 4:
+            info["requested_ip"] = socket.inet_ntoa(value)
+        elif code == OPT_HOSTNAME:
+            info["hostname"] = value.decode("utf8", "ignore").strip("\x00 ") or None
+        elif code == OPT_VENDOR_CLASS:
+            info["vendor_class"] = value.decode("utf8", "ignore").strip("\x00 ") or None
+        elif code == OPT_PARAM_LIST:
+            info["param_list"] = list(value)
+    return info
+
+def client_ip(info: dict) -> str:
+    """The address the client has or is asking for, if any."""
+    if info["ciaddr"] != "0.0.0.0":
+        return info["ciaddr"]
+    return info["requested_ip"] or ""
+
+def fingerprint(param_list: List[int]) -> str:
+    return ",".join(str(p) for p in param_list)
+
+class DhcpFingerprintDB:
+    """Option 55 fingerprint -> OS in a dict, with option 60 prefixes as fallback."""
+    def __init__(self, path: str = FINGERPRINTS_PATH):
+        self.fingerprints: Dict[str, str] = {}
+        self.vendor_classes = []
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.fingerprints = data.get("fingerprints", {})
+            self.vendor_classes = [(prefix.lower(), os_name) for prefix, os_name in data.get("vendor_classes", [])]
+        except Exception as e:
+            logger.error(f"Failed to load DHCP fingerprints: {e}")
+
+    def lookup(self, info: dict) -> Optional[str]:
+        os_name = self.fingerprints.get(fingerprint(info["param_list"]))
+        if os_name is None and info["vendor_class"]:
+            vendor_class = info["vendor_class"].lower()
+            for prefix, name in self.vendor_classes:
+                if vendor_class.startswith(prefix):
+                    return name
+        return os_name
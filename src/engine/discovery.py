@@ -1,142 +1,311 @@
+import asyncio
 import threading
 import socket
 import struct
 import logging
+import time
+from typing import Callable, Dict, Set
 from src.device_store import DeviceStore
+from src.engine.dnswire import TYPE_A, TYPE_AAAA, TYPE_PTR, TYPE_SRV, DnsError, RecordCache, build_query, is_response, parse_message
+from src.engine.upnp import DescriptionFetcher
+from src.events import DeviceEventType
 
 # Suppress scapy warnings
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
+MDNS_GROUP, MDNS_PORT = '224.0.0.251', 5353
+SSDP_GROUP, SSDP_PORT = '239.255.255.250', 1900
+
+# DNS-SD types browsed on every query round, on top of whatever
+# "_services._dns-sd._udp" enumeration turns up
+BROWSE_TYPES = [
+    "_services._dns-sd._udp.local",
+    "_googlecast._tcp.local", "_airplay._tcp.local", "_raop._tcp.local",
+    "_ipp._tcp.local", "_printer._tcp.local", "_hap._tcp.local",
+    "_spotify-connect._tcp.local", "_sonos._tcp.local", "_smb._tcp.local",
+    "_device-info._tcp.local", "_workstation._tcp.local",
+]
+
+# Both sets below grow from network input, so they are capped
+MAX_SERVICE_TYPES = 256 # Browsed every query round
+MAX_RESPONDERS = 1024 # Distinct source addresses counted per protocol
+
+M_SEARCH = (
+    "M-SEARCH * HTTP/1.1\r\n"
+    f"HOST: {SSDP_GROUP}:{SSDP_PORT}\r\n"
+    'MAN: "ssdp:discover"\r\n'
+    "MX: 2\r\n"
+    "ST: ssdp:all\r\n\r\n"
+).encode()
+
+def parse_ssdp_headers(data: bytes) -> Dict[str, str]:
+    """Header block of an SSDP NOTIFY / M-SEARCH response, names upper-cased."""
+    headers = {}
+    for line in data.decode('utf-8', errors='ignore').splitlines()[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().upper()] = value.strip()
+    return headers
+
+class _DatagramHandler(asyncio.DatagramProtocol):
+    def __init__(self, handler: Callable[[str, bytes], None], stats: dict):
+        self.handler = handler
+        self.stats = stats
+
+    def datagram_received(self, data, addr):
+        self.stats["packets"] += 1
+        if len(self.stats["responders"]) < MAX_RESPONDERS:
+            self.stats["responders"].add(addr[0])
+        try:
+            self.handler(addr[0], data)
+        except Exception as e:
+            logger.debug(f"Discovery packet from {addr[0]} dropped: {e}")
+
+    def error_received(self, exc):
+        logger.debug(f"Discovery socket error: {exc}")
+
 class DiscoveryListener(threading.Thread):
-    def __init__(self, device_store: DeviceStore):
-        super().__init__()
+    """
+    mDNS and SSDP discovery on one asyncio loop in one thread.
+
+    Each protocol is a non-blocking datagram endpoint registered in
+    `_open_endpoints`; adding a protocol means adding a socket and a
+    handler there. Besides listening passively, the engine browses DNS-SD
+    types and sends SSDP M-SEARCH in a short burst at startup (to take
+    inventory within seconds) and then every `query_interval` seconds.
+    Service types that responders enumerate are browsed in turn.
+
+    With several segments, each gets its own listener bound to its
+    `interface`, so records are attributed to the right segment.
+    `attach()` runs the listener on a shared EngineRuntime loop instead of
+    its own thread.
+    """
+    STARTUP_BURST = (0.0, 1.0, 3.0) # Seconds after start; repeats cover packet loss
+
+    def __init__(self, device_store: DeviceStore, query_interval: float = 300.0, segment: str = "", interface: str = None):
+        super().__init__(daemon=True)
         self.device_store = device_store
+        self.segment = segment
+        self.interface = interface # Only set when several segments share the host
+        self.query_interval = query_interval
         self.running = True
-        self.threads = []
+        self.mdns_cache = RecordCache()
+        # Addresses that were released: their cached records are dropped
+        self._departures = device_store.events.subscribe(
+            types=[DeviceEventType.STALE, DeviceEventType.REMOVED, DeviceEventType.IP_CHANGED], maxsize=4096)
+        self.upnp = DescriptionFetcher(device_store, segment=segment)
+        self.known_types: Set[str] = set(BROWSE_TYPES)
+        self._pending_types: Set[str] = set()
+        self.counters = {
+            "mdns": {"packets": 0, "responders": set()},
+            "ssdp": {"packets": 0, "responders": set()},
+            "queries_sent": 0,
+        }
+        self._loop = None
+        self._wake = None # Set on stop or when newly enumerated types need browsing
+        self._transports = {}
+
+    def attach(self, runtime):
+        self._loop = runtime.loop
+        runtime.spawn(f"discovery:{self.segment or 'primary'}", self._main)
 
     def run(self):
-        # Start mDNS Listener
-        t1 = threading.Thread(target=self._listen_mdns)
-        t1.daemon = True
-        t1.start()
-        self.threads.append(t1)
-
-        # Start SSDP Listener
-        t2 = threading.Thread(target=self._listen_ssdp)
-        t2.daemon = True
-        t2.start()
-        self.threads.append(t2)
-        
-        while self.running:
-            import time
-            time.sleep(1)
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        except Exception as e:
+            logger.error(f"Discovery engine crashed: {e}")
+        finally:
+            self._loop.close()
 
     def stop(self):
         self.running = False
-        for t in self.threads:
-            if t.is_alive():
-                t.join(timeout=1.0)
-
-    def _listen_mdns(self):
-        """
-        Listen for mDNS responses on UDP 5353
-        """
-        MCAST_GRP = '224.0.0.251'
-        MCAST_PORT = 5353
-        
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        
-        # MacOS specific binding
-        try:
-            sock.bind(('', MCAST_PORT))
-        except:
-            return
-
-        mreq = struct.pack("4sl", socket.inet_aton(MCAST_GRP), socket.INADDR_ANY)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-        
-        while self.running:
+        if self._loop is not None and self._wake is not None:
             try:
-                data, addr = sock.recvfrom(10240)
-                src_ip = addr[0]
-                
-                # Update Store (Just ensure it exists first? We need MAC)
-                # But we only have IP here.
-                # DeviceStore needs MAC. We must find MAC from IP or wait for ARP.
-                
-                # Parse mDNS manually or regex? 
-                # Let's try simple string extraction for .local names
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass # Loop already closed
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=2.0)
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        await self._open_endpoints()
+        follower = asyncio.ensure_future(self._follow_departures())
+        started = time.time()
+        schedule = [started + delay for delay in self.STARTUP_BURST]
+        try:
+            while self.running:
+                now = time.time()
+                if now >= schedule[0]:
+                    schedule.pop(0)
+                    self._send_queries()
+                    if not schedule:
+                        schedule.append(now + self.query_interval)
+                if self._pending_types:
+                    self._browse(sorted(self._pending_types))
+                    self._pending_types.clear()
+                # Sleep until the next scheduled query, unless woken first
+                self._wake.clear()
                 try:
-                    content = data.decode('utf-8', errors='ignore')
-                    # Look for something.local
-                    import re
-                    match = re.search(r'[\w-]+\.local', content)
-                    if match:
-                        hostname = match.group(0)
-                        self._update_device_info(src_ip, hostname=hostname, service="mDNS")
-                except:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, schedule[0] - time.time()))
+                except asyncio.TimeoutError:
                     pass
-            except:
-                pass
-
-    def _listen_ssdp(self):
-        """
-        Listen for SSDP NOTIFY on UDP 1900
-        """
-        MCAST_GRP = '239.255.255.250'
-        MCAST_PORT = 1900
-        
+        finally:
+            follower.cancel()
+            self._departures.close()
+            for transport in self._transports.values():
+                transport.close()
+            self.upnp.close()
+
+    async def _follow_departures(self):
+        while self.running:
+            event = await self._departures.aget()
+            if event is None:
+                return
+            self._on_departure(event)
+
+    def _on_departure(self, event):
+        ip = event.data.get("old_ip") or (event.data.get("ip") if event.type == DeviceEventType.REMOVED else None)
+        if ip:
+            self.mdns_cache.forget(ip)
+
+    async def _open_endpoints(self):
+        loop = asyncio.get_running_loop()
+        endpoints = [
+            ("mdns", self._multicast_socket(MDNS_GROUP, MDNS_PORT), self._handle_mdns),
+            ("ssdp", self._multicast_socket(SSDP_GROUP, SSDP_PORT), self._handle_ssdp),
+            # M-SEARCH replies come back unicast to whichever port asked
+            ("ssdp_search", self._unicast_socket(), self._handle_ssdp),
+        ]
+        for name, sock, handler in endpoints:
+            if sock is None:
+                continue
+            stats = self.counters["mdns" if name == "mdns" else "ssdp"]
+            transport, _ = await loop.create_datagram_endpoint(lambda h=handler, s=stats: _DatagramHandler(h, s), sock=sock)
+            self._transports[name] = transport
+
+    def _multicast_socket(self, group: str, port: int):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        
         try:
-            sock.bind(('', MCAST_PORT))
-        except:
+            if self.interface:
+                self._bind_to_interface(sock)
+            # MacOS specific binding
+            sock.bind(('', port))
+            if self.interface:
+                # ip_mreqn: join on this interface only
+                mreq = struct.pack("4s4si", socket.inet_aton(group), socket.inet_aton("0.0.0.0"), socket.if_nametoindex(self.interface))
+            else:
+                mreq = struct.pack("4sl", socket.inet_aton(group), socket.INADDR_ANY)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        except OSError as e:
+            logger.warning(f"Discovery: cannot listen on {group}:{port} ({e})")
+            sock.close()
+            return None
+        sock.setblocking(False)
+        return sock
+
+    def _unicast_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        if self.interface:
+            try:
+                self._bind_to_interface(sock)
+            except OSError as e:
+                logger.warning(f"Discovery: M-SEARCH not bound to {self.interface} ({e})")
+        sock.bind(('', 0))
+        sock.setblocking(False)
+        return sock
+
+    def _bind_to_interface(self, sock):
+        # Receive (and send) only on our segment's interface; needs CAP_NET_RAW
+        sock.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_BINDTODEVICE", 25), self.interface.encode())
+
+    def _send_queries(self):
+        self._browse(sorted(self.known_types))
+        search = self._transports.get("ssdp_search")
+        if search:
+            search.sendto(M_SEARCH, (SSDP_GROUP, SSDP_PORT))
+            self.counters["queries_sent"] += 1
+
+    def _browse(self, types):
+        mdns = self._transports.get("mdns")
+        if not mdns:
+            return
+        # Keep each packet well under a typical MTU
+        for i in range(0, len(types), 8):
+            mdns.sendto(build_query(types[i:i + 8], TYPE_PTR), (MDNS_GROUP, MDNS_PORT))
+            self.counters["queries_sent"] += 1
+
+    def _handle_mdns(self, src_ip, data):
+        try:
+            flags, records = parse_message(data)
+        except DnsError:
             return
+        if not is_response(flags):
+            return # Queries say nothing about the sender
+        if self.device_store.get_by_ip(src_ip, self.segment) is not None:
+            # Announcements repeat constantly; only act on records we haven't seen within their TTL.
+            # Unknown senders bypass the cache so everything reaches the pending buffer.
+            records = self.mdns_cache.fresh(src_ip, records)
+            if not records:
+                return
 
-        mreq = struct.pack("4sl", socket.inet_aton(MCAST_GRP), socket.INADDR_ANY)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-        sock.settimeout(1.0) # Allow checking self.running
+        hostname = None
+        services = []
+        for rec in records:
+            if rec.type in (TYPE_A, TYPE_AAAA) and rec.name.endswith(".local"):
+                if rec.type == TYPE_AAAA or rec.data == src_ip:
+                    hostname = hostname or rec.name
+            elif rec.type == TYPE_SRV and rec.data[3].endswith(".local"):
+                hostname = hostname or rec.data[3]
+            elif rec.type == TYPE_PTR and not rec.name.endswith(".arpa"):
+                # "_services._dns-sd._udp" enumerates types; otherwise the owner name is the type
+                enumerated = rec.name.startswith("_services._dns-sd.")
+                service_type = rec.data if enumerated else rec.name
+                if enumerated and service_type not in self.known_types and len(self.known_types) < MAX_SERVICE_TYPES:
+                    self.known_types.add(service_type)
+                    self._pending_types.add(service_type) # Browse it for instances right away
+                    if self._wake is not None:
+                        self._wake.set()
+                service_type = service_type[:-len(".local")] if service_type.endswith(".local") else service_type
+                if service_type.startswith("_") and service_type not in services:
+                    services.append(service_type)
 
-        while self.running:
-            try:
-                data, addr = sock.recvfrom(10240)
-                src_ip = addr[0]
-                content = data.decode('utf-8', errors='ignore')
-                
-                # Extract Server/location
-                service = "SSDP"
-                if "SERVER:" in content:
-                    lines = content.splitlines()
-                    for line in lines:
-                        if line.startswith("SERVER:"):
-                            service = line.split(":", 1)[1].strip()
-                            break
-                            
-                self._update_device_info(src_ip, service=service)
-            except:
-                pass
+        self._update_device_info(src_ip, hostname=hostname, service="mDNS")
+        for service in services:
+            self._update_device_info(src_ip, service=service)
+
+    def _handle_ssdp(self, src_ip, data):
+        if data.startswith(b"M-SEARCH"):
+            return # Someone else's search (possibly our own, looped back)
+        headers = parse_ssdp_headers(data)
+        service = headers.get("SERVER") or "SSDP"
+        self._update_device_info(src_ip, service=service)
+        # LOCATION points at the UPnP description (friendlyName, model); fetched once per device boot
+        self.upnp.submit(src_ip, headers)
 
     def _update_device_info(self, ip, hostname=None, service=None):
-        # We need to find the device by IP in our store
-        # This is O(N) but N is small (home network)
-        target_dev = None
-        for dev in self.device_store.get_all():
-             if dev.ip == ip:
-                 target_dev = dev
-                 break
-        
+        # O(1) via the store's IP index
+        target_dev = self.device_store.get_by_ip(ip, self.segment)
+
         if target_dev:
             target_dev.last_seen = __import__("time").time()
-            if hostname and not target_dev.hostname:
-                target_dev.hostname = hostname
-            
-            if service:
-                if service not in target_dev.mdns_services:
-                    target_dev.mdns_services.append(service)
-                    # Limit
-                    if len(target_dev.mdns_services) > 10:
-                        target_dev.mdns_services.pop(0)
+            self.device_store.mark_dirty(target_dev.key)
+            # Publishes ATTRIBUTES_CHANGED so the classification worker picks it up
+            self.device_store.update_discovery_info(target_dev.key, hostname=hostname, service=service)
+        else:
+            # Announcements often beat the ARP reply; keep them until the IP is bound
+            self.device_store.buffer_discovery(ip, hostname=hostname, service=service, segment=self.segment)
 
+    def stats(self) -> dict:
+        counters = self.counters
+        return {
+            "mdns": {"packets": counters["mdns"]["packets"], "responders": len(counters["mdns"]["responders"])},
+            "ssdp": {"packets": counters["ssdp"]["packets"], "responders": len(counters["ssdp"]["responders"])},
+            "queries_sent": counters["queries_sent"],
+            "service_types": len(self.known_types),
+            "upnp": self.upnp.stats(),
+        }
@@ -0,0 +1,168 @@
+import socket
+import struct
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+TYPE_A = 1
+TYPE_PTR = 12
+TYPE_TXT = 16
+TYPE_AAAA = 28
+TYPE_SRV = 33
+
+HEADER = struct.Struct("!HHHHHH")
+RR_FIXED = struct.Struct("!HHIH") # type, class, ttl, rdlength
+MAX_POINTER_HOPS = 32
+
+class DnsError(ValueError):
+    pass
+
+class Record(NamedTuple):
+    name: str
+    type: int
+    ttl: int
+    data: object # str for A/AAAA/PTR, (priority, weight, port, target) for SRV, tuple of str for TXT
+
+def read_name(buf: memoryview, offset: int) -> Tuple[str, int]:
+    """
+    Decodes a (possibly compressed) domain name at `offset`.
+    Returns the name and the offset just past it in the original position.
+    """
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        if offset >= len(buf):
+            raise DnsError("name runs past end of message")
+        length = buf[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(buf):
+                raise DnsError("truncated compression pointer")
+            if end is None:
+                end = offset + 2
+            hops += 1
+            if hops > MAX_POINTER_HOPS:
+                raise DnsError("compression loop")
+            offset = ((length & 0x3F) << 8) | buf[offset + 1]
+            continue
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0:
+            raise DnsError("unsupported label type")
+        labels.append(bytes(buf[offset + 1:offset + 1 + length]).decode("utf8", "replace"))
+        offset += 1 + length
+    return ".".join(labels), (end if end is not None else offset)
+
+def _rdata(buf: memoryview, rtype: int, start: int, length: int):
+    end = start + length
+    if rtype == TYPE_A and length == 4:
+        return socket.inet_ntop(socket.AF_INET, bytes(buf[start:end]))
+    if rtype == TYPE_AAAA and length == 16:
+        return socket.inet_ntop(socket.AF_INET6, bytes(buf[start:end]))
+    if rtype == TYPE_PTR:
+        return read_name(buf, start)[0]
+    if rtype == TYPE_SRV and length >= 7:
+        priority, weight, port = struct.unpack_from("!HHH", buf, start)
+        return priority, weight, port, read_name(buf, start + 6)[0]
+    if rtype == TYPE_TXT:
+        strings = []
+        cursor = start
+        while cursor < end:
+            n = buf[cursor]
+            strings.append(bytes(buf[cursor + 1:cursor + 1 + n]).decode("utf8", "replace"))
+            cursor += 1 + n
+        return tuple(strings)
+    return None
+
+def parse_message(data: bytes, wanted=(TYPE_A, TYPE_AAAA, TYPE_PTR, TYPE_SRV, TYPE_TXT)) -> Tuple[int, List[Record]]:
+    """
+    Parses a DNS/mDNS message without copying the payload. Returns
+    (flags, records) with records from the answer, authority and additional
+    sections, limited to the `wanted` types. Raises DnsError on malformed input.
+    """
+    buf = memoryview(data)
+    if len(buf) < HEADER.size:
+        raise DnsError("short header")
+    _, flags, qdcount, ancount, nscount, arcount = HEADER.unpack_from(buf, 0)
+    offset = HEADER.size
+    for _ in range(qdcount):
+        _, offset = read_name(buf, offset)
+        offset += 4 # qtype, qclass
+
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, offset = read_name(buf, offset)
+        if offset + RR_FIXED.size > len(buf):
+            raise DnsError("truncated resource record")
+        rtype, _, ttl, rdlength = RR_FIXED.unpack_from(buf, offset)
+        offset += RR_FIXED.size
+        if offset + rdlength > len(buf):
+            raise DnsError("truncated rdata")
+        if rtype in wanted:
+            value = _rdata(buf, rtype, offset, rdlength)
+            if value is not None:
+                records.append(Record(name, rtype, ttl, value))
+        offset += rdlength
+    return flags, records
+
+def encode_name(name: str) -> bytes:
+    out = bytearray()
+    for label in name.rstrip(".").split("."):
+        raw = label.encode("utf8")
+        if not 0 < len(raw) < 64:
+            raise DnsError(f"bad label in {name!r}")
+        out += bytes([len(raw)]) + raw
+    return bytes(out + b"\x00")
+
+def build_query(names: List[str], qtype: int = TYPE_PTR, unicast_response: bool = False) -> bytes:
+    """A standard query for `names`; mDNS allows many questions per packet."""
+    qclass = 0x0001 | (0x8000 if unicast_response else 0)
+    questions = b"".join(encode_name(n) + struct.pack("!HH", qtype, qclass) for n in names)
+    return HEADER.pack(0, 0, len(names), 0, 0, 0) + questions
+
+def is_response(flags: int) -> bool:
+    return bool(flags & 0x8000)
+
+class RecordCache:
+    """
+    Per-source record cache keyed by (name, type, data) with the record's own
+    TTL. `fresh()` returns only records that are new or whose cached copy is
+    past half its TTL, so the steady stream of repeated mDNS announcements
+    costs a dict lookup each. A TTL of 0 (an mDNS goodbye) evicts the record.
+    Both the records per source and the number of sources are capped; the
+    least recently heard source is dropped first.
+    """
+    def __init__(self, max_per_source: int = 256, max_sources: int = 1024):
+        self.max_per_source = max_per_source
+        self.max_sources = max_sources
+        self.entries: Dict[str, Dict[tuple, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fresh(self, source: str, records: List[Record], now: Optional[float] = None) -> List[Record]:
+        now = now or time.time()
+        cache = self.entries.pop(source, None) or {}
+        self.entries[source] = cache # Most recently heard last
+        while len(self.entries) > self.max_sources:
+            del self.entries[next(iter(self.entries))]
+        result = []
+        for rec in records:
+            key = (rec.name.lower(), rec.type, rec.data)
+            if rec.ttl == 0:
+                cache.pop(key, None)
+                continue
+            refresh_at = cache.get(key)
+            if refresh_at is not None and refresh_at > now:
+                self.hits += 1
+                continue
+            self.misses += 1
+            cache[key] = now + rec.ttl / 2
+            result.append(rec)
+        if len(cache) > self.max_per_source:
+            for key in sorted(cache, key=cache.get)[:len(cache) - self.max_per_source]:
+                del cache[key]
+        return result
+
+    def forget(self, source: str):
+        """Drops a source's records, e.g. when its device is removed or its address goes stale."""
+        self.entries.pop(source, None)
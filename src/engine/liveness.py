@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+class AddressState:
+    __slots__ = ("alive", "last_seen", "next_probe", "misses", "flaps")
+
+    def __init__(self):
+        self.alive = False
+        self.last_seen = 0.0
+        self.next_probe = 0.0
+        self.misses = 0 # Consecutive unanswered probes
+        self.flaps = deque(maxlen=8) # Timestamps of alive<->dead transitions
+
+class LivenessTracker:
+    """
+    Per-address liveness for the ARP scanner, so each sweep only probes
+    addresses nobody has vouched for recently.
+
+    - Any sighting (passive ARP, sniffed traffic, mDNS, a sweep reply) pushes
+      the address's next probe `base_interval` seconds past the sighting, so
+      chatty hosts are never actively probed.
+    - Unanswered addresses back off exponentially up to `max_interval`.
+      An ARP who-has for a dead address (a DHCP client's RFC 5227 probe of
+      its offered lease, or anyone looking for the host) resets its backoff
+      via wake(), so a newcomer is picked up on the next tick.
+    - Addresses that flipped between alive and dead at least FLAP_THRESHOLD
+      times within `flap_window` are probed FLAP_DIVISOR times as often.
+    - A full sweep every `full_sweep_interval` bounds how long a silent
+      newcomer on a backed-off address can go unnoticed.
+    """
+    FLAP_THRESHOLD = 2
+    FLAP_DIVISOR = 3
+
+    def __init__(self, base_interval: float = 30, max_interval: float = 600, full_sweep_interval: float = 1800, flap_window: float = 600):
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.full_sweep_interval = full_sweep_interval
+        self.flap_window = flap_window
+        self.lock = threading.Lock()
+        self.states: Dict[str, AddressState] = {}
+        self.last_full_sweep = 0.0
+        self.full_sweeps = 0
+        self.last_probed = 0
+        self.last_skipped = 0
+        self.probes_saved = 0
+        self.wakes = 0
+
+    def tick(self) -> float:
+        """How often the scanner should check for due addresses."""
+        return max(1.0, self.base_interval / self.FLAP_DIVISOR)
+
+    def _is_flapping(self, st: AddressState, now: float) -> bool:
+        return sum(1 for t in st.flaps if now - t <= self.flap_window) >= self.FLAP_THRESHOLD
+
+    def _interval(self, st: AddressState, now: float) -> float:
+        if self._is_flapping(st, now):
+            return self.base_interval / self.FLAP_DIVISOR
+        if st.alive:
+            return self.base_interval
+        return min(self.max_interval, self.base_interval * (2 ** st.misses))
+
+    def observe(self, ip: str, ts: float):
+        with self.lock:
+            st = self.states.get(ip)
+            if st is None:
+                st = self.states[ip] = AddressState()
+            if ts <= st.last_seen:
+                return
+            if not st.alive and st.misses:
+                st.flaps.append(ts) # Came back after being declared dead
+            st.alive = True
+            st.misses = 0
+            st.last_seen = ts
+            st.next_probe = ts + self._interval(st, ts)
+
+    def wake(self, ip: str, now: float = None):
+        """Makes a backed-off dead address due now; someone is asking for it."""
+        now = now or time.time()
+        with self.lock:
+            st = self.states.get(ip)
+            if st is None or st.alive or st.next_probe <= now:
+                return
+            st.misses = 0
+            st.next_probe = now
+            self.wakes += 1
+
+    def observe_devices(self, devices: Iterable):
+        """Folds in every passive sighting the store has recorded."""
+        for dev in devices:
+            if dev.ip and dev.last_seen:
+                self.observe(dev.ip, dev.last_seen)
+
+    def due(self, hosts: List[str], now: float = None) -> List[str]:
+        now = now or time.time()
+        with self.lock:
+            if now - self.last_full_sweep >= self.full_sweep_interval:
+                self.last_full_sweep = now
+                self.full_sweeps += 1
+                targets = list(hosts)
+            else:
+                states = self.states
+                targets = [ip for ip in hosts if ip not in states or states[ip].next_probe <= now]
+            self.last_probed = len(targets)
+            self.last_skipped = len(hosts) - len(targets)
+            self.probes_saved += self.last_skipped
+        return targets
+
+    def record(self, probed: Iterable[str], replied: Set[str], now: float = None):
+        now = now or time.time()
+        for ip in probed:
+            if ip in replied:
+                self.observe(ip, now)
+                continue
+            with self.lock:
+                st = self.states.get(ip)
+                if st is None:
+                    st = self.states[ip] = AddressState()
+                if st.alive:
+                    st.alive = False
+                    st.flaps.append(now)
+                st.misses += 1
+                st.next_probe = now + self._interval(st, now)
+
+    def stats(self) -> dict:
+        with self.lock:
+            states = list(self.states.values())
+        return {
+            "tracked": len(states),
+            "alive": sum(1 for s in states if s.alive),
+            "last_probed": self.last_probed,
+            "last_skipped": self.last_skipped,
+            "probes_saved": self.probes_saved,
+            "full_sweeps": self.full_sweeps,
+            "wakes": self.wakes,
+        }
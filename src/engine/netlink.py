@@ -0,0 +1,451 @@
+import asyncio
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/neighbour.h)
+NETLINK_ROUTE = 0
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTM_NEWNEIGH, RTM_GETNEIGH = 28, 30
+NDA_DST, NDA_LLADDR = 1, 2
+
+NUD_INCOMPLETE, NUD_REACHABLE, NUD_STALE, NUD_DELAY = 0x01, 0x02, 0x04, 0x08
+NUD_PROBE, NUD_FAILED, NUD_NOARP, NUD_PERMANENT = 0x10, 0x20, 0x40, 0x80
+# Entries the kernel has recently confirmed. STALE, PROBE (confirmation
+# overdue, being re-solicited) and PERMANENT (static, never confirmed)
+# ones only tell us the host existed
+NUD_CONFIRMED = NUD_REACHABLE | NUD_DELAY
+NUD_USABLE = NUD_CONFIRMED | NUD_STALE | NUD_PROBE | NUD_PERMANENT
+
+NLMSGHDR = struct.Struct("=IHHII") # len, type, flags, seq, pid
+NDMSG = struct.Struct("=BxxxiHBB") # family, ifindex, state, flags, type
+RTATTR = struct.Struct("=HH")
+
+PROC_ARP = "/proc/net/arp"
+
+class Neighbor(NamedTuple):
+    ip: str
+    mac: str
+    ifindex: int
+    state: int
+
+    @property
+    def confirmed(self) -> bool:
+        return bool(self.state & NUD_CONFIRMED)
+
+def _align(n: int) -> int:
+    return (n + 3) & ~3
+
+def iter_attrs(buf, offset: int, end: int):
+    """Yields (type, payload memoryview) for each rtattr in buf[offset:end]."""
+    while offset + RTATTR.size <= end:
+        length, rta_type = RTATTR.unpack_from(buf, offset)
+        if length < RTATTR.size:
+            break
+        yield rta_type, buf[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+
+def iter_messages(buf):
+    """Yields (type, flags, body memoryview) for each netlink message in buf."""
+    view = memoryview(buf)
+    offset = 0
+    while offset + NLMSGHDR.size <= len(view):
+        length, msg_type, flags, _, _ = NLMSGHDR.unpack_from(view, offset)
+        if length < NLMSGHDR.size or offset + length > len(view):
+            break
+        yield msg_type, flags, view[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+def parse_neighbor(body) -> Optional[Neighbor]:
+    """Decodes one RTM_NEWNEIGH body; None for unusable or MAC-less entries."""
+    if len(body) < NDMSG.size:
+        return None
+    family, ifindex, state, _, _ = NDMSG.unpack_from(body, 0)
+    if not state & NUD_USABLE:
+        return None
+    ip = mac = None
+    for rta_type, payload in iter_attrs(body, NDMSG.size, len(body)):
+        if rta_type == NDA_DST and family in (socket.AF_INET, socket.AF_INET6):
+            ip = socket.inet_ntop(family, bytes(payload))
+        elif rta_type == NDA_LLADDR and len(payload) == 6:
+            mac = ":".join(f"{b:02x}" for b in payload)
+    if not ip or not mac or mac == "00:00:00:00:00:00":
+        return None
+    return Neighbor(ip, mac, ifindex, state)
+
+def _dump(request_type: int, header: bytes) -> List[Tuple[int, memoryview]]:
+    """Sends one NLM_F_DUMP request and collects every reply message until NLMSG_DONE."""
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+        sock.settimeout(1.0)
+        sock.bind((0, 0))
+        seq = os.getpid() & 0xFFFF
+        sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(header), request_type, NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + header)
+        messages = []
+        while True:
+            data = sock.recv(65536)
+            for msg_type, _, body in iter_messages(data):
+                if msg_type == NLMSG_DONE:
+                    return messages
+                if msg_type == NLMSG_ERROR:
+                    (error,) = struct.unpack_from("=i", body, 0)
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                    continue
+                messages.append((msg_type, body))
+    finally:
+        sock.close()
+
+def dump_neighbors() -> List[Neighbor]:
+    """The kernel's ARP and NDP tables in one RTM_GETNEIGH dump."""
+    neighbors = []
+    for msg_type, body in _dump(RTM_GETNEIGH, NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if msg_type == RTM_NEWNEIGH:
+            neighbor = parse_neighbor(body)
+            if neighbor:
+                neighbors.append(neighbor)
+    return neighbors
+
+def read_proc_arp(path: str = PROC_ARP) -> List[Neighbor]:
+    """IPv4-only fallback for when netlink sockets aren't available."""
+    neighbors = []
+    with open(path, "r") as f:
+        next(f, None) # Column headers
+        for line in f:
+            fields = line.split()
+            if len(fields) < 6:
+                continue
+            ip, _, flags, mac, _, device = fields[:6]
+            if not int(flags, 16) & 0x2 or mac == "00:00:00:00:00:00": # ATF_COM: resolved
+                continue
+            try:
+                ifindex = socket.if_nametoindex(device)
+            except OSError:
+                ifindex = 0
+            neighbors.append(Neighbor(ip, mac.lower(), ifindex, NUD_REACHABLE))
+    return neighbors
+
+def read_neighbors(interface: str = None) -> Tuple[str, List[Neighbor]]:
+    """
+    Returns (source, neighbors) for `interface` (all interfaces if None),
+    source being "netlink", "proc" or "" when neither is readable.
+    """
+    source, neighbors = "", []
+    try:
+        source, neighbors = "netlink", dump_neighbors()
+    except (OSError, AttributeError) as e: # AttributeError: no AF_NETLINK off Linux
+        logger.debug(f"Netlink neighbor dump unavailable ({e}), trying {PROC_ARP}")
+        try:
+            source, neighbors = "proc", read_proc_arp()
+        except OSError:
+            return "", []
+    if interface:
+        try:
+            ifindex = socket.if_nametoindex(interface)
+            neighbors = [n for n in neighbors if n.ifindex == ifindex]
+        except OSError:
+            pass
+    return source, neighbors
+
+# Link, address and route tracking
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE, RTM_GETROUTE = 24, 25, 26
+RTMGRP_LINK, RTMGRP_IPV4_IFADDR, RTMGRP_IPV4_ROUTE = 0x1, 0x10, 0x40
+SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33)
+# Room for a whole burst (interface flaps, route table reloads); an overrun is ENOBUFS on the next recv
+TRACKER_RCVBUF = 1 << 20
+IFLA_ADDRESS, IFLA_IFNAME = 1, 3
+IFA_ADDRESS, IFA_LOCAL = 1, 2
+RTA_DST, RTA_OIF, RTA_GATEWAY, RTA_TABLE = 1, 4, 5, 15
+RT_TABLE_MAIN = 254
+IFF_UP = 0x1
+
+IFINFOMSG = struct.Struct("=BxHiII") # family, type, index, flags, change
+IFADDRMSG = struct.Struct("=BBBBi") # family, prefixlen, flags, scope, index
+RTMSG = struct.Struct("=BBBBBBBBI") # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+
+class NetworkState:
+    """
+    Immutable snapshot of links, IPv4 addresses and the default route.
+    NetworkTracker publishes a new one per change, so readers never lock.
+
+    `gateways` holds a default gateway per interface, including ones from
+    policy-routing tables, so each monitored VLAN can find its own router.
+    """
+    __slots__ = ("links", "addresses", "default_route", "gateways")
+
+    def __init__(self, links: Dict[int, dict], addresses: Dict[str, List[Tuple[str, int]]], default_route: Optional[Tuple[str, str]],
+                 gateways: Dict[str, str] = None):
+        self.links = links # ifindex -> {"name", "mac", "up"}
+        self.addresses = addresses # ifname -> [(ip, prefixlen)]
+        self.default_route = default_route # (gateway ip, ifname) or None
+        if gateways is None:
+            gateways = {default_route[1]: default_route[0]} if default_route else {}
+        self.gateways = gateways # ifname -> gateway ip
+
+    def interface_names(self) -> List[str]:
+        return [link["name"] for _, link in sorted(self.links.items())]
+
+    def link(self, ifname: str) -> Optional[dict]:
+        return next((link for link in self.links.values() if link["name"] == ifname), None)
+
+    def ipv4(self, ifname: str) -> Optional[Tuple[str, int]]:
+        addrs = self.addresses.get(ifname)
+        return addrs[0] if addrs else None
+
+    def gateway_for(self, ifname: str = None) -> Optional[str]:
+        if ifname is None:
+            return self.default_route[0] if self.default_route else None
+        return self.gateways.get(ifname)
+
+    def diff(self, other: "NetworkState") -> Set[str]:
+        """Names of the parts that differ: "links", "addresses", "default_route", "gateways"."""
+        return {name for name in self.__slots__ if getattr(self, name) != getattr(other, name)}
+
+def dump_state() -> NetworkState:
+    """Reads links, IPv4 addresses and default routes (main table first) in three dumps."""
+    links = {}
+    for msg_type, body in _dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+        if msg_type != RTM_NEWLINK or len(body) < IFINFOMSG.size:
+            continue
+        _, _, index, flags, _ = IFINFOMSG.unpack_from(body, 0)
+        link = {"name": "", "mac": "", "up": bool(flags & IFF_UP)}
+        for rta_type, payload in iter_attrs(body, IFINFOMSG.size, len(body)):
+            if rta_type == IFLA_IFNAME:
+                link["name"] = bytes(payload).split(b"\x00", 1)[0].decode()
+            elif rta_type == IFLA_ADDRESS and len(payload) == 6:
+                link["mac"] = ":".join(f"{b:02x}" for b in payload)
+        links[index] = link
+
+    addresses: Dict[str, List[Tuple[str, int]]] = {}
+    for msg_type, body in _dump(RTM_GETADDR, IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)):
+        if msg_type != RTM_NEWADDR or len(body) < IFADDRMSG.size:
+            continue
+        family, prefixlen, _, _, index = IFADDRMSG.unpack_from(body, 0)
+        if family != socket.AF_INET or index not in links:
+            continue
+        attrs = dict(iter_attrs(body, IFADDRMSG.size, len(body)))
+        raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if raw is not None and len(raw) == 4:
+            addresses.setdefault(links[index]["name"], []).append((socket.inet_ntoa(bytes(raw)), prefixlen))
+
+    default_route = None
+    main_gateways, other_gateways = {}, {}
+    for msg_type, body in _dump(RTM_GETROUTE, RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)):
+        if msg_type != RTM_NEWROUTE or len(body) < RTMSG.size:
+            continue
+        family, dst_len, _, _, table, _, _, _, _ = RTMSG.unpack_from(body, 0)
+        attrs = dict(iter_attrs(body, RTMSG.size, len(body)))
+        if RTA_TABLE in attrs:
+            (table,) = struct.unpack_from("=I", attrs[RTA_TABLE], 0)
+        if family != socket.AF_INET or dst_len != 0 or RTA_GATEWAY not in attrs:
+            continue
+        oif = struct.unpack_from("=i", attrs[RTA_OIF], 0)[0] if RTA_OIF in attrs else 0
+        route = (socket.inet_ntoa(bytes(attrs[RTA_GATEWAY])), links.get(oif, {}).get("name", ""))
+        if table == RT_TABLE_MAIN:
+            default_route = default_route or route
+            main_gateways.setdefault(route[1], route[0])
+        else:
+            other_gateways.setdefault(route[1], route[0])
+    return NetworkState(links, addresses, default_route, dict(other_gateways, **main_gateways))
+
+def netifaces_state() -> NetworkState:
+    """Best-effort snapshot for platforms without rtnetlink (no change events)."""
+    import netifaces
+    links, addresses = {}, {}
+    for index, name in enumerate(netifaces.interfaces(), start=1):
+        info = netifaces.ifaddresses(name)
+        mac = (info.get(netifaces.AF_LINK) or [{}])[0].get("addr", "")
+        links[index] = {"name": name, "mac": mac, "up": True}
+        for entry in info.get(netifaces.AF_INET, []):
+            if entry.get("addr") and entry.get("netmask"):
+                prefix = sum(bin(int(octet)).count("1") for octet in entry["netmask"].split("."))
+                addresses.setdefault(name, []).append((entry["addr"], prefix))
+    gws = netifaces.gateways()
+    default = gws.get("default", {}).get(netifaces.AF_INET)
+    gateways = {}
+    for entry in gws.get(netifaces.AF_INET, []):
+        gateways.setdefault(entry[1], entry[0])
+    if default:
+        gateways[default[1]] = default[0]
+    return NetworkState(links, addresses, (default[0], default[1]) if default else None, gateways)
+
+class NetworkTracker(threading.Thread):
+    """
+    Live view of interfaces, addresses and the default route.
+
+    Subscribes to rtnetlink link/IPv4 address/IPv4 route notifications.
+    A burst of notifications (a DHCP renewal sends several) is debounced,
+    the three tables are re-dumped, and subscribers are called with
+    (old_state, new_state, changed_parts) only if something actually
+    differs. Off Linux, `state` is a one-off netifaces snapshot. If the
+    socket buffer overruns (ENOBUFS), notifications were lost, so a
+    refresh is scheduled the same way and reading continues.
+
+    Runs as its own thread, or as a socket reader on an EngineRuntime via
+    `attach()`; attached, the refresh (blocking dumps and subscriber
+    callbacks) runs on the runtime's worker pool, not on the loop.
+    """
+    def __init__(self, debounce: float = 0.5):
+        super().__init__(daemon=True)
+        self.debounce = debounce
+        self.running = True
+        self.events_seen = 0
+        self.refreshes = 0
+        self.overruns = 0
+        self._callbacks: List[Callable[[NetworkState, NetworkState, Set[str]], None]] = []
+        self._sock = None
+        self._runtime = None # EngineRuntime when attached instead of run as a thread
+        self._pending_refresh = None # Its debounce timer
+        self._refresh_lock = threading.Lock() # Offloaded refreshes may overlap
+        try:
+            self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self._sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE))
+            try:
+                self._sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, TRACKER_RCVBUF) # Past rmem_max; needs CAP_NET_ADMIN
+            except OSError:
+                self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TRACKER_RCVBUF)
+            self._sock.settimeout(1.0)
+            self.state = dump_state() # Subscribed first, so nothing between dump and listen is lost
+        except (OSError, AttributeError) as e:
+            logger.info(f"rtnetlink unavailable ({e}); network changes won't be tracked")
+            if self._sock:
+                self._sock.close()
+                self._sock = None
+            try:
+                self.state = netifaces_state()
+            except Exception as e:
+                logger.error(f"Could not read network configuration: {e}")
+                self.state = NetworkState({}, {}, None)
+
+    @property
+    def available(self) -> bool:
+        return self._sock is not None
+
+    def subscribe(self, callback: Callable[[NetworkState, NetworkState, Set[str]], None]):
+        self._callbacks.append(callback)
+
+    def attach(self, runtime):
+        if not self._sock:
+            return
+        self._runtime = runtime
+        runtime.add_reader(self._sock, self._on_readable)
+
+    def _on_readable(self):
+        """Reads the whole notification burst without blocking; refreshes `debounce` after the first."""
+        relevant = False
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    self._overrun()
+                    relevant = True
+                    continue
+                logger.error(f"Netlink listener error: {e}")
+                self._runtime.remove_reader(self._sock)
+                break
+            relevant = relevant or any(t in (RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTM_DELROUTE)
+                                       for t, _, _ in iter_messages(data))
+        if relevant:
+            self.events_seen += 1
+            if self._pending_refresh is None:
+                self._pending_refresh = self._runtime.loop.call_later(self.debounce, self._debounced_refresh)
+
+    def _overrun(self):
+        self.overruns += 1
+        logger.warning("Netlink notifications lost (receive buffer overrun); re-reading network state")
+
+    def _debounced_refresh(self):
+        self._pending_refresh = None
+        if self.running:
+            asyncio.ensure_future(self._runtime.offload(self.refresh))
+
+    def run(self):
+        if not self._sock:
+            return
+        while self.running:
+            try:
+                data = self._sock.recv(65536)
+                relevant = any(t in (RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTM_DELROUTE)
+                               for t, _, _ in iter_messages(data))
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    if self.running:
+                        logger.error(f"Netlink listener error: {e}")
+                    break
+                self._overrun()
+                relevant = True # Whatever was lost is picked up by the re-dump
+            if not relevant:
+                continue
+            self.events_seen += 1
+            self._drain(time.time() + self.debounce)
+            self.refresh()
+        self._sock.close()
+
+    def _drain(self, deadline: float):
+        """Swallows the rest of a notification burst; the re-dump covers it."""
+        while self.running and time.time() < deadline:
+            self._sock.settimeout(max(0.01, deadline - time.time()))
+            try:
+                self._sock.recv(65536)
+                self.events_seen += 1
+            except socket.timeout:
+                break
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    self._overrun() # The refresh that follows covers what was lost
+                    continue
+                break
+        self._sock.settimeout(1.0)
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            new = dump_state()
+        except OSError as e:
+            logger.error(f"Netlink dump failed: {e}")
+            return
+        old = self.state
+        changed = old.diff(new)
+        self.refreshes += 1
+        if not changed:
+            return
+        self.state = new
+        logger.info(f"Network change: {', '.join(sorted(changed))} (default route {new.default_route})")
+        for callback in list(self._callbacks):
+            try:
+                callback(old, new, changed)
+            except Exception as e:
+                logger.error(f"Network change handler failed: {e}")
+
+    def stop(self):
+        self.running = False
+
+    def stats(self) -> dict:
+        return {
+            "tracking": self.available,
+            "events": self.events_seen,
+            "refreshes": self.refreshes,
+            "overruns": self.overruns,
+            "default_route": list(self.state.default_route) if self.state.default_route else None,
+            "gateways": dict(self.state.gateways),
+            "interfaces": self.state.interface_names(),
+        }
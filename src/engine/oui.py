@@ -0,0 +1,189 @@
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+VENDORS_TXT = os.path.join(ENGINE_DIR, "mac-vendors.txt")
+INDEX_PATH = os.path.join(ENGINE_DIR, "mac-vendors.idx")
+
+MAGIC = b"AGXO"
+VERSION = 1
+# IEEE block sizes, longest first so the most specific assignment wins
+PREFIX_BITS = (36, 28, 24) # MA-S, MA-M, MA-L
+HEADER = struct.Struct("<4sHH")
+TABLE = struct.Struct("<BII") # prefix bits, entry count, offset of keys
+KEY = struct.Struct("<Q")
+VALUE = struct.Struct("<I")
+
+def parse_prefix(text: str) -> Optional[Tuple[int, int]]:
+    """'00:1B:C5:0' / '001BC50' -> (bits, value). None if not an IEEE block size."""
+    clean = text.replace(":", "").replace("-", "").replace(".", "").strip().upper()
+    bits = len(clean) * 4
+    if bits not in PREFIX_BITS:
+        return None
+    try:
+        return bits, int(clean, 16)
+    except ValueError:
+        return None
+
+def build_index(entries: Iterable[Tuple[str, str]]) -> bytes:
+    """
+    Serializes (prefix, vendor) pairs into the on-disk index:
+
+        header | table directory | per table: sorted uint64 keys, uint32 string offsets | string table
+
+    Vendor names are deduplicated into one length-prefixed UTF-8 string table.
+    """
+    tables: Dict[int, Dict[int, str]] = {bits: {} for bits in PREFIX_BITS}
+    for prefix, vendor in entries:
+        parsed = parse_prefix(prefix)
+        if parsed and vendor:
+            tables[parsed[0]][parsed[1]] = vendor
+
+    strings = bytearray()
+    string_offsets: Dict[str, int] = {}
+    def intern(name: str) -> int:
+        if name not in string_offsets:
+            raw = name.encode("utf8")[:0xFFFF]
+            string_offsets[name] = len(strings)
+            strings.extend(struct.pack("<H", len(raw)) + raw)
+        return string_offsets[name]
+
+    body = bytearray()
+    directory = []
+    data_start = HEADER.size + TABLE.size * len(PREFIX_BITS)
+    for bits in PREFIX_BITS:
+        keys = sorted(tables[bits])
+        directory.append(TABLE.pack(bits, len(keys), data_start + len(body)))
+        for key in keys:
+            body += KEY.pack(key)
+        for key in keys:
+            body += VALUE.pack(intern(tables[bits][key]))
+
+    return HEADER.pack(MAGIC, VERSION, len(PREFIX_BITS)) + b"".join(directory) + bytes(body) + bytes(strings)
+
+def read_vendors_txt(path: str = VENDORS_TXT):
+    """Yields (prefix, vendor) from the `PREFIX:Vendor` text file."""
+    with open(path, "rb") as f:
+        for line in f:
+            if b":" in line:
+                prefix, vendor = line.split(b":", 1)
+                yield prefix.decode("utf8"), vendor.strip().decode("utf8", "replace")
+
+class _Keys:
+    """Read-only sequence over one table's packed keys, so `bisect` works in place."""
+    def __init__(self, buf, offset: int, count: int):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return KEY.unpack_from(self.buf, self.offset + i * KEY.size)[0]
+
+class OuiIndex:
+    """Longest-prefix vendor lookup over a memory-mapped (or in-memory) index."""
+    def __init__(self, buf):
+        self.buf = buf
+        magic, version, count = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not an OUI index (or unsupported version)")
+        self.tables = []
+        for i in range(count):
+            bits, n, offset = TABLE.unpack_from(buf, HEADER.size + i * TABLE.size)
+            self.tables.append((bits, _Keys(buf, offset, n), offset + n * KEY.size))
+        last_bits, last_keys, last_values = self.tables[-1]
+        self.strings_offset = last_values + len(last_keys) * VALUE.size
+
+    @classmethod
+    def open(cls, path: str = INDEX_PATH):
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return sum(len(keys) for _, keys, _ in self.tables)
+
+    def _string(self, offset: int) -> str:
+        pos = self.strings_offset + offset
+        (length,) = struct.unpack_from("<H", self.buf, pos)
+        return bytes(self.buf[pos + 2:pos + 2 + length]).decode("utf8")
+
+    def lookup(self, mac: str) -> Optional[str]:
+        clean = mac.replace(":", "").replace("-", "").replace(".", "")
+        try:
+            value = int(clean[:12].ljust(12, "0"), 16)
+        except ValueError:
+            return None
+        for bits, keys, values_offset in self.tables:
+            key = value >> (48 - bits)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                (offset,) = VALUE.unpack_from(self.buf, values_offset + i * VALUE.size)
+                return self._string(offset)
+        return None
+
+_index: Optional[OuiIndex] = None
+_index_attempted = False
+_index_lock = threading.Lock()
+
+def load_index(index_path: str = INDEX_PATH, vendors_path: str = VENDORS_TXT) -> OuiIndex:
+    """
+    Maps the compiled index, rebuilding it first when mac-vendors.txt is newer
+    (an edited or updated vendor list must not be shadowed by a stale .idx).
+    Without a writable index file the rebuilt index is kept in memory.
+    """
+    try:
+        stale = os.path.getmtime(vendors_path) > os.path.getmtime(index_path)
+    except OSError:
+        stale = not os.path.exists(index_path) # No text file: the index is all we have
+    if not stale:
+        return OuiIndex.open(index_path)
+    data = build_index(read_vendors_txt(vendors_path))
+    try:
+        tmp = index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, index_path)
+        logger.info(f"Recompiled {index_path} from the newer {vendors_path}")
+        return OuiIndex.open(index_path)
+    except OSError as e:
+        logger.info(f"Using in-memory OUI index ({index_path} not writable: {e})")
+        return OuiIndex(data)
+
+def get_index() -> Optional[OuiIndex]:
+    """Process-wide index shared by every engine, see load_index()."""
+    global _index, _index_attempted
+    if not _index_attempted:
+        with _index_lock:
+            if not _index_attempted:
+                try:
+                    _index = load_index()
+                    logger.info(f"Loaded {len(_index)} OUI prefixes")
+                except Exception as e:
+                    logger.error(f"Vendor load failed: {e}")
+                _index_attempted = True
+    return _index
+
+def get_vendor(mac: str) -> str:
+    """Vendor name for a MAC, "Private/Random" for locally administered ones, else "Unknown"."""
+    return _cached_vendor(mac.replace(":", "").replace("-", "").upper()[:12])
+
+@lru_cache(maxsize=4096)
+def _cached_vendor(clean_mac: str) -> str:
+    # The second least significant bit of the first octet marks locally administered addresses
+    try:
+        if int(clean_mac[:2], 16) & 0b00000010:
+            return "Private/Random"
+    except ValueError:
+        return "Unknown"
+    index = get_index()
+    return (index.lookup(clean_mac) if index else None) or "Unknown"
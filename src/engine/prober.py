@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.events import DeviceEventType
+
+logger = logging.getLogger(__name__)
+
+HTTP_PROBE = b"HEAD / HTTP/1.0\r\n\r\n"
+RTSP_PROBE = b"OPTIONS * RTSP/1.0\r\nCSeq: 1\r\n\r\n"
+
+class ProbeResult:
+    __slots__ = ("ip", "ports", "banners", "expires")
+
+    def __init__(self, ip: str, ports: List[int], banners: Dict[int, str], expires: float):
+        self.ip = ip
+        self.ports = ports
+        self.banners = banners
+        self.expires = expires
+
+    def to_dict(self) -> dict:
+        return {"ip": self.ip, "open_ports": self.ports, "banners": self.banners, "expires": self.expires}
+
+class HostLimiter:
+    """Caps concurrent connects to one host and spaces them at `rate` per second."""
+    def __init__(self, concurrency: int, rate: float):
+        self.sem = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate
+        self.next_slot = 0.0
+
+    async def __aenter__(self):
+        await self.sem.acquire()
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def __aexit__(self, *exc):
+        self.sem.release()
+
+class PortProber(threading.Thread):
+    """
+    Opt-in TCP connect scanner that fills Device.open_ports.
+
+    Runs its own asyncio loop. A priority queue puts new or re-addressed
+    devices (from store events) ahead of periodic refreshes. A global
+    semaphore bounds open sockets across all hosts, and each host gets a
+    HostLimiter. Open ports on BANNER_PORTS get a short banner read. Results
+    are cached per MAC for `ttl` seconds and dropped when the device is
+    removed. Addresses returned by `excluded` (the gateways and our own) are
+    never probed. `attach()` runs it on a shared EngineRuntime loop instead.
+    """
+    NEW, REFRESH = 0, 1
+
+    DEFAULT_PORTS = [21, 22, 23, 53, 80, 443, 445, 554, 631, 1883, 3389, 5000, 5001, 8008, 8009, 8080, 8443, 9100, 32400, 62078]
+    # Port -> bytes to send first (None: just listen, the server talks first)
+    BANNER_PORTS = {21: None, 22: None, 23: None, 80: HTTP_PROBE, 554: RTSP_PROBE, 8008: HTTP_PROBE, 8080: HTTP_PROBE}
+
+    def __init__(self, device_store, ports: List[int] = None, concurrency: int = 256, hosts_in_parallel: int = 32,
+                 per_host_concurrency: int = 8, per_host_rate: float = 50.0, timeout: float = 0.5,
+                 ttl: float = 3600.0, refresh_check: float = 30.0, excluded: Callable[[], Iterable[str]] = None):
+        super().__init__(daemon=True)
+        self.device_store = device_store
+        self.ports = ports or self.DEFAULT_PORTS
+        self.concurrency = concurrency
+        self.hosts_in_parallel = hosts_in_parallel
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rate = per_host_rate
+        self.timeout = timeout
+        self.ttl = ttl
+        self.refresh_check = refresh_check
+        self.excluded = excluded or (lambda: ())
+        self.running = True
+        self.cache: Dict[str, ProbeResult] = {}
+        self.hosts_probed = 0
+        self.connects = 0
+        self._queued = set()
+        self._seq = itertools.count()
+        self._global = asyncio.Semaphore(concurrency) # Binds to the prober's loop on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._events = device_store.events.subscribe(
+            types=[DeviceEventType.ADDED, DeviceEventType.IP_CHANGED, DeviceEventType.REMOVED], maxsize=4096)
+
+    def attach(self, runtime):
+        self._loop = runtime.loop
+        runtime.spawn("prober", self._main)
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        except Exception as e:
+            logger.error(f"Port prober crashed: {e}")
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        self._queue = asyncio.PriorityQueue()
+        tasks = [asyncio.create_task(self._worker()) for _ in range(self.hosts_in_parallel)]
+        tasks.append(asyncio.create_task(self._follow_events()))
+        while self.running:
+            self._enqueue_due()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refresh_check)
+            except asyncio.TimeoutError:
+                pass
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _enqueue(self, mac: str, priority: int):
+        if priority == self.REFRESH and mac in self._queued:
+            return
+        self._queued.add(mac)
+        self._queue.put_nowait((priority, next(self._seq), mac))
+
+    def _enqueue_due(self):
+        now = time.time()
+        excluded = set(self.excluded())
+        for dev in self.device_store.view.devices.values():
+            cached = self.cache.get(dev.key)
+            if dev.ip and dev.ip not in excluded and (cached is None or cached.expires <= now or cached.ip != dev.ip):
+                self._enqueue(dev.key, self.REFRESH)
+
+    async def _follow_events(self):
+        while self.running:
+            event = await self._events.aget()
+            if event is None:
+                return
+            if event.type == DeviceEventType.REMOVED:
+                self.cache.pop(event.mac, None)
+            elif event.data.get("ip"):
+                self.cache.pop(event.mac, None)
+                if event.data["ip"] not in set(self.excluded()):
+                    self._enqueue(event.mac, self.NEW)
+
+    async def _worker(self):
+        while True:
+            priority, _, mac = await self._queue.get()
+            try:
+                await self.probe_device(mac)
+            except Exception as e:
+                logger.debug(f"Probe of {mac} failed: {e}")
+            finally:
+                self._queued.discard(mac) # Kept while probing so refreshes don't double up
+
+    async def probe_device(self, mac: str):
+        dev = self.device_store.get(mac)
+        if dev is None or not dev.ip:
+            return
+        ip = dev.ip
+        cached = self.cache.get(mac)
+        if cached and cached.ip == ip and cached.expires > time.time():
+            return
+
+        limiter = HostLimiter(self.per_host_concurrency, self.per_host_rate)
+        results = await asyncio.gather(*(self._probe_port(ip, port, limiter) for port in self.ports))
+        open_ports = sorted(port for port, is_open, _ in results if is_open)
+        banners = {port: banner for port, is_open, banner in results if banner}
+        self.cache[mac] = ProbeResult(ip, open_ports, banners, time.time() + self.ttl)
+        self.hosts_probed += 1
+        self.device_store.set_open_ports(mac, open_ports)
+
+    async def _probe_port(self, ip: str, port: int, limiter: HostLimiter):
+        async with limiter:
+            async with self._global:
+                self.connects += 1
+                try:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=self.timeout)
+                except (OSError, asyncio.TimeoutError):
+                    return port, False, None
+                banner = None
+                try:
+                    if port in self.BANNER_PORTS:
+                        banner = await self._grab_banner(reader, writer, self.BANNER_PORTS[port])
+                finally:
+                    writer.close()
+                return port, True, banner
+
+    async def _grab_banner(self, reader, writer, probe: Optional[bytes]) -> Optional[str]:
+        try:
+            if probe:
+                writer.write(probe)
+                await writer.drain()
+            data = await asyncio.wait_for(reader.read(512), timeout=self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        text = data.decode("utf8", "ignore")
+        for line in text.splitlines():
+            if line.lower().startswith("server:"):
+                return line.split(":", 1)[1].strip()[:80]
+        first = text.splitlines()[0].strip() if text.strip() else ""
+        return first[:80] or None
+
+    def stop(self):
+        self.running = False
+        self._events.close()
+        if self._loop is not None and self._wake is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "hosts_probed": self.hosts_probed,
+            "connects": self.connects,
+            "cached": len(self.cache),
+            "queued": len(self._queued),
+        }
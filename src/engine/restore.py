@@ -0,0 +1,208 @@
+import collections
+import logging
+import socket
+import time
+from typing import Iterable, List, Optional, Set, Tuple
+
+from src.engine.sweep import build_arp
+
+logger = logging.getLogger(__name__)
+
+# Floor on the time a restore may take: two frames per target at the ~1000
+# frames/s a congested transmit queue still drains. Above this the budget
+# still holds; it just grows with the target count instead of cutting the
+# first round short.
+SECONDS_PER_TARGET = 0.002
+
+def restore_budget(budget: float, targets: int) -> float:
+    """Seconds allowed for restoring `targets` targets with a nominal `budget`."""
+    return max(budget, targets * SECONDS_PER_TARGET)
+
+class RestoreProgress:
+    """Counters for one restoration; kept by the monitor for /api/restore."""
+    def __init__(self, reason: str, targets: int):
+        self.reason = reason
+        self.targets = targets
+        self.restored = 0 # Targets whose MACs were known, so frames were built
+        self.frames = 0
+        self.sent = 0
+        self.failed = 0
+        self.unsent = 0 # Frames no round managed to send
+        self.requeued = 0 # Sends retried because the transmit queue was full
+        self.unrestored: List[str] = [] # Targets that got no correcting frame (MAC unknown or never sent)
+        self.rounds = 0 # Full rounds completed
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "reason": self.reason,
+            "targets": self.targets,
+            "restored": self.restored,
+            "frames": self.frames,
+            "sent": self.sent,
+            "failed": self.failed,
+            "unsent": self.unsent,
+            "requeued": self.requeued,
+            "unrestored": self.unrestored,
+            "rounds": self.rounds,
+            "complete": self.finished is not None and self.error is None and self.unsent == 0,
+            "started": self.started,
+            "seconds": round((self.finished or time.time()) - self.started, 3),
+            "error": self.error,
+        }
+
+class ArpRestorer:
+    """
+    Undoes ARP spoofing for any number of targets at once.
+
+    For every target two correct is-at frames are built up front: to the
+    target, "the gateway is at <gateway MAC>", and to the gateway, "the
+    target is at <target MAC>". Each round sends every frame over one
+    non-blocking raw socket in batches, so all targets are restored together
+    rather than one after another, and `rounds` rounds are spread over the
+    budget. A frame refused with EAGAIN (transmit queue full) is requeued
+    behind the rest of its round, and frames no round has sent yet go first.
+
+    Everything, the first round included, ends at restore_budget(): `budget`,
+    raised to SECONDS_PER_TARGET per target so large restores can get every
+    frame out once. Frames still unsent then are reported, not waited for.
+    """
+    def __init__(self, interface: str, host_mac: str = None, rounds: int = 5, budget: float = 1.0, batch: int = 64):
+        self.interface = interface
+        self.host_mac = host_mac or _interface_mac(interface)
+        self.rounds = rounds
+        self.budget = budget
+        self.batch = batch
+
+    def build(self, gateway_ip: str, gateway_mac: str, pairs: Iterable[Tuple[str, str]]) -> List[bytes]:
+        """Frames for (target_ip, target_mac) pairs; the Ethernet source is our MAC where known."""
+        frames = []
+        for target_ip, target_mac in pairs:
+            # Restore target: Gateway is at GatewayMAC
+            frames.append(build_arp(2, self.host_mac or gateway_mac, target_mac, gateway_mac, gateway_ip, target_mac, target_ip))
+            # Restore gateway: Target is at TargetMAC
+            frames.append(build_arp(2, self.host_mac or target_mac, gateway_mac, target_mac, target_ip, gateway_mac, gateway_ip))
+        return frames
+
+    def run(self, frames: List[bytes], progress: RestoreProgress, send=None, targets: List[str] = None) -> RestoreProgress:
+        """
+        Emits `frames` in `rounds` interleaved bursts; `send` overrides the raw
+        socket (tests). `targets` names the target of each frame pair from
+        build(), for reporting the ones left unrestored.
+        """
+        progress.frames = len(frames)
+        delivered: Set[int] = set() # Indexes of frames sent at least once
+        close = None
+        try:
+            if send is None and frames:
+                send, close = self._open()
+            budget = restore_budget(self.budget, len(frames) // 2)
+            deadline = progress.started + budget
+            spacing = budget / max(1, self.rounds)
+            for round_no in range(self.rounds if frames else 0):
+                due = progress.started + round_no * spacing
+                if due > time.time():
+                    time.sleep(due - time.time())
+                if not self._send_round(frames, send, delivered, deadline, progress):
+                    break # Out of budget
+                progress.rounds += 1
+        except Exception as e:
+            progress.error = str(e)
+            logger.error(f"ARP restoration on {self.interface} failed: {e}")
+        finally:
+            if close:
+                close()
+            progress.unsent = len(frames) - len(delivered)
+            if targets:
+                missed = {targets[i // 2] for i in range(len(frames)) if i not in delivered}
+                progress.unrestored.extend(sorted(missed))
+            progress.finished = time.time()
+        return progress
+
+    def _send_round(self, frames: List[bytes], send, delivered: Set[int], deadline: float, progress: RestoreProgress) -> bool:
+        """One round over every frame, never-sent ones first. False if the deadline cut it short."""
+        pending = collections.deque(sorted(range(len(frames)), key=lambda i: i in delivered))
+        while pending:
+            if time.time() > deadline:
+                return False
+            batch = [pending.popleft() for _ in range(min(self.batch, len(pending)))]
+            blocked = []
+            for i in batch:
+                try:
+                    send(frames[i])
+                    progress.sent += 1
+                    delivered.add(i)
+                except BlockingIOError:
+                    blocked.append(i) # Transmit queue full: retry after the rest of the round
+                except OSError:
+                    progress.failed += 1
+            if blocked:
+                progress.requeued += len(blocked)
+                pending.extend(blocked)
+                if len(blocked) == len(batch):
+                    time.sleep(0.001) # Nothing went out; give the queue a moment to drain
+        return True
+
+    def _open(self):
+        try:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+            sock.bind((str(self.interface), 0))
+            sock.setblocking(False) # A full transmit queue raises EAGAIN and the frame is requeued
+            return sock.send, sock.close
+        except (OSError, AttributeError):
+            # No AF_PACKET (macOS) or no CAP_NET_RAW: Scapy's layer-2 socket reports the real error
+            from scapy.all import Ether, conf
+            l2 = conf.L2socket(iface=self.interface)
+            return (lambda frame: l2.send(Ether(frame))), l2.close
+
+def _interface_mac(interface: str) -> Optional[str]:
+    try:
+        with open(f"/sys/class/net/{interface}/address") as f:
+            return f.read().strip()
+    except (OSError, TypeError):
+        return None
+
+def _kernel_mac(ip: str, interface: str) -> Optional[str]:
+    from src.engine import netlink
+    _, neighbors = netlink.read_neighbors(interface)
+    return next((n.mac for n in neighbors if n.ip == ip), None)
+
+def restore_targets(device_store, segment: str, interface: str, gateway_ip: str, targets: Iterable[str],
+                    host_ip: str = None, host_mac: str = None, reason: str = "shutdown",
+                    budget: float = 1.0, rounds: int = 5, send=None) -> RestoreProgress:
+    """
+    Restores the gateway <-> target ARP entries for `targets` on one segment.
+    MACs come from the store (the kernel neighbor table for the gateway as a
+    fallback); nothing is resolved on the wire, so this is safe on shutdown.
+    """
+    targets = [ip for ip in dict.fromkeys(targets) if ip and ip not in (gateway_ip, host_ip)]
+    progress = RestoreProgress(reason, len(targets))
+    if not targets:
+        progress.finished = time.time()
+        return progress
+    progress.unrestored = list(targets) # Until frames for them are built and sent
+    gateway = device_store.get_by_ip(gateway_ip, segment) if gateway_ip else None
+    gateway_mac = gateway.mac if gateway else (_kernel_mac(gateway_ip, interface) if gateway_ip else None)
+    if not gateway_mac:
+        progress.error = f"MAC of gateway {gateway_ip} unknown"
+        progress.finished = time.time()
+        logger.warning(f"Cannot restore ARP on {interface}: {progress.error}")
+        return progress
+
+    pairs = []
+    for ip in targets:
+        dev = device_store.get_by_ip(ip, segment)
+        if dev:
+            pairs.append((ip, dev.mac))
+    progress.restored = len(pairs)
+    progress.unrestored = [ip for ip in targets if ip not in dict(pairs)]
+    restorer = ArpRestorer(interface, host_mac, rounds=rounds, budget=budget)
+    restorer.run(restorer.build(gateway_ip, gateway_mac, pairs), progress, send=send, targets=[ip for ip, _ in pairs])
+    logger.info(f"Restored ARP for {progress.restored}/{progress.targets} targets on {interface} "
+                f"({progress.sent} frames in {progress.to_dict()['seconds']}s)")
+    if progress.unrestored:
+        logger.warning(f"ARP restoration on {interface} missed {len(progress.unrestored)} targets "
+                       f"({progress.unsent} frames unsent): {', '.join(progress.unrestored[:20])}")
+    return progress
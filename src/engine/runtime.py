@@ -0,0 +1,145 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class EngineRuntime(threading.Thread):
+    """
+    The single asyncio loop the engines run on.
+
+    Engines `attach()` to it instead of starting their own threads: sockets
+    are registered as non-blocking readers, periodic work is a task that
+    awaits a timer or a wake-up event, and store events are awaited with
+    `Subscription.aget()`. `offload()` hands CPU-heavy work to a small
+    thread pool. `stop()` cancels every task (newest first), runs the
+    registered cleanups and joins the loop thread, so shutdown finishes in
+    a bounded time regardless of what the engines were doing.
+    """
+    def __init__(self, workers: int = 2):
+        super().__init__(daemon=True, name="engine-runtime")
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine-cpu")
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._readers: List[int] = []
+        self._cleanups: List[Callable[[], None]] = []
+        self._ready = threading.Event()
+        self.lag = 0.0 # Worst timer overshoot of the last heartbeat window, in seconds
+        self.crashes = 0
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.spawn("heartbeat", self._heartbeat)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def in_loop(self) -> bool:
+        return self.loop is not None and threading.current_thread() is self
+
+    def call(self, fn: Callable, *args):
+        """Runs `fn` on the loop thread (directly if already there)."""
+        if self.in_loop():
+            fn(*args)
+            return
+        try:
+            self.loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            pass # Runtime already stopped
+
+    def spawn(self, name: str, coro_fn: Callable, *args):
+        """Starts `coro_fn(*args)` as a named task; safe to call from any thread."""
+        def create():
+            task = self.loop.create_task(coro_fn(*args), name=name)
+            self.tasks[name] = task
+            task.add_done_callback(lambda t: self._task_done(name, t))
+        self.call(create)
+
+    def _task_done(self, name: str, task: asyncio.Task):
+        if self.tasks.get(name) is task:
+            del self.tasks[name]
+        if not task.cancelled() and task.exception() is not None:
+            self.crashes += 1
+            logger.error(f"Engine task {name} crashed: {task.exception()!r}")
+
+    def add_reader(self, sock, callback: Callable[[], None]):
+        """Calls `callback` on the loop whenever `sock` is readable; closed on stop."""
+        sock.setblocking(False)
+        def register():
+            self.loop.add_reader(sock.fileno(), callback)
+            self._readers.append(sock.fileno())
+        self.call(register)
+        self.on_stop(sock.close)
+
+    def remove_reader(self, sock):
+        def unregister():
+            if sock.fileno() in self._readers:
+                self._readers.remove(sock.fileno())
+                self.loop.remove_reader(sock.fileno())
+        self.call(unregister)
+
+    def on_stop(self, cleanup: Callable[[], None]):
+        self._cleanups.append(cleanup)
+
+    async def offload(self, fn: Callable, *args):
+        """Runs CPU-bound `fn` on the worker pool without blocking the loop."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _heartbeat(self):
+        interval, worst, window_start = 1.0, 0.0, time.monotonic()
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            worst = max(worst, time.monotonic() - expected)
+            if time.monotonic() - window_start >= 10:
+                self.lag, worst, window_start = worst, 0.0, time.monotonic()
+
+    async def _shutdown(self, timeout: float):
+        for fd in self._readers:
+            self.loop.remove_reader(fd)
+        self._readers.clear()
+        tasks = list(self.tasks.values())[::-1]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                logger.warning(f"Engine task {task.get_name()} ignored cancellation")
+        for cleanup in self._cleanups:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.debug(f"Runtime cleanup failed: {e}")
+        self._cleanups.clear()
+
+    def stop(self, timeout: float = 3.0):
+        if self.loop is None or not self.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(timeout * 0.8), self.loop)
+        try:
+            future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            logger.warning("Engine runtime shutdown timed out")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_alive(),
+            "tasks": sorted(self.tasks),
+            "readers": len(self._readers),
+            "loop_lag_ms": round(self.lag * 1000, 1),
+            "crashed_tasks": self.crashes,
+            "threads": threading.active_count(),
+        }
@@ -1,126 +1,294 @@
+import asyncio
+import socket
 import threading
 import time
 import logging
 from scapy.all import srp, Ether, ARP, conf
-from src.device_store import DeviceStore
-from src.engine.classifier import DeviceClassifier
+from src.device_store import DeviceStore, device_key
+from src.engine.sweep import ETH_P_ARP, ArpSweeper, parse_arp, parse_arp_target, subnet_hosts
+from src.engine.liveness import LivenessTracker
+from src.engine import netlink, oui
 
 # Suppress scapy warnings
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
 class NetworkScanner(threading.Thread):
-    def __init__(self, device_store: DeviceStore, interface: str = None, scan_interval: int = 30):
+    """
+    Incremental ARP sweeps plus passive ARP listening. Runs as a thread with
+    a Scapy sniffer, or, via `attach()`, as a task on an EngineRuntime with
+    the passive listener as a raw-socket reader.
+    """
+    NEIGHBOR_REFRESH = 15 # Seconds between kernel neighbor-table imports
+
+    def __init__(self, device_store: DeviceStore, interface: str = None, scan_interval: int = 30, rate_pps: int = 500, ipv6_targets: dict = None, network=None, segment: str = ""):
         super().__init__()
         self.device_store = device_store
+        self.segment = segment # Store segment for everything found on `interface`
         self.interface = interface or conf.iface
         self.scan_interval = scan_interval
-        self.scan_interval = scan_interval
+        self.rate_pps = rate_pps
+        self.sweeper = None # Current ArpSweeper, exposes live progress
+        self.last_sweep = None # SweepProgress of the last finished sweep
+        self.liveness = LivenessTracker(base_interval=scan_interval)
+        self.ipv6_targets = ipv6_targets if ipv6_targets is not None else {} # Shared with the monitor: MAC -> IPv6
+        self.neighbor_import = {} # Stats of the last kernel neighbor-table import
+        self._last_neighbor_import = 0
+        self.network = network # NetworkTracker; replaces per-sweep netifaces queries when present
+        self._rescan = False
+        self.runtime = None # EngineRuntime when attached
+        self._wake = None
         self.running = True
         
-        # Determine local cache path
-        import os
-        self.vendors = {}
-        cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mac-vendors.txt")
-        self.classifier = DeviceClassifier()
-        
-        try:
-             # Load vendors synchronously into a simple dict
-             with open(cache_path, "rb") as f:
-                 for line in f:
-                     if b":" in line:
-                         prefix, vendor = line.split(b":", 1)
-                         self.vendors[prefix.decode("utf8")] = vendor.strip().decode("utf8")
-             logging.info(f"Loaded {len(self.vendors)} vendors from {cache_path}")
-        except Exception as e:
-            logging.error(f"Vendor load failed: {e}")
-
+        oui.get_index() # Map the shared vendor index up front rather than on the first reply
 
     def get_vendor(self, mac_address):
         try:
-            # Sanitize MAC: 00:00:00 -> 000000
-            clean_mac = mac_address.replace(":", "").replace("-", "").upper()
-            
-            # 1. Check for Private/Random MAC (Locally Administered Bit) first
-            # The second least significant bit of the first octet
-            try:
-                first_octet = int(clean_mac[:2], 16)
-                if (first_octet & 0b00000010):
-                    return "Private/Random"
-            except:
-                pass
-
-            # 2. Check OUI Database
-            prefix = clean_mac[:6]
-            if prefix in self.vendors:
-                return self.vendors[prefix]
-                
-            return "Unknown"
+            return oui.get_vendor(mac_address)
         except Exception as e:
             logging.error(f"Lookup error: {e}")
             return "Unknown"
 
+    def import_neighbors(self):
+        """
+        Seeds the store from the kernel's ARP/NDP table in one bulk read, so
+        the inventory is populated before the first sweep finishes.
+        """
+        started = time.time()
+        self._last_neighbor_import = started
+        source, neighbors = netlink.read_neighbors(self.interface)
+        imported = 0
+        for n in sorted(neighbors, key=lambda n: ":" in n.ip): # IPv4 first, so NDP entries find their device
+            if ":" in n.ip:
+                # Keep a global address over a link-local one for IPv6 blocking
+                current = self.ipv6_targets.get(n.mac)
+                if device_key(n.mac, self.segment) in self.device_store.view.devices and (not current or current.startswith("fe80")):
+                    self.ipv6_targets[n.mac] = n.ip
+                continue
+            # STALE/PROBE/PERMANENT entries prove the host existed, not that it's up: create, but don't refresh
+            if n.confirmed or self.device_store.get(device_key(n.mac, self.segment)) is None:
+                self.device_store.add_or_update(n.ip, n.mac, self.get_vendor(n.mac), segment=self.segment)
+                imported += 1
+        self.neighbor_import = {"source": source, "entries": len(neighbors), "imported": imported,
+                                "seconds": round(time.time() - started, 4), "at": started}
+        return imported
+
+    def _neighbors_due(self) -> bool:
+        return time.time() - self._last_neighbor_import >= self.NEIGHBOR_REFRESH
+
+    def _plan(self):
+        """(our ip, our mac, addresses due for probing) for the next sweep."""
+        if self._neighbors_due():
+            self.import_neighbors()
+
+        ip, subnet, src_mac = self._local_network()
+
+        # logging.info(f"Scanning {subnet} on {self.interface}...")
+
+        # Only probe addresses nobody has seen lately (see LivenessTracker)
+        self.liveness.base_interval = self.scan_interval
+        self.liveness.observe_devices(d for d in self.device_store.view.devices.values() if d.segment == self.segment)
+        hosts = [h for h in subnet_hosts(subnet) if h != ip]
+        return ip, src_mac, self.liveness.due(hosts)
+
     def scan(self):
         try:
-            # Auto-detect interface with Internet access
-            import netifaces
-            import ipaddress
-            
-            if self.interface is None or self.interface == conf.iface:
-                try:
-                    # Get default gateway interface
-                    gws = netifaces.gateways()
-                    default_gw = gws.get('default', {}).get(netifaces.AF_INET)
-                    if default_gw:
-                        self.interface = default_gw[1]
-                except:
-                    pass
-
-            # Calculate Subnet
+            ip, src_mac, targets = self._plan()
+            if not targets:
+                return
+
+            replied = set()
+            def on_reply(reply_ip, reply_mac):
+                replied.add(reply_ip)
+                self._handle_reply(reply_ip, reply_mac)
+
             try:
-                iface_details = netifaces.ifaddresses(self.interface)[netifaces.AF_INET][0]
-                ip = iface_details['addr']
-                mask = iface_details['netmask']
-                # Calculate network
-                network = ipaddress.IPv4Network(f"{ip}/{mask}", strict=False)
-                subnet = str(network)
-            except Exception as e:
-                logging.error(f"Could not determine subnet: {e}")
-                subnet = "192.168.1.0/24" # Fallback
-
-            # logging.info(f"Scanning {subnet} on {self.interface}...")
-            
-            ans, unans = srp(Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=subnet), 
-                             iface=self.interface, 
-                             timeout=2, 
-                             verbose=0)
-
-            for sent, received in ans:
-                ip = received.psrc
-                mac = received.hwsrc
-                logging.info(f"Discovered: IP={ip}, MAC={mac}")
-                vendor = self.get_vendor(mac)
-                device = self.device_store.add_or_update(ip, mac, vendor)
-                
-                # Run Classification
-                category, confidence = self.classifier.classify(device)
-                device.category = category
-                device.confidence = confidence
+                if ip and src_mac and ArpSweeper.available():
+                    try:
+                        self.sweeper = ArpSweeper(self.interface, src_mac, ip, rate_pps=self.rate_pps)
+                        self.last_sweep = self.sweeper.sweep(targets, on_reply)
+                        return
+                    except Exception as e:
+                        # e.g. no CAP_NET_RAW for AF_PACKET; Scapy below reports the real error
+                        logging.warning(f"Raw ARP sweep unavailable ({e}), falling back to Scapy")
+                self._scapy_sweep(targets, on_reply)
+            finally:
+                self.liveness.record(targets, replied)
                 
         except Exception as e:
             logging.error(f"Scan error: {e}")
 
+    async def scan_async(self):
+        """
+        scan() for the runtime: the raw sweep runs on the loop; the neighbor
+        import (a blocking netlink dump) and Scapy's srp are offloaded.
+        """
+        try:
+            if self._neighbors_due():
+                await self.runtime.offload(self.import_neighbors)
+            ip, src_mac, targets = self._plan()
+            if not targets:
+                return
+
+            replied = set()
+            def on_reply(reply_ip, reply_mac):
+                replied.add(reply_ip)
+                self._handle_reply(reply_ip, reply_mac)
+
+            try:
+                if ip and src_mac and ArpSweeper.available():
+                    try:
+                        self.sweeper = ArpSweeper(self.interface, src_mac, ip, rate_pps=self.rate_pps)
+                        self.last_sweep = await self.sweeper.sweep_async(targets, on_reply)
+                        return
+                    except OSError as e:
+                        logging.warning(f"Raw ARP sweep unavailable ({e}), falling back to Scapy")
+                await self.runtime.offload(self._scapy_sweep, targets, on_reply)
+            finally:
+                self.liveness.record(targets, replied)
+        except Exception as e:
+            logging.error(f"Scan error: {e}")
+
+    def _scapy_sweep(self, targets, on_reply):
+        ans, unans = srp(Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=targets), 
+                         iface=self.interface, 
+                         timeout=2, 
+                         verbose=0)
+
+        for sent, received in ans:
+            on_reply(received.psrc, received.hwsrc)
+
+    def _local_network(self):
+        """(our ip, subnet, our mac) on the scan interface, from the tracker's cached view if available."""
+        import ipaddress
+        if self.network is not None:
+            state = self.network.state
+            # Auto-detect interface with Internet access
+            if (self.interface is None or self.interface == conf.iface) and state.default_route:
+                self.interface = state.default_route[1]
+            addr = state.ipv4(self.interface)
+            link = state.link(self.interface) or {}
+            if addr:
+                return addr[0], str(ipaddress.IPv4Network(f"{addr[0]}/{addr[1]}", strict=False)), link.get("mac")
+            logging.error(f"Could not determine subnet: no IPv4 address on {self.interface}")
+            return None, "192.168.1.0/24", None # Fallback; Scapy path only
+
+        # Auto-detect interface with Internet access
+        import netifaces
+        if self.interface is None or self.interface == conf.iface:
+            try:
+                # Get default gateway interface
+                gws = netifaces.gateways()
+                default_gw = gws.get('default', {}).get(netifaces.AF_INET)
+                if default_gw:
+                    self.interface = default_gw[1]
+            except:
+                pass
+
+        # Calculate Subnet
+        try:
+            addrs = netifaces.ifaddresses(self.interface)
+            iface_details = addrs[netifaces.AF_INET][0]
+            ip = iface_details['addr']
+            network = ipaddress.IPv4Network(f"{ip}/{iface_details['netmask']}", strict=False)
+            src_mac = addrs.get(netifaces.AF_LINK, [{}])[0].get('addr')
+            return ip, str(network), src_mac
+        except Exception as e:
+            logging.error(f"Could not determine subnet: {e}")
+            return None, "192.168.1.0/24", None # No source address to sweep from; Scapy path only
+
+    def request_scan(self):
+        """Sweeps (and re-imports neighbors) on the next loop tick, e.g. after an address change."""
+        self._last_neighbor_import = 0
+        self._rescan = True
+        if self.runtime is not None:
+            self.runtime.call(self._wake.set)
+
+    def _handle_reply(self, ip, mac):
+        logging.info(f"Discovered: IP={ip}, MAC={mac}")
+        vendor = self.get_vendor(mac)
+        # Classification follows from the store's ADDED/VENDOR_CHANGED events (ClassificationWorker)
+        self.device_store.add_or_update(ip, mac, vendor, segment=self.segment)
+
+    def sweep_status(self):
+        current = self.sweeper.progress if self.sweeper else None
+        return {
+            "current": current.to_dict() if current and current.finished is None else None,
+            "last": self.last_sweep.to_dict() if self.last_sweep else None,
+            "rate_pps": self.rate_pps,
+            "liveness": self.liveness.stats(),
+            "neighbors": self.neighbor_import,
+        }
+
+    def attach(self, runtime):
+        self.runtime = runtime
+        self._wake = asyncio.Event()
+        self._local_network() # Settles an auto-detected interface before binding to it
+        try:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+            sock.bind((str(self.interface), ETH_P_ARP))
+            runtime.add_reader(sock, lambda: self._on_arp_readable(sock))
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Raw passive ARP listener unavailable ({e}); using a Scapy sniffer thread")
+            threading.Thread(target=self._passive_listener, daemon=True).start()
+        runtime.spawn(f"scanner:{self.segment or 'primary'}", self._serve)
+
+    async def _serve(self):
+        try:
+            await self.runtime.offload(self.import_neighbors)
+        except Exception as e:
+            logging.error(f"Neighbor import failed: {e}")
+
+        last_scan = 0
+        while self.running:
+            if self._rescan or time.time() - last_scan >= self.liveness.tick():
+                self._rescan = False
+                last_scan = time.time()
+                await self.scan_async()
+            # Timer for the next due sweep; request_scan() wakes it early
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.1, last_scan + self.liveness.tick() - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_arp_readable(self, sock):
+        """Passive listener on the runtime: drains every queued ARP frame."""
+        while True:
+            try:
+                frame, addr = sock.recvfrom(128)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logging.error(f"Passive listener error: {e}")
+                self.runtime.remove_reader(sock)
+                return
+            if addr[2] == socket.PACKET_OUTGOING:
+                continue # Our own sweep requests
+            arp = parse_arp(frame)
+            if arp and arp[0] in (1, 2) and arp[1] != "0.0.0.0":
+                self.device_store.add_or_update(arp[1], arp[2], self.get_vendor(arp[2]), segment=self.segment)
+            target = parse_arp_target(frame)
+            if target:
+                self.liveness.wake(target)
+
     def run(self):
         # Start Passive Listener Thread
         listener = threading.Thread(target=self._passive_listener)
         listener.daemon = True
         listener.start()
+
+        try:
+            self.import_neighbors()
+        except Exception as e:
+            logging.error(f"Neighbor import failed: {e}")
         
-        # Periodic Active Scan
+        # Incremental Active Scan: each pass probes only the addresses that are due
         last_scan = 0
         while self.running:
             now = time.time()
-            if now - last_scan >= self.scan_interval:
+            if self._rescan or now - last_scan >= self.liveness.tick():
+                self._rescan = False
                 self.scan()
                 last_scan = now
             time.sleep(1)
@@ -139,17 +307,13 @@ class NetworkScanner(threading.Thread):
                 # Update Store Instantly
                 if src_ip != "0.0.0.0":
                     vendor = self.get_vendor(src_mac)
-                    # We reuse logic, maybe methodize it?
-                    device = self.device_store.add_or_update(src_ip, src_mac, vendor)
-                    
-                    # Quick Classify if new
-                    if device.category.value == "Unknown":
-                        category, confidence = self.classifier.classify(device)
-                        device.category = category
-                        device.confidence = confidence
+                    self.device_store.add_or_update(src_ip, src_mac, vendor, segment=self.segment)
+                if pkt[ARP].op == 1:
+                    self.liveness.wake(pkt[ARP].pdst)
 
         try:
-            sniff(filter="arp", 
+            sniff(iface=self.interface,
+                  filter="arp", 
                   prn=handle_arp, 
                   store=0,
                   stop_filter=lambda x: not self.running)
@@ -158,3 +322,7 @@ class NetworkScanner(threading.Thread):
 
     def stop(self):
         self.running = False
+        if self.sweeper:
+            self.sweeper.running = False
+        if self.runtime is not None:
+            self.runtime.call(self._wake.set)
@@ -0,0 +1,236 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ARP = 0x0806
+BROADCAST = b"\xff" * 6
+
+# Ethernet (14) + ARP (28); the target protocol address sits at the very end
+ARP_FRAME_LEN = 42
+TPA_OFFSET = 38
+
+def mac_to_bytes(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(":", "").replace("-", ""))
+
+def bytes_to_mac(raw: bytes) -> str:
+    return ":".join(f"{b:02x}" for b in raw)
+
+def build_arp_template(src_mac: str, src_ip: str) -> bytearray:
+    """Broadcast who-has frame with the target IP left zeroed for patching."""
+    sha = mac_to_bytes(src_mac)
+    frame = bytearray(BROADCAST + sha + struct.pack("!H", ETH_P_ARP))
+    frame += struct.pack("!HHBBH", 1, 0x0800, 6, 4, 1) # Ethernet/IPv4, who-has
+    frame += sha + socket.inet_aton(src_ip)
+    frame += b"\x00" * 6 + b"\x00" * 4
+    return frame
+
+def build_arp(op: int, eth_src: str, eth_dst: str, hwsrc: str, psrc: str, hwdst: str, pdst: str) -> bytes:
+    """A complete Ethernet+ARP frame (op 1 = who-has, 2 = is-at)."""
+    return (mac_to_bytes(eth_dst) + mac_to_bytes(eth_src) + struct.pack("!H", ETH_P_ARP)
+            + struct.pack("!HHBBH", 1, 0x0800, 6, 4, op)
+            + mac_to_bytes(hwsrc) + socket.inet_aton(psrc) + mac_to_bytes(hwdst) + socket.inet_aton(pdst))
+
+def parse_arp(frame: bytes):
+    """Returns (op, sender ip, sender mac) for an Ethernet ARP frame, else None."""
+    if len(frame) < ARP_FRAME_LEN or frame[12:14] != b"\x08\x06":
+        return None
+    return struct.unpack("!H", frame[20:22])[0], socket.inet_ntoa(frame[28:32]), bytes_to_mac(frame[22:28])
+
+def parse_arp_target(frame: bytes):
+    """Returns the target ip of an ARP who-has frame, else None."""
+    arp = parse_arp(frame)
+    if arp is None or arp[0] != 1:
+        return None
+    return socket.inet_ntoa(frame[TPA_OFFSET:TPA_OFFSET + 4])
+
+def parse_arp_reply(frame: bytes):
+    """Returns (ip, mac) for an ARP is-at frame, else None."""
+    arp = parse_arp(frame)
+    if arp is None or arp[0] != 2:
+        return None
+    return arp[1], arp[2]
+
+class SweepProgress:
+    """Live counters for one sweep; read by the API while the sweep runs."""
+    def __init__(self, targets: int):
+        self.targets = targets
+        self.sent = 0
+        self.replies = 0
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> dict:
+        return {
+            "targets": self.targets,
+            "sent": self.sent,
+            "replies": self.replies,
+            "progress": round(self.sent / self.targets, 3) if self.targets else 1.0,
+            "duration": round(self.duration, 2),
+            "response_rate": round(self.replies / self.sent, 3) if self.sent else 0.0,
+            "running": self.finished is None,
+        }
+
+class ArpSweeper:
+    """
+    Streams prebuilt ARP requests over one raw AF_PACKET socket at a fixed
+    packets-per-second rate, while a receive thread matches replies as they
+    arrive and hands them to `on_reply(ip, mac)` immediately. Only the 4
+    target-address bytes change between frames, so no per-host packet
+    objects are ever built. Linux only; see `available()`.
+
+    `sweep_async()` does the same on an asyncio loop: the socket is a
+    non-blocking reader and pacing is done with timers, no threads.
+    """
+    def __init__(self, interface: str, src_mac: str, src_ip: str, rate_pps: int = 500, reply_wait: float = 2.0):
+        self.interface = interface
+        self.src_mac = src_mac
+        self.src_ip = src_ip
+        self.rate_pps = max(1, int(rate_pps))
+        self.reply_wait = reply_wait
+        self.progress: Optional[SweepProgress] = None
+        self.running = True
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(socket, "AF_PACKET")
+
+    def _open_socket(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        sock.bind((self.interface, ETH_P_ARP))
+        sock.settimeout(0.2)
+        return sock
+
+    def sweep(self, targets: Iterable[str], on_reply: Callable[[str, str], None]) -> SweepProgress:
+        target_list = [t for t in targets if t != self.src_ip]
+        pending = set(target_list)
+        progress = SweepProgress(len(target_list))
+        self.progress = progress
+        sock = self._open_socket()
+        sending_done = threading.Event()
+
+        def receive():
+            deadline = None
+            while self.running:
+                if sending_done.is_set():
+                    deadline = deadline or time.time() + self.reply_wait
+                    if time.time() >= deadline or not pending:
+                        break
+                try:
+                    frame = sock.recv(128)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                self._match(frame, pending, progress, on_reply)
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+
+        frame = build_arp_template(self.src_mac, self.src_ip)
+        # Send in small bursts on a fixed schedule (~100 bursts/s) to hold the rate
+        burst = max(1, self.rate_pps // 100)
+        interval = burst / self.rate_pps
+        next_slot = time.monotonic()
+        try:
+            for i in range(0, len(target_list), burst):
+                if not self.running:
+                    break
+                self._send_burst(sock, frame, target_list[i:i + burst], progress)
+                next_slot += interval
+                delay = next_slot - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            sending_done.set()
+            receiver.join()
+            sock.close()
+            progress.finished = time.time()
+        self._log(progress)
+        return progress
+
+    async def sweep_async(self, targets: Iterable[str], on_reply: Callable[[str, str], None]) -> SweepProgress:
+        loop = asyncio.get_running_loop()
+        target_list = [t for t in targets if t != self.src_ip]
+        pending = set(target_list)
+        progress = SweepProgress(len(target_list))
+        self.progress = progress
+        sock = self._open_socket()
+        sock.setblocking(False)
+        all_replied = asyncio.Event()
+
+        def on_readable():
+            while True:
+                try:
+                    frame = sock.recv(128)
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError:
+                    loop.remove_reader(sock.fileno())
+                    return
+                self._match(frame, pending, progress, on_reply)
+                if not pending:
+                    all_replied.set()
+
+        loop.add_reader(sock.fileno(), on_readable)
+        frame = build_arp_template(self.src_mac, self.src_ip)
+        burst = max(1, self.rate_pps // 100)
+        interval = burst / self.rate_pps
+        next_slot = loop.time()
+        try:
+            for i in range(0, len(target_list), burst):
+                if not self.running:
+                    break
+                self._send_burst(sock, frame, target_list[i:i + burst], progress)
+                next_slot += interval
+                await asyncio.sleep(max(0.0, next_slot - loop.time()))
+            if self.running and pending:
+                try:
+                    await asyncio.wait_for(all_replied.wait(), timeout=self.reply_wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            loop.remove_reader(sock.fileno())
+            sock.close()
+            progress.finished = time.time()
+        self._log(progress)
+        return progress
+
+    def _send_burst(self, sock, frame: bytearray, ips, progress: SweepProgress):
+        for ip in ips:
+            frame[TPA_OFFSET:TPA_OFFSET + 4] = socket.inet_aton(ip)
+            try:
+                sock.send(frame)
+                progress.sent += 1
+            except OSError as e: # Includes a full send buffer on a non-blocking socket
+                logger.debug(f"ARP send to {ip} failed: {e}")
+
+    def _match(self, frame: bytes, pending: set, progress: SweepProgress, on_reply):
+        reply = parse_arp_reply(frame)
+        if reply and reply[0] in pending:
+            pending.discard(reply[0])
+            progress.replies += 1
+            try:
+                on_reply(*reply)
+            except Exception as e:
+                logger.error(f"Sweep reply handler failed: {e}")
+
+    def _log(self, progress: SweepProgress):
+        logger.info(
+            f"ARP sweep on {self.interface}: {progress.replies}/{progress.sent} replied "
+            f"in {progress.duration:.1f}s ({self.rate_pps} pps)"
+        )
+
+def subnet_hosts(subnet: str):
+    """Usable host addresses of an IPv4 network, as strings."""
+    return [str(ip) for ip in ipaddress.IPv4Network(subnet, strict=False).hosts()]
@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tcp_fingerprints.json")
+
+# Scapy option names -> p0f layout tokens
+OPTION_NAMES = {
+    "MSS": "mss", "NOP": "nop", "WScale": "ws", "SAckOK": "sok",
+    "SAck": "sack", "Timestamp": "ts", "EOL": "eol",
+}
+
+def initial_ttl(ttl: int) -> int:
+    """Rounds an observed TTL up to the hop-count origin it most likely started from."""
+    for start in (32, 64, 128, 255):
+        if ttl <= start:
+            return start
+    return 255
+
+def syn_signature(ttl: int, window: int, options: Iterable[Tuple[str, object]]) -> str:
+    """p0f-style signature of a SYN: "ttl:window:mss:wscale:layout"."""
+    mss = ""
+    wscale = ""
+    layout = []
+    for name, value in options:
+        layout.append(OPTION_NAMES.get(name, str(name).lower()))
+        if name == "MSS":
+            mss = str(value)
+        elif name == "WScale":
+            wscale = str(value)
+    return f"{initial_ttl(ttl)}:{window}:{mss}:{wscale}:{','.join(layout)}"
+
+class TcpFingerprintDB:
+    """
+    Exact signatures in one dict, (ttl, layout) fallbacks in another, so a
+    SYN costs at most three hash lookups: literal window, window as a
+    multiple of the MSS (many stacks size it that way and the MSS varies
+    per link), then the fallback.
+    """
+    def __init__(self, path: str = FINGERPRINTS_PATH):
+        self.exact: Dict[str, str] = {}
+        self.relaxed: Dict[str, str] = {}
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f).get("signatures", [])
+        except Exception as e:
+            logger.error(f"Failed to load TCP fingerprints: {e}")
+            entries = []
+        for entry in entries:
+            ttl, layout = entry["ttl"], entry["layout"]
+            if entry.get("window", "*") == "*" or entry.get("wscale", "*") == "*":
+                self.relaxed.setdefault(f"{ttl}:{layout}", entry["os"])
+            else:
+                self.exact.setdefault(f"{ttl}:{entry['window']}:{entry['wscale']}:{layout}", entry["os"])
+
+    def lookup(self, signature: str) -> Optional[str]:
+        ttl, window, mss, wscale, layout = signature.split(":", 4)
+        os_name = self.exact.get(f"{ttl}:{window}:{wscale}:{layout}")
+        if os_name is None and mss.isdigit() and window.isdigit() and int(mss) and int(window) % int(mss) == 0:
+            os_name = self.exact.get(f"{ttl}:mss*{int(window) // int(mss)}:{wscale}:{layout}")
+        if os_name is None:
+            os_name = self.relaxed.get(f"{ttl}:{layout}")
+        return os_name
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_FIELDS = ("friendlyName", "manufacturer", "modelName", "modelNumber", "deviceType")
+
+class UpnpError(Exception):
+    pass
+
+def parse_description(data: bytes) -> dict:
+    """
+    Extracts the root device's identity fields from a UPnP description.
+    Namespaces are ignored. Documents with a DTD are refused outright, which
+    rules out entity-expansion tricks.
+    """
+    if b"<!DOCTYPE" in data or b"<!ENTITY" in data:
+        raise UpnpError("DTDs are not accepted")
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise UpnpError(f"bad XML: {e}")
+    device = next((el for el in root.iter() if el.tag.rsplit("}", 1)[-1] == "device"), None)
+    if device is None:
+        raise UpnpError("no <device> element")
+    info = {}
+    for child in device:
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag in DESCRIPTION_FIELDS and child.text and child.text.strip():
+            info[tag] = child.text.strip()[:128]
+    return info
+
+def cache_key(headers: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """(device UUID, BOOTID) from SSDP headers; a reboot bumps BOOTID and forces a refetch."""
+    usn = headers.get("USN", "")
+    if not usn.lower().startswith("uuid:"):
+        return None
+    return usn.split("::", 1)[0][5:].lower(), headers.get("BOOTID.UPNP.ORG", "")
+
+class HttpPool:
+    """
+    Minimal HTTP/1.1 GET client for description documents.
+
+    Idle keep-alive connections are kept per (host, port), at most
+    `max_idle_per_host` each. Every request runs under one `timeout` and
+    bodies over `max_bytes` are rejected, so a slow or hostile device can't
+    tie up the discovery loop.
+    """
+    def __init__(self, timeout: float = 2.0, max_bytes: int = 65536, max_idle_per_host: int = 2):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_idle_per_host = max_idle_per_host
+        self.idle: Dict[Tuple[str, int], List[tuple]] = {}
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    async def get(self, url: str) -> bytes:
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise UpnpError(f"unsupported URL {url!r}")
+        key = (parts.hostname, parts.port or 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                   "Connection: keep-alive\r\nUser-Agent: AgentX UPnP/1.0\r\n\r\n").encode()
+        return await asyncio.wait_for(self._request(key, request), timeout=self.timeout)
+
+    async def _request(self, key, request: bytes) -> bytes:
+        pooled = self.idle.get(key)
+        if pooled:
+            reader, writer = pooled.pop()
+            self.connections_reused += 1
+            try:
+                return await self._exchange(key, reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close() # Server dropped the idle connection; retry on a fresh one
+        reader, writer = await asyncio.open_connection(*key)
+        self.connections_opened += 1
+        return await self._exchange(key, reader, writer, request)
+
+    async def _exchange(self, key, reader, writer, request: bytes) -> bytes:
+        try:
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            status = lines[0].split(" ", 2)
+            if len(status) < 2 or status[1] != "200":
+                raise UpnpError(f"HTTP status {lines[0]!r}")
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            reusable = headers.get("connection", "").lower() != "close"
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                body = await self._read_chunked(reader)
+            elif "content-length" in headers:
+                length = int(headers["content-length"])
+                if length > self.max_bytes:
+                    raise UpnpError("description too large")
+                body = await reader.readexactly(length)
+            else:
+                body = await reader.read(self.max_bytes + 1)
+                reusable = False
+            if len(body) > self.max_bytes:
+                raise UpnpError("description too large")
+        except BaseException:
+            writer.close()
+            raise
+        idle = self.idle.setdefault(key, [])
+        if reusable and len(idle) < self.max_idle_per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+        return body
+
+    async def _read_chunked(self, reader) -> bytes:
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline() # Trailer terminator
+                return bytes(body)
+            if len(body) + size > self.max_bytes:
+                raise UpnpError("description too large")
+            body += await reader.readexactly(size)
+            await reader.readline()
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+class DescriptionFetcher:
+    """
+    Fetches and caches the UPnP description behind SSDP `LOCATION` headers.
+
+    `submit()` is called from the discovery loop for every SSDP packet.
+    Descriptions are cached by (UUID, BOOTID), or by URL when the USN has no
+    UUID, so each device is fetched once per boot rather than on every
+    NOTIFY. Failed fetches are retried after `retry_after` seconds. The
+    friendlyName becomes the hostname (if the device has none yet) and
+    "manufacturer modelName" becomes Device.model for the classifier.
+    """
+    def __init__(self, device_store, pool: HttpPool = None, concurrency: int = 4,
+                 max_entries: int = 1024, retry_after: float = 300.0, segment: str = ""):
+        self.device_store = device_store
+        self.segment = segment
+        self.pool = pool or HttpPool()
+        self.max_entries = max_entries
+        self.retry_after = retry_after
+        self.cache: Dict[object, dict] = {}
+        self._failed: Dict[object, float] = {}
+        self._inflight = set()
+        self._sem = asyncio.Semaphore(concurrency) # Binds to the discovery loop on first use
+        self.fetches = 0
+        self.failures = 0
+        self.cache_hits = 0
+
+    def submit(self, ip: str, headers: Dict[str, str]):
+        location = headers.get("LOCATION")
+        if not location:
+            return
+        if urlsplit(location).hostname != ip:
+            return # Only follow descriptions the sender serves itself
+        key = cache_key(headers) or location
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            self._apply(ip, cached)
+            return
+        if key in self._inflight or self._failed.get(key, 0) > time.time():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # Not on the discovery loop (e.g. replayed packets)
+        self._inflight.add(key)
+        loop.create_task(self._fetch(ip, key, location))
+
+    async def _fetch(self, ip: str, key, location: str):
+        try:
+            async with self._sem:
+                self.fetches += 1
+                info = parse_description(await self.pool.get(location))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, UpnpError, ValueError) as e:
+            self.failures += 1
+            self._failed[key] = time.time() + self.retry_after
+            logger.debug(f"UPnP description {location} failed: {e}")
+            return
+        finally:
+            self._inflight.discard(key)
+        self.cache[key] = info
+        if len(self.cache) > self.max_entries:
+            del self.cache[next(iter(self.cache))]
+        self._apply(ip, info)
+
+    def _apply(self, ip: str, info: dict):
+        dev = self.device_store.get_by_ip(ip, self.segment)
+        if dev is None:
+            return
+        if info.get("friendlyName"):
+            self.device_store.update_discovery_info(dev.key, hostname=info["friendlyName"])
+        model = " ".join(info[k] for k in ("manufacturer", "modelName") if info.get(k))
+        if model:
+            self.device_store.set_model(dev.key, model)
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self) -> dict:
+        return {
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "cached": len(self.cache),
+            "connections_opened": self.pool.connections_opened,
+            "connections_reused": self.pool.connections_reused,
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class DeviceEventType(Enum):
+    ADDED = "device_added"
+    IP_CHANGED = "ip_changed"
+    STALE = "went_stale"
+    BLOCKED = "blocked"
+    UNBLOCKED = "unblocked"
+    CLASSIFIED = "classification_changed"
+    VENDOR_CHANGED = "vendor_changed"
+    ATTRIBUTES_CHANGED = "attributes_changed" # data["fields"]: names of the changed Device fields
+    REMOVED = "removed"
+
+@dataclass(frozen=True)
+class DeviceEvent:
+    type: DeviceEventType
+    mac: str
+    data: Dict[str, object] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+class Subscription:
+    """
+    Bounded per-subscriber queue. With `coalesce`, a newer event of the same
+    type for the same device replaces the queued one instead of taking a new
+    slot; when the queue is full the oldest event is dropped and counted.
+    Consumers either block in `get()` from a thread or `await aget()`.
+    """
+    def __init__(self, bus, types: Optional[Set[DeviceEventType]], maxsize: int, coalesce: bool):
+        self.bus = bus
+        self.types = types
+        self.maxsize = maxsize
+        self.coalesce = coalesce
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.closed = False
+        self._queue: "OrderedDict[object, DeviceEvent]" = OrderedDict()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_ready: Optional[asyncio.Event] = None
+
+    def wants(self, event: DeviceEvent) -> bool:
+        return self.types is None or event.type in self.types
+
+    def offer(self, event: DeviceEvent):
+        with self._cond:
+            if self.closed:
+                return
+            key = (event.type, event.mac) if self.coalesce else next(self._seq)
+            if key in self._queue:
+                queued = self._queue[key]
+                # Keep the earliest "old_*" values so A->B->C still reads as A->C
+                merged = {**event.data, **{k: v for k, v in queued.data.items() if k.startswith("old_")}}
+                if "fields" in queued.data:
+                    merged["fields"] = list(dict.fromkeys(list(queued.data["fields"]) + list(event.data.get("fields", []))))
+                self._queue[key] = DeviceEvent(event.type, event.mac, merged, event.timestamp) # Keeps its queue position
+                self.coalesced += 1
+            else:
+                if len(self._queue) >= self.maxsize:
+                    self._queue.popitem(last=False)
+                    self.dropped += 1
+                self._queue[key] = event
+            self._cond.notify()
+            loop, ready = self._loop, self._async_ready
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass # Loop already closed
+
+    def _pop(self) -> Optional[DeviceEvent]:
+        if not self._queue:
+            return None
+        self.delivered += 1
+        return self._queue.popitem(last=False)[1]
+
+    def get(self, timeout: Optional[float] = None) -> Optional[DeviceEvent]:
+        """Blocks until an event arrives; returns None on timeout or close."""
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            return self._pop()
+
+    def drain(self) -> List[DeviceEvent]:
+        with self._cond:
+            events = []
+            while self._queue:
+                events.append(self._pop())
+            return events
+
+    async def aget(self) -> Optional[DeviceEvent]:
+        """Awaits the next event from inside an asyncio loop."""
+        if self._loop is None:
+            with self._cond:
+                self._loop = asyncio.get_running_loop()
+                self._async_ready = asyncio.Event()
+        while not self.closed:
+            self._async_ready.clear()
+            with self._cond:
+                event = self._pop()
+            if event is not None:
+                return event
+            await self._async_ready.wait()
+        return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_ready.set)
+            except RuntimeError:
+                pass
+        self.bus._unsubscribe(self)
+
+    def stats(self) -> dict:
+        return {"queued": len(self._queue), "delivered": self.delivered, "coalesced": self.coalesced, "dropped": self.dropped}
+
+class EventBus:
+    """Fan-out of device events to bounded subscriptions. Publishing never blocks."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions: List[Subscription] = []
+        self.published = 0
+
+    def subscribe(self, types: Optional[Iterable[DeviceEventType]] = None, maxsize: int = 1024, coalesce: bool = True) -> Subscription:
+        sub = Subscription(self, set(types) if types else None, maxsize, coalesce)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [sub]
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not sub]
+
+    def publish(self, event: DeviceEvent):
+        self.published += 1
+        for sub in self.subscriptions: # Copy-on-write list, safe without the lock
+            if sub.wants(event):
+                sub.offer(event)
+
+    def emit(self, type: DeviceEventType, mac: str, **data):
+        self.publish(DeviceEvent(type, mac, data))
+
+    def stats(self) -> dict:
+        subs = self.subscriptions
+        return {
+            "published": self.published,
+            "subscribers": len(subs),
+            "dropped": sum(s.dropped for s in subs),
+            "coalesced": sum(s.coalesced for s in subs),
+        }
@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Set
+
+from src.device_store import Device
+
+logger = logging.getLogger(__name__)
+
+def is_randomized_mac(mac: str) -> bool:
+    """Locally administered bit set -> private/rotating address."""
+    try:
+        return bool(int(mac.replace(":", "").replace("-", "")[:2], 16) & 0b00000010)
+    except ValueError:
+        return False
+
+def _h(value: str) -> str:
+    return hashlib.sha1(value.encode("utf8")).hexdigest()[:16]
+
+# Hostname words that name a product, not an owner: "iPhone", "Galaxy-S21"
+STOCK_HOSTNAME_WORDS = {
+    "iphone", "ipad", "ipod", "mac", "macbook", "imac", "mini", "pro", "air", "max", "plus", "ultra",
+    "watch", "apple", "tv", "homepod", "android", "galaxy", "samsung", "pixel", "google", "nest",
+    "home", "chromecast", "note", "redmi", "xiaomi", "oneplus", "moto", "huawei", "nokia", "phone",
+    "tablet", "laptop", "desktop", "pc", "windows", "linux", "localhost", "raspberrypi", "echo",
+    "kindle", "fire", "amazon", "surface", "switch", "playstation", "xbox", "printer", "s",
+}
+# Product lines whose names end in a model number: "Pixel-7" is not a renamed "Pixel"
+MODEL_LINES = {"pixel", "galaxy", "note", "redmi", "oneplus", "moto", "nexus", "xperia", "surface", "echo", "fire"}
+MODEL_TOKEN = re.compile(r"^[a-z]{0,2}\d+[a-z]{0,3}$") # "7", "s21", "14pro"
+# Suffixes OSes append on a name conflict: "Johns iPhone (2)", "Johns-iPhone-2"
+CONFLICT_SUFFIX = re.compile(r"(?: ?\((\d+)\)|-(\d+))$")
+
+def hostname_key(hostname: str) -> Optional[str]:
+    """
+    Normalized hostname for identity matching, or None unless it is
+    distinctive: stock product names ("iPhone", "Pixel-7") are shared by
+    every device of a model and say nothing about which one this is.
+    """
+    name = hostname.lower().replace("'", "").replace("\u2019", "")
+    if name.endswith(".local"):
+        name = name[:-len(".local")]
+    match = CONFLICT_SUFFIX.search(name)
+    if match:
+        words = [w for w in re.split(r"[^a-z0-9]+", name[:match.start()]) if w]
+        if match.group(1) or (words and words[-1] not in MODEL_LINES):
+            name = name[:match.start()]
+    words = [w for w in re.split(r"[^a-z0-9]+", name) if w]
+    if not any(w not in STOCK_HOSTNAME_WORDS and not MODEL_TOKEN.match(w) for w in words):
+        return None
+    return "-".join(words)
+
+class IdentityResolver:
+    """
+    Clusters rotating (randomized) MACs into logical devices.
+
+    Each device is reduced to a handful of hashed signature keys derived from
+    passive signals. An inverted index maps every key to the logical IDs that
+    produced it, so candidates are found with one dict lookup per key rather
+    than by comparing devices pairwise. A candidate is accepted when the
+    weights of the signal kinds it shares reach MERGE_THRESHOLD; each kind
+    counts once however many of its keys match.
+    """
+    # A distinctive hostname or a similar set of visited domains points at one
+    # device. mDNS service types and DHCP, TLS and TCP fingerprints identify a
+    # device type or OS build, so together they add at most TYPE_LEVEL_MAX and
+    # never merge without an individual signal.
+    WEIGHTS = {"host": 3, "domains": 2, "mdns": 1, "dhcp": 1, "tls": 1, "tcp": 1}
+    INDIVIDUAL = {"host", "domains"}
+    TYPE_LEVEL_MAX = 1
+    MERGE_THRESHOLD = 3
+
+    # MinHash over the device's domain set, banded for LSH
+    MINHASH_PERMUTATIONS = 8
+    MINHASH_BAND = 2
+    MIN_DOMAINS = 3
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index: Dict[str, Set[str]] = {} # signature key -> logical ids
+        self.keys_by_mac: Dict[str, Set[str]] = {} # device key -> keys it contributed
+        self.members: Dict[str, Set[str]] = {} # logical id -> device keys
+        self.merges = 0
+        self._inputs: Dict[str, int] = {} # device key -> Device._signals_rev last resolved
+
+    def refresh(self, devices: List[Device]) -> List[str]:
+        """
+        Re-resolves only devices whose identity signals changed. Returns keys
+        of devices whose logical ID changed. Change detection uses the
+        revision the setters bump, so unchanged devices loaded from a
+        snapshot keep their cold fields undecoded.
+        """
+        changed = []
+        for dev in devices:
+            rev = dev._signals_rev
+            if self._inputs.get(dev.key) == rev and dev.logical_id:
+                continue
+            self._inputs[dev.key] = rev
+            before = dev.logical_id
+            if self.resolve(dev) != before:
+                changed.append(dev.key)
+        return changed
+
+    def signature_keys(self, dev: Device) -> Set[str]:
+        keys = set()
+        # "Johns-iPhone-2" is the same phone as "Johns-iPhone"; a bare "iPhone" could be any
+        name = hostname_key(dev.hostname) if dev.hostname else None
+        if name:
+            keys.add("host:" + _h(name))
+
+        # Read through cold_value(): indexing a device must not decode its snapshot blob
+        service_types = sorted(s for s in dev.cold_value("mdns_services") if s and s not in ("mDNS", "SSDP"))
+        if service_types:
+            keys.add("mdns:" + _h("|".join(service_types)))
+
+        fingerprints = dev.cold_value("fingerprints")
+        for kind in ("dhcp", "tls", "tcp"):
+            value = fingerprints.get(kind)
+            if value:
+                keys.add(f"{kind}:" + _h(value))
+
+        keys.update(self._domain_bands(dev.cold_value("domains")))
+        return keys
+
+    def _domain_bands(self, domains: List[str]) -> Set[str]:
+        # Reduce to registrable-ish names so CDN shards don't dilute the set
+        base = {".".join(d.lower().rstrip(".").split(".")[-2:]) for d in domains if d}
+        if len(base) < self.MIN_DOMAINS:
+            return set()
+        mins = []
+        for seed in range(self.MINHASH_PERMUTATIONS):
+            mins.append(min(int(_h(f"{seed}:{d}"), 16) for d in base))
+        bands = set()
+        for i in range(0, self.MINHASH_PERMUTATIONS, self.MINHASH_BAND):
+            band = ":".join(str(m) for m in mins[i:i + self.MINHASH_BAND])
+            bands.add(f"domains:{i}:" + _h(band))
+        return bands
+
+    def resolve(self, dev: Device) -> str:
+        """Assigns (and returns) the device's logical ID, merging into an existing one if signals agree."""
+        with self.lock:
+            if not is_randomized_mac(dev.mac):
+                # Burned-in addresses are already stable identities
+                dev.logical_id = dev.logical_id or "mac:" + dev.mac.lower()
+                self.members.setdefault(dev.logical_id, set()).add(dev.key)
+                return dev.logical_id
+
+            keys = self.signature_keys(dev)
+            old_keys = self.keys_by_mac.get(dev.key, set())
+            current = dev.logical_id
+
+            shared: Dict[str, Set[str]] = {} # candidate logical id -> signal kinds in common
+            for key in keys:
+                kind = key.split(":", 1)[0]
+                for lid in self.index.get(key, ()):
+                    if lid != current:
+                        shared.setdefault(lid, set()).add(kind)
+            scores = {lid: self._score(kinds) for lid, kinds in shared.items()}
+
+            best = max(scores, key=scores.get) if scores else None
+            if best and scores[best] >= self.MERGE_THRESHOLD and self._is_singleton(current, dev.key):
+                if current:
+                    self.members.get(current, set()).discard(dev.key)
+                logger.info(f"Identity: merged {dev.mac} into {best} (score {scores[best]})")
+                dev.logical_id = best
+                self.merges += 1
+            elif not current:
+                dev.logical_id = "dev:" + _h(dev.mac.lower())[:12]
+
+            lid = dev.logical_id
+            self.members.setdefault(lid, set()).add(dev.key)
+            self._unindex(current, dev.key, old_keys if current != lid else old_keys - keys)
+            for key in keys:
+                self.index.setdefault(key, set()).add(lid)
+            self.keys_by_mac[dev.key] = keys
+            return lid
+
+    def _score(self, kinds: Set[str]) -> int:
+        if not kinds & self.INDIVIDUAL:
+            return 0
+        type_level = sum(self.WEIGHTS[k] for k in kinds - self.INDIVIDUAL)
+        return sum(self.WEIGHTS[k] for k in kinds & self.INDIVIDUAL) + min(type_level, self.TYPE_LEVEL_MAX)
+
+    def _unindex(self, lid: str, mac: str, keys: Set[str]):
+        # A key stays indexed while another member of the same identity still has it
+        others = [self.keys_by_mac.get(m, set()) for m in self.members.get(lid, ()) if m != mac]
+        for key in keys:
+            if not any(key in k for k in others):
+                self.index.get(key, set()).discard(lid)
+
+    def _is_singleton(self, lid: str, mac: str) -> bool:
+        # Only re-home devices that aren't already anchoring other MACs
+        return not lid or self.members.get(lid, set()) <= {mac}
+
+    def forget(self, mac: str):
+        with self.lock:
+            self._inputs.pop(mac, None)
+            keys = self.keys_by_mac.pop(mac, set())
+            for lid, macs in self.members.items():
+                if mac in macs:
+                    macs.discard(mac)
+                    self._unindex(lid, mac, keys)
+
+    def logical_devices(self, devices: List[Device]) -> List[dict]:
+        """Aggregates per-MAC devices into one record per logical ID."""
+        groups: Dict[str, List[Device]] = {}
+        for dev in devices:
+            groups.setdefault(dev.logical_id or "mac:" + dev.mac.lower(), []).append(dev)
+
+        result = []
+        for lid, members in groups.items():
+            latest = max(members, key=lambda d: d.last_seen)
+            result.append({
+                "logical_id": lid,
+                "macs": sorted(d.mac for d in members),
+                "ip": latest.ip,
+                "hostname": next((d.hostname for d in members if d.hostname), ""),
+                "vendor": latest.vendor,
+                "category": latest.category.value,
+                "total_up": sum(d.total_up for d in members),
+                "total_down": sum(d.total_down for d in members),
+                "is_blocked": any(d.is_blocked for d in members),
+                "last_seen": latest.last_seen,
+            })
+        return result
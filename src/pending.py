@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+class PendingObservations:
+    """
+    Discovery data for IPs the store hasn't bound to a MAC yet.
+
+    mDNS/SSDP announcements routinely arrive before the ARP reply that
+    creates the device. Observations are buffered per IP for `ttl` seconds
+    (at most `max_entries` IPs, oldest evicted first) and handed back once
+    `take()` is called for that IP. Entries are kept in expiry order, so
+    purging only ever looks at the front of the dict.
+    """
+    def __init__(self, ttl: float = 120.0, max_entries: int = 512, max_services: int = 10):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_services = max_services
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, Optional[str], List[str]]]" = OrderedDict()
+        self.hits = 0 # Buffered observations merged into a device
+        self.misses = 0 # Observations that had to be buffered
+        self.expired = 0
+        self.evicted = 0
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def add(self, ip: str, hostname: str = None, service: str = None, now: float = None):
+        if not ip or not (hostname or service):
+            return
+        now = now or time.time()
+        with self.lock:
+            self._purge(now)
+            _, known_host, services = self.entries.pop(ip, (0, None, []))
+            if service and service not in services:
+                services.append(service)
+                del services[:-self.max_services]
+            # Refreshed entries move to the back with a new expiry
+            self.entries[ip] = (now + self.ttl, known_host or hostname, services)
+            self.misses += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def take(self, ip: str, now: float = None) -> Optional[Tuple[Optional[str], List[str]]]:
+        """Removes and returns (hostname, services) buffered for `ip`, if still fresh."""
+        if ip not in self.entries: # Unlocked fast path for the common case
+            return None
+        now = now or time.time()
+        with self.lock:
+            entry = self.entries.pop(ip, None)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self.expired += 1
+                return None
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def _purge(self, now: float):
+        while self.entries:
+            ip, entry = next(iter(self.entries.items()))
+            if entry[0] > now:
+                break
+            del self.entries[ip]
+            self.expired += 1
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,134 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from typing import List
+
+from src.device_store import Device
+
+logger = logging.getLogger(__name__)
+
+class RetentionPolicy:
+    """
+    Decides which devices may leave the in-memory store.
+
+    - Devices not seen for `stale_timeout` seconds lose their IP (marked stale).
+    - Never-blocked devices without a hostname or schedule are evicted after
+      `retention_days` unseen.
+    - If the store still holds more than `max_devices`, the least recently
+      seen evictable devices go first. Blocked or scheduled devices are
+      never evicted, since that would silently lift a restriction.
+    """
+    def __init__(self, stale_timeout: float = 60, retention_days: float = 30, max_devices: int = 2000):
+        self.stale_timeout = stale_timeout
+        self.retention_days = retention_days
+        self.max_devices = max_devices
+
+    @classmethod
+    def from_settings(cls, settings):
+        if not settings:
+            return cls()
+        return cls(
+            stale_timeout=settings.get("stale_timeout", 60),
+            retention_days=settings.get("retention_days", 30),
+            max_devices=settings.get("max_devices", 2000),
+        )
+
+    def is_protected(self, dev: Device) -> bool:
+        return dev.is_blocked or bool(dev.schedule_start and dev.schedule_end)
+
+    def select_evictions(self, devices: List[Device], now: float) -> List[str]:
+        cutoff = now - self.retention_days * 86400
+        evict = set()
+        for dev in devices:
+            if self.is_protected(dev) or dev.hostname:
+                continue
+            if dev.last_seen < cutoff and not dev.ip:
+                evict.add(dev.key)
+
+        overflow = len(devices) - len(evict) - self.max_devices
+        if overflow > 0:
+            # LRU by last_seen among whatever is still evictable (named devices included)
+            candidates = sorted(
+                (d for d in devices if d.key not in evict and not d.ip and not self.is_protected(d)),
+                key=lambda d: d.last_seen
+            )
+            evict.update(d.key for d in candidates[:overflow])
+        return list(evict)
+
+class RetentionJob(threading.Thread):
+    """
+    Single scheduled maintenance job for the device store: stale marking and
+    identity refresh on a short tick, eviction + archiving + snapshot
+    compaction on a long one.
+    """
+    def __init__(self, device_store, settings_manager=None, tick: float = 5.0, evict_interval: float = 600.0, identities=None):
+        super().__init__(daemon=True)
+        self.device_store = device_store
+        self.settings = settings_manager
+        self.identities = identities # Optional IdentityResolver
+        self.tick = tick
+        self.evict_interval = evict_interval
+        self.evicted_total = 0
+        self._stop_event = threading.Event()
+
+    def archive_path(self):
+        storage = self.device_store.storage
+        if storage is None:
+            return None
+        return os.path.splitext(storage.filename)[0] + ".archive.jsonl.gz"
+
+    def run(self):
+        last_evict = time.time()
+        while not self._stop_event.wait(self.tick):
+            policy = RetentionPolicy.from_settings(self.settings)
+            try:
+                self.device_store.cleanup_stale_devices(policy.stale_timeout)
+                if self.identities:
+                    for mac in self.identities.refresh(self.device_store.get_all()):
+                        self.device_store.mark_dirty(mac)
+                now = time.time()
+                if now - last_evict >= self.evict_interval:
+                    last_evict = now
+                    self.run_eviction(policy, now)
+            except Exception as e:
+                logger.error(f"Retention job failed: {e}")
+
+    def run_eviction(self, policy: RetentionPolicy, now: float = None):
+        now = now or time.time()
+        if not self.device_store.loaded.is_set() and self.device_store.storage is not None:
+            return # Don't judge a partially loaded store
+        macs = policy.select_evictions(self.device_store.get_all(), now)
+        if not macs:
+            return
+        removed = self.device_store.remove_devices(macs)
+        if self.identities:
+            for dev in removed:
+                self.identities.forget(dev.key)
+        self._archive(removed, now)
+        self.evicted_total += len(removed)
+        logger.info(f"Retention: evicted {len(removed)} devices ({len(self.device_store.devices)} remain)")
+
+        # Shrink the snapshot right away instead of waiting for the next compaction
+        storage = self.device_store.storage
+        if storage is not None:
+            self.device_store.save_to_file(storage.filename)
+
+    def _archive(self, devices: List[Device], now: float):
+        path = self.archive_path()
+        if not path or not devices:
+            return
+        try:
+            # Appending gzip members keeps the archive a single valid .gz stream
+            with gzip.open(path, 'at') as f:
+                for dev in devices:
+                    record = dev.to_dict()
+                    record["evicted_at"] = now
+                    f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            logger.error(f"Failed to archive evicted devices: {e}")
+
+    def stop(self):
+        self._stop_event.set()
@@ -4,6 +4,9 @@ import os
 import time
 from typing import List, Dict, Optional
 import threading
+from src.startup import StartupProfile, import_scapy
+startup = StartupProfile() # Phase timings in /api/health are relative to this import
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -12,6 +15,9 @@ from pydantic import BaseModel
 from src.device_store import DeviceStore, DeviceCategory
 from src.engine.manager import EngineCoordinator
 from src.settings_manager import SettingsManager
+from src.storage import AutoFlusher
+from src.retention import RetentionJob
+from src.identity import IdentityResolver
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,23 +34,60 @@ app.add_middleware(
 )
 
 # Shared State
+# Legacy devices.json path; the binary snapshot and journal live next to it
+DEVICES_PATH = os.environ.get("AGENTX_DEVICES_PATH", "devices.json")
+
 settings_manager = SettingsManager()
 device_store = DeviceStore(settings_manager)
-device_store.load_from_file("devices.json")
 
 # Engine Manager
 coordinator = EngineCoordinator(device_store, settings_manager)
 
+# Incremental persistence: dirty devices are journaled every few seconds
+flusher = AutoFlusher(device_store, interval=settings_manager.get("persist_interval", 5))
+
+# Clusters rotating private MACs into logical devices
+identities = IdentityResolver()
+
+# Stale marking, identity refresh, eviction and archiving in one scheduled job
+retention = RetentionJob(device_store, settings_manager, identities=identities)
+startup.mark("module_ready")
+
 @app.on_event("startup")
 async def startup_event():
+    # Nothing here blocks: HTTP is served while the stages below run
+    startup.mark("http")
+    # Persisted devices are decoded off the event loop; /api/health reports progress
+    device_store.load_in_background(DEVICES_PATH, phase=startup.phase("store_load"))
     # Start engines in a separate thread to keep web server responsive
-    threading.Thread(target=coordinator.start, daemon=True).start()
+    threading.Thread(target=start_engines, daemon=True, name="startup-engines").start()
+    flusher.start()
+    retention.start()
     logger.info("FastAPI startup: Engines delegated to background.")
 
+def start_engines():
+    """Imports Scapy while the network is detected, then starts the engines."""
+    scapy = startup.run("scapy_import", import_scapy)
+    try:
+        with startup.phase("network_detect"):
+            coordinator.prepare()
+    except Exception as e:
+        logger.error(f"Network detection failed: {e}")
+    scapy.join()
+    if not startup.done("scapy_import"):
+        logger.error("Scapy is unavailable; networking engines are not started.")
+        return
+    with startup.phase("engines_start"):
+        coordinator.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     coordinator.stop()
-    device_store.save_to_file("devices.json")
+    retention.stop()
+    flusher.stop()
+    if device_store.loaded.is_set():
+        # Never overwrite the snapshot with a partially loaded store
+        device_store.save_to_file(DEVICES_PATH)
     logger.info("Engines stopped and state saved.")
 
 # Helper to get engines safety (for API endpoints)
@@ -56,7 +99,7 @@ def get_scanner():
 
 # API Models
 class BlockRequest(BaseModel):
-    mac: str
+    mac: str # Device key ("segment/MAC" off the primary segment)
     blocked: bool
 
 class ScheduleRequest(BaseModel):
@@ -67,26 +110,77 @@ class ScheduleRequest(BaseModel):
 class SettingsUpdate(BaseModel):
     interface: Optional[str] = None
     scan_interval: Optional[int] = None
+    scan_rate_pps: Optional[int] = None
+    port_probing: Optional[bool] = None
     paranoid_mode: Optional[bool] = None
+    extra_interfaces: Optional[list] = None
 
 # Endpoints
+@app.get("/api/health")
+async def get_health():
+    store_ready = device_store.loaded.is_set()
+    return {
+        "status": "ok" if store_ready else "starting",
+        "ready": {"http": True, "store": store_ready, "scapy": startup.done("scapy_import"), **coordinator.readiness()},
+        "startup": startup.stats(),
+        "store": {
+            "loaded": store_ready,
+            "devices": len(device_store.view.devices),
+            "version": device_store.view.version,
+            "load_seconds": device_store.load_stats.get("seconds")
+        },
+        "events": device_store.events.stats(),
+        "pending_observations": device_store.pending.stats(),
+        "classifier": coordinator.classification.stats() if coordinator.classification else None,
+        "discovery": coordinator.discovery.stats() if coordinator.discovery else None,
+        "network": coordinator.network.stats() if coordinator.network else None,
+        "runtime": coordinator.runtime.stats() if coordinator.runtime else None
+    }
+
+@app.get("/api/scan")
+async def get_scan_status():
+    """Progress of the running ARP sweep and results of the last one."""
+    scanner = get_scanner()
+    if not scanner:
+        return {"current": None, "last": None}
+    return scanner.sweep_status()
+
+@app.get("/api/probes")
+async def get_probes():
+    """Port probe results per MAC (open ports and banners), if probing is enabled."""
+    prober = coordinator.prober
+    if not prober:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "stats": prober.stats(),
+        "results": {mac: result.to_dict() for mac, result in list(prober.cache.items())},
+    }
+
 @app.get("/api/devices")
 async def get_devices():
     return [dev.to_dict() for dev in device_store.get_all()]
 
+@app.get("/api/identities")
+async def get_identities():
+    """Devices grouped by logical identity, with counters summed across rotated MACs."""
+    return identities.logical_devices(device_store.get_all())
+
+@app.get("/api/segments")
+async def get_segments():
+    """Per-interface engine groups with their gateway and device/traffic totals."""
+    return coordinator.segment_stats()
+
 @app.post("/api/block")
 async def toggle_block(req: BlockRequest):
-    monitor = get_monitor()
     target_ip = None
     
-    with device_store.lock:
-        if req.mac not in device_store.devices:
-            raise HTTPException(status_code=404, detail="Device not found")
-            
-        dev = device_store.devices[req.mac]
-        dev.is_blocked = req.blocked
-        target_ip = dev.ip
-        status = {"status": "ok", "mac": req.mac, "is_blocked": dev.is_blocked}
+    dev = device_store.set_blocked(req.mac, req.blocked) # Lock-free, see StoreView
+    if dev is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    monitor = coordinator.monitor_for(dev.segment) # Spoofing has to happen on the device's own segment
+    target_ip = dev.ip
+    status = {"status": "ok", "mac": req.mac, "is_blocked": dev.is_blocked}
     
     # Perform networking operations outside the lock and offload blocking calls
     if target_ip and monitor:
@@ -97,7 +191,8 @@ async def toggle_block(req: BlockRequest):
         else:
             # disable_monitoring is fast
             monitor.disable_monitoring(target_ip)
-            # unblock_target is SLOW (1s). Offload to a background thread to keep EL responsive.
+            # unblock_target restores ARP over ~1s. Offload to a background thread to keep EL responsive;
+            # completion is reported by /api/restore.
             asyncio.create_task(asyncio.to_thread(monitor.unblock_target, target_ip))
             logger.info(f"Triggered background unblock for {target_ip} ({req.mac})")
             
@@ -105,22 +200,27 @@ async def toggle_block(req: BlockRequest):
 
 @app.post("/api/schedule")
 async def update_schedule(req: ScheduleRequest):
-    with device_store.lock:
-        if req.mac in device_store.devices:
-            dev = device_store.devices[req.mac]
-            dev.schedule_start = req.start
-            dev.schedule_end = req.end
-            logger.info(f"Updated schedule for {req.mac}: {req.start} to {req.end}")
-            return {"status": "ok", "mac": req.mac, "schedule_start": dev.schedule_start, "schedule_end": dev.schedule_end}
-    raise HTTPException(status_code=404, detail="Device not found")
+    # Lock-free: attribute updates never wait on the capture path
+    dev = device_store.set_schedule(req.mac, req.start, req.end)
+    if dev is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    logger.info(f"Updated schedule for {req.mac}: {req.start} to {req.end}")
+    return {"status": "ok", "mac": req.mac, "schedule_start": dev.schedule_start, "schedule_end": dev.schedule_end}
 
 @app.post("/api/kill-switch")
 async def toggle_global_kill_switch(enabled: bool):
-    monitor = get_monitor()
-    if monitor:
+    for monitor in coordinator.monitors():
         monitor.global_kill_switch = enabled
+    if not enabled:
+        # Every target was cut off; restore them all rather than waiting for the next spoof cycle
+        asyncio.create_task(asyncio.to_thread(coordinator.restore_all, "kill-switch"))
     return {"status": "ok", "global_kill_switch": enabled}
 
+@app.get("/api/restore")
+async def get_restore_status():
+    """Recent ARP restorations per segment (unblocks, kill switch, shutdown) and whether they completed."""
+    return coordinator.restore_status()
+
 @app.get("/api/stats")
 async def get_global_stats():
     monitor = get_monitor()
@@ -137,8 +237,11 @@ async def get_global_stats():
 
 @app.get("/api/settings")
 async def get_settings():
-    import netifaces
-    interfaces = netifaces.interfaces()
+    if coordinator.network:
+        interfaces = coordinator.network.state.interface_names() # Cached, updated on netlink events
+    else:
+        import netifaces
+        interfaces = netifaces.interfaces()
     return {
         "settings": settings_manager.settings,
         "available_interfaces": interfaces
@@ -175,55 +278,70 @@ manager = ConnectionManager()
 @app.websocket("/ws/updates")
 async def websocket_endpoint(websocket: WebSocket):
     logger.info(f"Incoming WebSocket connection attempt from {websocket.client}")
+    events = device_store.events.subscribe(maxsize=256)
     try:
         await manager.connect(websocket)
         logger.info(f"WebSocket handshake successful for {websocket.client}")
         
         last_stats_map = {} # mac -> (total_up, total_down)
+        cold_domains = {} # mac -> recent domains peeked from a still-undecoded snapshot blob
         last_time = time.time()
         
         logger.info(f"WebSocket client connected: {websocket.client}")
         
         while True:
-            await asyncio.sleep(2) # Update every 2 seconds
+            # Push every 2 seconds, or sooner (but at most every 0.5s) when
+            # the store reports a change such as a new or blocked device.
+            try:
+                await asyncio.wait_for(events.aget(), timeout=max(0.0, last_time + 2 - time.time()))
+                await asyncio.sleep(max(0.0, last_time + 0.5 - time.time()))
+            except asyncio.TimeoutError:
+                pass
+            events.drain() # Everything pending is covered by this push
             now = time.time()
             dt = now - last_time
             if dt <= 0: continue
             
-            # Cleanup stale devices (no traffic/scan for 60s)
-            device_store.cleanup_stale_devices(60)
-            
             # Snapshot devices to avoid blocking other threads with long lock holds
             devices_map = device_store.get_snapshot()
             updates = []
+            # Forget rate baselines of evicted devices
+            last_stats_map = {mac: v for mac, v in last_stats_map.items() if mac in devices_map}
+            cold_domains = {mac: v for mac, v in cold_domains.items() if mac in devices_map}
             
             total_up_rate = 0.0
             total_down_rate = 0.0
-            
-            # Use monitor snapshot to avoid repeated coordinator access
-            monitor = get_monitor()
 
             for mac, dev in devices_map.items():
-                # Calculate Rates
-                prev_up, prev_down = last_stats_map.get(mac, (dev.total_up, dev.total_down))
+                # Calculate Rates from a consistent counter pair
+                total_up, total_down = dev.counters()
+                prev_up, prev_down = last_stats_map.get(mac, (total_up, total_down))
                 
-                up_rate = ((dev.total_up - prev_up) / dt) / 1024
-                down_rate = ((dev.total_down - prev_down) / dt) / 1024
+                up_rate = ((total_up - prev_up) / dt) / 1024
+                down_rate = ((total_down - prev_down) / dt) / 1024
                 
                 dev.upload_rate = up_rate
                 dev.download_rate = down_rate
                 
-                last_stats_map[mac] = (dev.total_up, dev.total_down)
+                last_stats_map[mac] = (total_up, total_down)
                 
                 total_up_rate += up_rate
                 total_down_rate += down_rate
-                
-                # Auto-monitor enabled IPs (only if monitor is ready)
-                if monitor and dev.ip and dev.ip not in monitor.targets:
-                    monitor.enable_monitoring(dev.ip)
+
+                if dev.cold_decoded:
+                    domains = list(dev.domains)[-10:]
+                else:
+                    # An undecoded blob can't have changed: peek it once per connection
+                    # rather than decoding every device loaded from the snapshot
+                    domains = cold_domains.get(mac)
+                    if domains is None:
+                        domains = cold_domains[mac] = list(dev.cold_value("domains"))[-10:]
 
                 updates.append({
+                    "key": mac,
                     "mac": dev.mac,
+                    "segment": dev.segment,
+                    "logical_id": dev.logical_id,
                     "ip": dev.ip or f"({dev.last_known_ip})",
                     "vendor": dev.vendor,
                     "category": dev.category.value if not dev.is_blocked else "🚫 BLOCKED",
@@ -231,7 +349,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     "down_rate": round(down_rate, 1),
                     "is_blocked": dev.is_blocked,
                     "is_stale": not dev.ip,
-                    "domains": list(dev.domains)[-10:] # Last 10 domains
+                    "domains": domains # Last 10
                 })
             
             last_time = now
@@ -252,6 +370,8 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"CRITICAL: WebSocket loop crashed: {e}")
         logger.error(traceback.format_exc())
         manager.disconnect(websocket)
+    finally:
+        events.close()
 
 # Mount Static Files
 static_path = os.path.join(os.path.dirname(__file__), "static")
@@ -9,9 +9,20 @@ class SettingsManager:
         self.filename = filename
         self.settings = {
             "interface": None,
+            "extra_interfaces": [], # More interfaces/VLANs to monitor: names or {"interface", "gateway"}
             "scan_interval": 30,
+            "scan_rate_pps": 500,
             "paranoid_mode": False,
-            "domain_log_limit": 20
+            "domain_log_limit": 20,
+            "persist_interval": 5,
+            "stale_timeout": 60,
+            "retention_days": 30,
+            "max_devices": 2000,
+            "port_probing": False,
+            "probe_concurrency": 256,
+            "probe_ttl": 3600,
+            "capture_process": False, # Run capture/spoofing in a child process (see src/engine/capture.py)
+            "restore_budget": 1.5 # Seconds allowed for restoring every target's ARP cache on shutdown
         }
         self.load()
 
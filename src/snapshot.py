@@ -0,0 +1,141 @@
+"""
+Compact binary snapshot format for DeviceStore.
+
+Layout (little endian):
+    header   : magic "AGXS", version u16, record count u32
+    schema   : u16 field count, then each hot string field name (u8 len + ascii)
+    records  : u32 record length, then
+                 numerics  (confidence i32, total_up u64, total_down u64,
+                            last_seen f64, is_blocked u8)
+                 hot strings in schema order (u16 len + utf8)
+                 cold blob (u32 len + JSON of list/dict fields)
+
+The schema travels with the file, so adding a string field to Device does not
+break older snapshots. Cold fields (domains, histories, ...) are kept as raw
+bytes on the Device and only decoded when first touched.
+"""
+
+import json
+import mmap
+import struct
+from typing import Dict, List
+
+MAGIC = b"AGXS"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHI")
+NUMERICS = struct.Struct("<iQQdB")
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+
+HOT_STRING_FIELDS = [
+    "mac", "ip", "vendor", "hostname", "category", "os_guess", "last_sni",
+    "schedule_start", "schedule_end", "last_known_ip", "logical_id", "model", "segment",
+]
+# Cold field -> factory for its empty value
+COLD_FIELDS = {
+    "open_ports": list,
+    "mdns_services": list,
+    "history_up": list,
+    "history_down": list,
+    "domains": list,
+    "fingerprints": dict,
+}
+
+def is_snapshot(data: bytes) -> bool:
+    return data[:4] == MAGIC
+
+def encode(devices) -> bytes:
+    """Encodes an iterable of Device objects into snapshot bytes."""
+    out = bytearray()
+    records = list(devices)
+    out += HEADER.pack(MAGIC, VERSION, len(records))
+    out += U16.pack(len(HOT_STRING_FIELDS))
+    for name in HOT_STRING_FIELDS:
+        raw = name.encode("ascii")
+        out += U8.pack(len(raw)) + raw
+
+    for dev in records:
+        data = dev.to_dict(include_cold=False)
+        body = bytearray(NUMERICS.pack(
+            int(data.get("confidence", 0)),
+            int(data.get("total_up", 0)),
+            int(data.get("total_down", 0)),
+            float(data.get("last_seen", 0.0)),
+            1 if data.get("is_blocked") else 0,
+        ))
+        for name in HOT_STRING_FIELDS:
+            raw = clip_utf8(str(data.get(name, "") or ""), 0xFFFF)
+            body += U16.pack(len(raw)) + raw
+        cold = dev.cold_blob()
+        body += U32.pack(len(cold)) + cold
+        out += U32.pack(len(body)) + body
+    return bytes(out)
+
+def clip_utf8(text: str, limit: int) -> bytes:
+    """UTF-8 encoding of `text`, cut to at most `limit` bytes on a character boundary."""
+    raw = text.encode("utf8")
+    if len(raw) <= limit:
+        return raw
+    return raw[:limit].decode("utf8", "ignore").encode("utf8")
+
+def decode(buf) -> List[dict]:
+    """
+    Decodes snapshot bytes (or an mmap) into hot-field dicts. Each dict carries
+    the undecoded cold blob under "_cold".
+    """
+    magic, version, count = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a device snapshot")
+    if version > VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    offset = HEADER.size
+
+    (field_count,) = U16.unpack_from(buf, offset)
+    offset += U16.size
+    schema = []
+    for _ in range(field_count):
+        (length,) = U8.unpack_from(buf, offset)
+        offset += U8.size
+        schema.append(bytes(buf[offset:offset + length]).decode("ascii"))
+        offset += length
+
+    records = []
+    for _ in range(count):
+        (length,) = U32.unpack_from(buf, offset)
+        offset += U32.size
+        end = offset + length
+        confidence, total_up, total_down, last_seen, is_blocked = NUMERICS.unpack_from(buf, offset)
+        cursor = offset + NUMERICS.size
+        data = {
+            "confidence": confidence,
+            "total_up": total_up,
+            "total_down": total_down,
+            "last_seen": last_seen,
+            "is_blocked": bool(is_blocked),
+        }
+        for name in schema:
+            (slen,) = U16.unpack_from(buf, cursor)
+            cursor += U16.size
+            # Lenient: older snapshots could end a long field mid-character
+            data[name] = bytes(buf[cursor:cursor + slen]).decode("utf8", "replace")
+            cursor += slen
+        (cold_len,) = U32.unpack_from(buf, cursor)
+        cursor += U32.size
+        data["_cold"] = bytes(buf[cursor:cursor + cold_len])
+        records.append(data)
+        offset = end
+    return records
+
+def read_file(path: str) -> List[dict]:
+    """
+    Decodes a snapshot file through mmap. Every record's hot fields are
+    decoded up front; only the cold blobs are left as raw bytes.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return decode(mm)
+
+def encode_cold(data: Dict[str, object]) -> bytes:
+    return json.dumps({k: data.get(k) or factory() for k, factory in COLD_FIELDS.items()}, separators=(",", ":")).encode("utf8")
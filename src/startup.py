@@ -0,0 +1,70 @@
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class StartupProfile:
+    """
+    Records how long each startup phase took, for `GET /api/health`.
+
+    Phases may overlap (store loading, the Scapy import and network
+    detection run concurrently), so each one is reported with its own
+    start offset and duration, in seconds since `origin`.
+    """
+    def __init__(self, origin: float = None):
+        self.origin = origin if origin is not None else time.monotonic()
+        self.phases: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        with self.lock:
+            self.phases[name] = {"start": round(started - self.origin, 3), "seconds": None}
+        try:
+            yield
+        except Exception as e:
+            with self.lock:
+                self.phases[name]["error"] = str(e)
+            raise
+        finally:
+            with self.lock:
+                self.phases[name]["seconds"] = round(time.monotonic() - started, 3)
+            logger.info(f"Startup phase {name} took {time.monotonic() - started:.3f}s")
+
+    def mark(self, name: str):
+        """Records an instant, e.g. the first moment HTTP can be served."""
+        with self.lock:
+            self.phases[name] = {"start": round(time.monotonic() - self.origin, 3), "seconds": 0.0}
+
+    def run(self, name: str, fn: Callable, *args) -> threading.Thread:
+        """Runs `fn(*args)` as phase `name` on a daemon thread; errors are logged and recorded."""
+        def target():
+            try:
+                with self.phase(name):
+                    fn(*args)
+            except Exception as e:
+                logger.error(f"Startup phase {name} failed: {e}")
+        thread = threading.Thread(target=target, daemon=True, name=f"startup-{name}")
+        thread.start()
+        return thread
+
+    def done(self, name: str) -> bool:
+        phase = self.phases.get(name)
+        return bool(phase) and phase["seconds"] is not None and "error" not in phase
+
+    def stats(self) -> dict:
+        with self.lock:
+            phases = {name: dict(phase) for name, phase in self.phases.items()}
+        finished = [p["start"] + p["seconds"] for p in phases.values() if p["seconds"] is not None]
+        return {
+            "phases": phases,
+            "elapsed": round(max(finished), 3) if finished else None,
+        }
+
+def import_scapy():
+    """Scapy's import reads interfaces and routes and can take seconds; done once, off the request path."""
+    import scapy.all # noqa: F401
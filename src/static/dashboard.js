@@ -28,7 +28,7 @@ function connectWebSocket() {
         if (data.type === 'device_update') {
             updateUI(data);
             if (currentDeviceMac) {
-                const dev = data.devices.find(d => d.mac === currentDeviceMac);
+                const dev = data.devices.find(d => d.key === currentDeviceMac);
                 if (dev) updateDetailView(dev);
             }
         }
@@ -40,6 +40,11 @@ function connectWebSocket() {
     };
 }
 
+// Store key: the MAC, prefixed with "segment/" for devices on extra interfaces
+function rowId(dev) {
+    return `row-${dev.key.replace(/[:/]/g, '-')}`;
+}
+
 function updateUI(data) {
     devices = data.devices;
 
@@ -53,11 +58,11 @@ function updateUI(data) {
     const list = document.getElementById('device-list');
 
     devices.forEach(dev => {
-        let row = document.getElementById(`row-${dev.mac.replace(/:/g, '-')}`);
+        let row = document.getElementById(rowId(dev));
 
         if (!row) {
             row = document.createElement('tr');
-            row.id = `row-${dev.mac.replace(/:/g, '-')}`;
+            row.id = rowId(dev);
             list.appendChild(row);
         }
 
@@ -67,17 +72,17 @@ function updateUI(data) {
 
         row.innerHTML = `
             <td>${dev.ip}</td>
-            <td class="mac-cell">${dev.mac}</td>
+            <td class="mac-cell">${dev.segment ? `${dev.segment} · ` : ''}${dev.mac}</td>
             <td>${dev.vendor}</td>
             <td><span class="status-cell ${dev.is_blocked ? 'blocked' : ''} ${dev.is_stale ? 'stale' : ''}">${statusText}</span></td>
             <td class="rate-up">${dev.up_rate} KB/s</td>
             <td class="rate-down">${dev.down_rate} KB/s</td>
             <td>
                 <div class="action-btns">
-                    <button class="btn-icon btn-block ${dev.is_blocked ? 'active' : ''}" onclick="toggleBlock('${dev.mac}', ${!dev.is_blocked})">
+                    <button class="btn-icon btn-block ${dev.is_blocked ? 'active' : ''}" onclick="toggleBlock('${dev.key}', ${!dev.is_blocked})">
                         <i data-lucide="${dev.is_blocked ? 'unlock' : 'shield-off'}"></i>
                     </button>
-                    <button class="btn-icon" onclick="openDetails('${dev.mac}')">
+                    <button class="btn-icon" onclick="openDetails('${dev.key}')">
                         <i data-lucide="zoom-in"></i>
                     </button>
                 </div>
@@ -86,7 +91,7 @@ function updateUI(data) {
     });
 
     // Cleanup stale rows that are no longer in the update
-    const activeMacs = devices.map(d => `row-${d.mac.replace(/:/g, '-')}`);
+    const activeMacs = devices.map(rowId);
     Array.from(list.children).forEach(row => {
         if (!activeMacs.includes(row.id)) {
             list.removeChild(row);
@@ -144,11 +149,11 @@ document.getElementById('global-kill-switch').addEventListener('change', async (
     await fetch(`/api/kill-switch?enabled=${enabled}`, { method: 'POST' });
 });
 
-function openDetails(mac) {
-    const dev = devices.find(d => d.mac === mac);
+function openDetails(key) {
+    const dev = devices.find(d => d.key === key);
     if (!dev) return;
 
-    currentDeviceMac = mac;
+    currentDeviceMac = key;
     document.getElementById('modal-title').textContent = `NODE: ${dev.ip}`;
     document.getElementById('detail-vendor').textContent = dev.vendor;
     document.getElementById('detail-mac').textContent = dev.mac;
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from src import snapshot
+
+logger = logging.getLogger(__name__)
+
+class DeviceStorage:
+    """
+    Crash-safe persistence for DeviceStore.
+
+    State lives in two files: a binary snapshot (``devices.snap``, see
+    src/snapshot.py) and an append-only journal (``devices.json.journal``).
+    Each journal line is the complete latest state of one device (or a
+    tombstone), so replaying the journal over the snapshot is idempotent and
+    a torn final line can simply be ignored. Compaction folds the journal
+    back into a new snapshot which replaces the old one atomically.
+
+    A legacy ``devices.json`` is read when no snapshot exists yet and
+    ``needs_migration`` is set so the caller writes the first snapshot.
+    """
+    def __init__(self, filename: str, compact_threshold: int = 2000):
+        self.filename = filename
+        self.snapshot_path = os.path.splitext(filename)[0] + ".snap"
+        self.journal_path = filename + ".journal"
+        self.compact_threshold = compact_threshold
+        self.journal_records = 0
+        self.needs_migration = False
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, dict]:
+        """Returns the persisted device records (snapshot + journal replay), keyed by device key."""
+        from src.device_store import device_key
+        records = {}
+        self.needs_migration = False
+        if _has_content(self.snapshot_path):
+            try:
+                for data in snapshot.read_file(self.snapshot_path):
+                    records[device_key(data["mac"], data.get("segment", ""))] = data
+            except Exception as e:
+                logger.error(f"Failed to read snapshot {self.snapshot_path}: {e}")
+        elif _has_content(self.filename):
+            try:
+                with open(self.filename, 'r') as f:
+                    records = json.load(f)
+                self.needs_migration = True
+            except Exception as e:
+                logger.error(f"Failed to read legacy snapshot {self.filename}: {e}")
+
+        self.journal_records = 0
+        if os.path.exists(self.journal_path):
+            good = 0 # Byte offset just past the last intact record
+            torn = False
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no newline")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash: everything before it is intact
+                        torn = True
+                        break
+                    good += len(line)
+                    mac = entry.get("mac")
+                    if not mac:
+                        continue
+                    if entry.get("deleted"):
+                        records.pop(mac, None)
+                    else:
+                        records[mac] = entry.get("device", {})
+                    self.journal_records += 1
+            if torn:
+                # Cut the tail off, or the next append() would continue the broken line
+                logger.warning(f"Truncating torn journal tail in {self.journal_path} at byte {good}")
+                with self.lock:
+                    with open(self.journal_path, 'r+b') as f:
+                        f.truncate(good)
+                        f.flush()
+                        os.fsync(f.fileno())
+        return records
+
+    def append(self, changes: Dict[str, Optional[dict]]):
+        """
+        Appends one batch of device changes to the journal and fsyncs it.
+        A value of None records a deletion.
+        """
+        if not changes:
+            return
+        lines = []
+        for mac, data in changes.items():
+            if data is None:
+                lines.append(json.dumps({"mac": mac, "deleted": True}))
+            else:
+                lines.append(json.dumps({"mac": mac, "device": data}))
+        payload = "\n".join(lines) + "\n"
+
+        with self.lock:
+            with open(self.journal_path, 'a') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_records += len(lines)
+
+    def needs_compaction(self, live_records: int) -> bool:
+        # Compact once the journal outweighs the snapshot it sits on
+        return self.journal_records > max(self.compact_threshold, live_records)
+
+    def compact(self, data: bytes):
+        """Writes a fresh encoded snapshot atomically and truncates the journal."""
+        tmp_path = self.snapshot_path + ".tmp"
+        with self.lock:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._fsync_dir()
+            self.needs_migration = False
+
+            # Journal entries are already part of the snapshot; replaying them
+            # again after a crash here would be harmless.
+            with open(self.journal_path, 'w') as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_records = 0
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass # Not supported on every platform
+
+def _has_content(path: str) -> bool:
+    # Docker setups `touch` the files up front, so empty means "no data yet"
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+class AutoFlusher(threading.Thread):
+    """Periodically writes dirty devices from a DeviceStore to its journal."""
+    def __init__(self, device_store, interval: float = 5.0):
+        super().__init__(daemon=True)
+        self.device_store = device_store
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.device_store.flush()
+
+    def stop(self):
+        self._stop_event.set()
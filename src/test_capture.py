@@ -0,0 +1,95 @@
+import unittest
+
+from src.device_store import DeviceStore
+from src.engine.capture import CaptureProcess, CounterTable, ReplicaStore
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+class TestCapture(unittest.TestCase):
+    def test_counter_table_is_shared(self):
+        writer = CounterTable(slots=2)
+        reader = CounterTable(name=writer.name)
+        try:
+            writer.add("aa:bb:cc:00:00:01", up=100, last_seen=5.0)
+            writer.add("eth0.20/aa:bb:cc:00:00:01", down=40)
+            writer.add("aa:bb:cc:00:00:01", up=20, down=1, last_seen=6.0)
+            writer.add("aa:bb:cc:00:00:03", up=1) # Table full: counted, not stored
+            self.assertEqual(list(reader.read()), [("aa:bb:cc:00:00:01", 120, 1, 6.0), ("eth0.20/aa:bb:cc:00:00:01", 0, 40, 0.0)])
+            self.assertEqual(writer.overflow, 1)
+        finally:
+            reader.close()
+            writer.close(unlink=True)
+
+    def test_removed_devices_free_their_slots(self):
+        writer = CounterTable(slots=1)
+        reader = CounterTable(name=writer.name)
+        try:
+            writer.add("aa:bb:cc:00:00:01", up=100)
+            writer.add("aa:bb:cc:00:00:02", up=5) # Full
+            self.assertEqual(reader.overflow, 1) # Visible to the web process
+            writer.free("aa:bb:cc:00:00:01")
+            self.assertEqual(list(reader.read()), [])
+            writer.add("aa:bb:cc:00:00:02", up=5)
+            self.assertEqual(list(reader.read()), [("aa:bb:cc:00:00:02", 5, 0, 0.0)])
+        finally:
+            reader.close()
+            writer.close(unlink=True)
+
+    def test_supervisor_folds_counters_and_applies_child_events(self):
+        store = DeviceStore()
+        store.add_or_update("192.168.1.10", "aa:bb:cc:00:00:10", "Apple")
+        capture = CaptureProcess(store, gateway_ip="192.168.1.1", interface="eth0")
+        capture.table = CounterTable(slots=8)
+        try:
+            capture.table.add("aa:bb:cc:00:00:10", up=1000, down=500, last_seen=1e10)
+            capture.table.add("aa:bb:cc:00:00:99", up=7) # Not in the store yet
+            capture.fold_counters()
+            capture.table.add("aa:bb:cc:00:00:10", up=24)
+            capture.fold_counters()
+            dev = store.get("aa:bb:cc:00:00:10")
+            self.assertEqual(dev.counters(), (1024, 500))
+            self.assertEqual(dev.last_seen, 1e10)
+
+            capture._handle(("seen", "192.168.1.99", "aa:bb:cc:00:00:99", "Unknown"))
+            capture.fold_counters() # Counted before the store knew the device
+            self.assertEqual(store.get("aa:bb:cc:00:00:99").counters(), (7, 0))
+        finally:
+            capture.table.close(unlink=True)
+
+        capture._handle(("domain", "aa:bb:cc:00:00:10", "example.com"))
+        capture._handle(("fingerprint", "aa:bb:cc:00:00:10", "tcp", "64:65535:mss"))
+        capture._handle(("ipv6", "aa:bb:cc:00:00:10", "2001:db8::10"))
+        self.assertEqual((dev.last_sni, dev.domains, dev.fingerprints["tcp"]), ("example.com", ["example.com"], "64:65535:mss"))
+        self.assertEqual(capture.ipv6_targets, {"aa:bb:cc:00:00:10": "2001:db8::10"})
+
+        # Web-process changes reach the child as replica updates
+        capture.conn = Recorder()
+        events = store.events.subscribe(types=CaptureProcess.STORE_EVENTS)
+        store.set_blocked("aa:bb:cc:00:00:10", True)
+        capture.gateway_ip = "192.168.1.254"
+        for event in events.drain():
+            capture._forward(event)
+        self.assertEqual(capture.conn.sent[0], ("set", "gateway_ip", "192.168.1.254"))
+        self.assertEqual(capture.conn.sent[1][0], "device")
+        self.assertTrue(capture.conn.sent[1][1]["is_blocked"])
+
+    def test_replica_mirrors_monitor_writes(self):
+        outbox = Recorder()
+        replica = ReplicaStore(outbox)
+        replica.apply({"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:05", "segment": "eth1", "is_blocked": True})
+        self.assertTrue(replica.get_by_ip("10.0.0.5", "eth1").is_blocked)
+        replica.apply({"ip": "10.0.0.6", "mac": "aa:bb:cc:00:00:05", "segment": "eth1", "is_blocked": False})
+        self.assertIsNone(replica.get_by_ip("10.0.0.5", "eth1"))
+        self.assertFalse(replica.get("eth1/aa:bb:cc:00:00:05").is_blocked)
+
+        replica.set_os_guess("eth1/aa:bb:cc:00:00:05", "Linux")
+        replica.set_os_guess("eth1/aa:bb:cc:00:00:05", "Linux") # Unchanged: not forwarded
+        self.assertEqual(outbox.sent, [("os", "eth1/aa:bb:cc:00:00:05", "Linux")])
+
+if __name__ == '__main__':
+    unittest.main()
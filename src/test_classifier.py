@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from src.device_store import Device, DeviceCategory
+from src.device_store import DeviceStore
+from src.engine.classification import MANUAL_CONFIDENCE, ClassificationWorker
+from src.engine.classifier import DeviceClassifier
+
+class TestDeviceClassifier(unittest.TestCase):
+    def test_list_order_decides_between_overlapping_keywords(self):
+        classifier = DeviceClassifier()
+        # "google" is listed before "google home", so it wins although both match
+        dev = Device(ip="10.0.0.2", mac="00:00:00:00:00:02", vendor="Google Home Inc")
+        self.assertEqual(classifier.classify(dev), (DeviceCategory.MOBILE, 50))
+        # "hp" appears later in the string than "intel" but "intel" is listed first
+        dev = Device(ip="10.0.0.3", mac="00:00:00:00:00:03", vendor="HP Intel Corp")
+        self.assertEqual(classifier.classify(dev), (DeviceCategory.PC, 60))
+
+    def test_memoizes_on_inputs(self):
+        classifier = DeviceClassifier()
+        devices = [Device(ip=f"10.0.0.{i}", mac=f"00:00:00:00:00:{i:02x}", vendor="Roku, Inc") for i in range(5)]
+        results = classifier.classify_many(devices)
+        self.assertEqual(set(results), {(DeviceCategory.MEDIA, 95)})
+        self.assertEqual(classifier.cache_stats()["misses"], 1)
+
+        devices[0].mdns_services = ["_ipp._tcp.local"]
+        self.assertEqual(classifier.classify(devices[0]), (DeviceCategory.PRINTER, 99))
+
+    def test_rules_load_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rules.json")
+            with open(path, "w") as f:
+                json.dump({"vendor": [["acme", "IOT", 77]], "services": []}, f)
+            classifier = DeviceClassifier(path)
+        dev = Device(ip="10.0.0.4", mac="00:00:00:00:00:04", vendor="ACME Widgets")
+        self.assertEqual(classifier.classify(dev), (DeviceCategory.IOT, 77))
+
+class TestClassificationWorker(unittest.TestCase):
+    def test_reclassifies_only_on_input_changes(self):
+        store = DeviceStore()
+        store.loaded.set()
+        worker = ClassificationWorker(store, debounce=0.05)
+        worker.start()
+        try:
+            store.add_or_update("10.0.0.5", "00:00:00:00:00:05", "Apple, Inc.")
+            store.add_or_update("10.0.0.5", "00:00:00:00:00:05", "Apple, Inc.") # No input change
+            self._wait_for(lambda: store.get("00:00:00:00:00:05").category == DeviceCategory.MOBILE)
+
+            store.update_discovery_info("00:00:00:00:00:05", hostname="Living-Room-TV.local")
+            self._wait_for(lambda: store.get("00:00:00:00:00:05").category == DeviceCategory.MEDIA)
+            self.assertEqual(worker.classified, 2)
+        finally:
+            worker.stop()
+            worker.join(timeout=2)
+
+    def test_manual_category_is_not_overridden(self):
+        store = DeviceStore()
+        store.loaded.set()
+        worker = ClassificationWorker(store, debounce=0.05)
+        worker.start()
+        try:
+            dev = store.add_or_update("10.0.0.2", "00:00:00:00:00:02", "Apple (Host)")
+            store.set_classification(dev.key, DeviceCategory.PC, MANUAL_CONFIDENCE)
+            store.add_or_update("10.0.0.5", "00:00:00:00:00:05", "Apple, Inc.")
+            self._wait_for(lambda: store.get("00:00:00:00:00:05").category == DeviceCategory.MOBILE)
+            self.assertEqual((dev.category, dev.confidence), (DeviceCategory.PC, MANUAL_CONFIDENCE))
+        finally:
+            worker.stop()
+            worker.join(timeout=2)
+
+    def test_removed_devices_are_forgotten(self):
+        store = DeviceStore()
+        store.loaded.set()
+        worker = ClassificationWorker(store, debounce=0.05)
+        worker.start()
+        try:
+            store.add_or_update("10.0.0.5", "da:00:00:00:00:05", "Apple, Inc.")
+            self._wait_for(lambda: "da:00:00:00:00:05" in worker._inputs)
+            store.remove_devices(["da:00:00:00:00:05"])
+            self._wait_for(lambda: not worker._inputs)
+        finally:
+            worker.stop()
+            worker.join(timeout=2)
+
+    def _wait_for(self, predicate, timeout=2.0):
+        deadline = time.time() + timeout
+        while not predicate():
+            self.assertLess(time.time(), deadline, "condition not reached")
+            time.sleep(0.01)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import unittest
+
+from src.device_store import DeviceStore, device_key
+
+class TestStoreView(unittest.TestCase):
+    def setUp(self):
+        self.store = DeviceStore()
+
+    def test_structural_changes_publish_new_view(self):
+        before = self.store.view
+        self.store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        after = self.store.view
+        self.assertGreater(after.version, before.version)
+        self.assertEqual(len(before.devices), 0) # Old readers keep their view
+        self.assertEqual(self.store.get_by_ip("192.168.1.10").mac, "00:00:00:00:00:10")
+
+        # Refreshing an existing device doesn't republish
+        self.store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        self.assertIs(self.store.view, after)
+
+    def test_recently_seen_owner_keeps_ip(self):
+        self.store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        newcomer = self.store.add_or_update("192.168.1.10", "00:00:00:00:00:11")
+        self.assertEqual(newcomer.ip, "")
+        self.assertEqual(self.store.get_by_ip("192.168.1.10").mac, "00:00:00:00:00:10")
+
+    def test_stale_owner_loses_ip(self):
+        old = self.store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        old.last_seen = time.time() - 60
+        newcomer = self.store.add_or_update("192.168.1.10", "00:00:00:00:00:11")
+        self.assertEqual(newcomer.ip, "192.168.1.10")
+        self.assertEqual(old.ip, "")
+        self.assertEqual(self.store.get_by_ip("192.168.1.10").mac, "00:00:00:00:00:11")
+
+    def test_counters_read_as_pair(self):
+        dev = self.store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        dev.add_traffic(up=100)
+        dev.add_traffic(down=50)
+        self.assertEqual(dev.counters(), (100, 50))
+
+    def test_discovery_before_arp_is_merged_on_bind(self):
+        self.store.buffer_discovery("192.168.1.20", hostname="printer.local", service="_ipp._tcp")
+        self.store.buffer_discovery("192.168.1.20", service="mDNS")
+        self.store.pending.add("192.168.1.21", service="mDNS", now=time.time() - 300) # Past its TTL
+
+        dev = self.store.add_or_update("192.168.1.20", "00:00:00:00:00:20")
+        self.assertEqual(dev.hostname, "printer.local")
+        self.assertEqual(dev.mdns_services, ["_ipp._tcp", "mDNS"])
+        self.store.add_or_update("192.168.1.21", "00:00:00:00:00:21")
+        self.assertEqual(self.store.get("00:00:00:00:00:21").mdns_services, [])
+        stats = self.store.pending.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expired"], stats["buffered"]), (1, 3, 1, 0))
+
+    def test_segments_keep_reused_addresses_apart(self):
+        # Same MAC and IP on two VLANs (e.g. a trunked switch) are two devices
+        self.store.add_or_update("10.0.0.5", "00:00:00:00:00:05")
+        self.store.add_or_update("10.0.0.5", "00:00:00:00:00:05", segment="eth0.20")
+        self.store.buffer_discovery("10.0.0.6", hostname="cam.local", segment="eth0.20")
+        self.store.add_or_update("10.0.0.6", "00:00:00:00:00:06")
+        self.store.add_or_update("10.0.0.6", "00:00:00:00:00:06", segment="eth0.20")
+        self.assertEqual(len(self.store.view.devices), 4)
+        self.assertEqual(self.store.get_by_ip("10.0.0.5", "eth0.20").key, "eth0.20/00:00:00:00:00:05")
+        self.assertEqual(self.store.get_by_ip("10.0.0.6").hostname, "")
+        self.assertEqual(self.store.get_by_ip("10.0.0.6", "eth0.20").hostname, "cam.local")
+
+        self.store.set_blocked(device_key("00:00:00:00:00:05", "eth0.20"), True)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "devices.json")
+            self.store.save_to_file(path)
+            restored = DeviceStore()
+            restored.load_from_file(path)
+        self.assertTrue(restored.get_by_ip("10.0.0.5", "eth0.20").is_blocked)
+        self.assertFalse(restored.get_by_ip("10.0.0.5").is_blocked)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import socket
+import unittest
+from unittest.mock import MagicMock
+import sys
+
+# Mock scapy before import
+sys.modules["scapy"] = MagicMock()
+sys.modules["scapy.all"] = MagicMock()
+sys.modules["scapy.layers.dns"] = MagicMock()
+
+from src.device_store import DeviceStore
+from src.engine.dhcp import DHCPREQUEST, DhcpFingerprintDB, parse_dhcp
+from src.engine.monitor import BandwidthMonitor
+
+def build_request(mac, requested_ip, hostname, params, vendor_class=None):
+    header = bytearray(236)
+    header[0] = 1 # BOOTREQUEST
+    header[1], header[2] = 1, 6
+    header[28:34] = bytes.fromhex(mac.replace(":", ""))
+    options = bytearray(b"\x63\x82\x53\x63")
+    options += bytes([53, 1, DHCPREQUEST])
+    options += bytes([50, 4]) + socket.inet_aton(requested_ip)
+    options += bytes([12, len(hostname)]) + hostname.encode()
+    if vendor_class:
+        options += bytes([60, len(vendor_class)]) + vendor_class.encode()
+    options += bytes([0, 0]) # Padding
+    options += bytes([55, len(params)]) + bytes(params)
+    options += bytes([255])
+    return bytes(header + options)
+
+WINDOWS_PARAMS = [1, 3, 6, 15, 31, 33, 43, 44, 46, 47, 119, 121, 249, 252]
+
+class TestDhcp(unittest.TestCase):
+    def test_parses_options_from_raw_bytes(self):
+        info = parse_dhcp(build_request("aa:bb:cc:00:00:01", "192.168.1.50", "DESKTOP-1", WINDOWS_PARAMS, "MSFT 5.0"))
+        self.assertEqual(info["mac"], "aa:bb:cc:00:00:01")
+        self.assertEqual(info["requested_ip"], "192.168.1.50")
+        self.assertEqual(info["hostname"], "DESKTOP-1")
+        self.assertEqual(info["vendor_class"], "MSFT 5.0")
+        self.assertEqual(info["param_list"], WINDOWS_PARAMS)
+        self.assertIsNone(parse_dhcp(b"\x02" + bytes(300))) # Server replies are ignored
+
+    def test_fingerprint_lookup(self):
+        db = DhcpFingerprintDB()
+        info = parse_dhcp(build_request("aa:bb:cc:00:00:01", "192.168.1.50", "x", WINDOWS_PARAMS))
+        self.assertEqual(db.lookup(info), "Windows 10/11")
+        info = parse_dhcp(build_request("aa:bb:cc:00:00:01", "192.168.1.50", "x", [1, 3, 99], "android-dhcp-13"))
+        self.assertEqual(db.lookup(info), "Android")
+
+    def test_request_registers_new_device_with_hostname_and_os(self):
+        store = DeviceStore()
+        monitor = BandwidthMonitor(store, "192.168.1.1")
+        monitor._process_dhcp(build_request("08:00:27:00:00:02", "192.168.1.60", "DESKTOP-2", WINDOWS_PARAMS))
+        dev = store.get_by_ip("192.168.1.60")
+        self.assertIsNotNone(dev)
+        self.assertEqual(dev.hostname, "DESKTOP-2")
+        self.assertEqual(dev.os_guess, "Windows 10/11")
+        self.assertEqual(dev.fingerprints["dhcp"], ",".join(map(str, WINDOWS_PARAMS)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import struct
+import unittest
+
+from src.device_store import DeviceStore
+from src.engine.discovery import DiscoveryListener, parse_ssdp_headers
+from src.engine.dnswire import TYPE_A, TYPE_PTR, TYPE_SRV, TYPE_TXT, DnsError, RecordCache, build_query, parse_message
+
+def name(text):
+    return b"".join(bytes([len(p)]) + p.encode() for p in text.split(".")) + b"\x00"
+
+def rr(owner, rtype, ttl, rdata):
+    return owner + struct.pack("!HHIH", rtype, 0x8001, ttl, len(rdata)) + rdata
+
+def googlecast_announcement():
+    header = struct.pack("!HHHHHH", 0, 0x8400, 0, 1, 0, 3)
+    body = bytearray()
+    service_off = len(header) + len(body)
+    service = name("_googlecast._tcp.local")
+    # PTR: _googlecast._tcp.local -> "Living Room._googlecast._tcp.local" (compressed suffix)
+    instance = bytes([11]) + b"Living Room" + struct.pack("!H", 0xC000 | service_off)
+    body += rr(service, TYPE_PTR, 120, instance)
+    instance_off = len(header) + len(body) - len(instance)
+    instance_ptr = struct.pack("!H", 0xC000 | instance_off)
+    host = name("Chromecast-abc.local")
+    body += rr(instance_ptr, TYPE_SRV, 120, struct.pack("!HHH", 0, 0, 8009) + host)
+    body += rr(instance_ptr, TYPE_TXT, 4500, b"\x0dmd=Chromecast\x06fn=Den")
+    body += rr(name("Chromecast-abc.local"), TYPE_A, 120, bytes([192, 168, 1, 40]))
+    return bytes(header + body)
+
+class TestDnsWire(unittest.TestCase):
+    def test_parses_compressed_records(self):
+        flags, records = parse_message(googlecast_announcement())
+        self.assertTrue(flags & 0x8000)
+        by_type = {r.type: r for r in records}
+        self.assertEqual(by_type[TYPE_PTR].data, "Living Room._googlecast._tcp.local")
+        self.assertEqual(by_type[TYPE_SRV].name, "Living Room._googlecast._tcp.local")
+        self.assertEqual(by_type[TYPE_SRV].data, (0, 0, 8009, "Chromecast-abc.local"))
+        self.assertEqual(by_type[TYPE_TXT].data, ("md=Chromecast", "fn=Den"))
+        self.assertEqual(by_type[TYPE_A].data, "192.168.1.40")
+
+    def test_rejects_pointer_loops_and_truncation(self):
+        looped = struct.pack("!HHHHHH", 0, 0x8400, 1, 0, 0, 0) + b"\xc0\x0c"
+        with self.assertRaises(DnsError):
+            parse_message(looped)
+        with self.assertRaises(DnsError):
+            parse_message(googlecast_announcement()[:-3])
+
+    def test_cache_suppresses_repeats_until_half_ttl(self):
+        cache = RecordCache()
+        _, records = parse_message(googlecast_announcement())
+        self.assertEqual(len(cache.fresh("192.168.1.40", records, now=1000)), 4)
+        self.assertEqual(cache.fresh("192.168.1.40", records, now=1030), [])
+        self.assertEqual({r.type for r in cache.fresh("192.168.1.40", records, now=1061)}, {TYPE_PTR, TYPE_SRV, TYPE_A})
+
+    def test_cache_caps_sources_and_forgets_departed_devices(self):
+        _, records = parse_message(googlecast_announcement())
+        cache = RecordCache(max_sources=2)
+        for ip in ("192.168.1.40", "192.168.1.41", "192.168.1.40", "192.168.1.42"):
+            cache.fresh(ip, records, now=1000)
+        self.assertEqual(list(cache.entries), ["192.168.1.40", "192.168.1.42"]) # .41 was heard least recently
+
+        store = DeviceStore()
+        store.add_or_update("192.168.1.40", "00:00:00:00:00:40")
+        listener = DiscoveryListener(store)
+        listener._handle_mdns("192.168.1.40", googlecast_announcement())
+        self.assertIn("192.168.1.40", listener.mdns_cache.entries)
+        store.remove_devices(["00:00:00:00:00:40"])
+        for event in listener._departures.drain():
+            listener._on_departure(event)
+        self.assertEqual(listener.mdns_cache.entries, {})
+
+    def test_discovery_records_hostname_and_service_types(self):
+        store = DeviceStore()
+        store.add_or_update("192.168.1.40", "00:00:00:00:00:40")
+        listener = DiscoveryListener(store)
+        listener._handle_mdns("192.168.1.40", googlecast_announcement())
+        dev = store.get("00:00:00:00:00:40")
+        self.assertEqual(dev.hostname, "Chromecast-abc.local")
+        self.assertEqual(dev.mdns_services, ["mDNS", "_googlecast._tcp"])
+
+    def test_enumerated_types_are_browsed_and_ssdp_headers_fold_case(self):
+        store = DeviceStore()
+        store.add_or_update("192.168.1.41", "00:00:00:00:00:41")
+        listener = DiscoveryListener(store)
+        header = struct.pack("!HHHHHH", 0, 0x8400, 0, 1, 0, 0)
+        listener._handle_mdns("192.168.1.41", header + rr(name("_services._dns-sd._udp.local"), TYPE_PTR, 4500, name("_matter._tcp.local")))
+        self.assertEqual(listener._pending_types, {"_matter._tcp.local"})
+        self.assertIn("_matter._tcp", store.get("00:00:00:00:00:41").mdns_services)
+
+        listener.known_types.update(f"_t{n}._tcp.local" for n in range(300)) # Beyond the cap: no longer browsed
+        listener._handle_mdns("192.168.1.41", header + rr(name("_services._dns-sd._udp.local"), TYPE_PTR, 4500, name("_flood._tcp.local")))
+        self.assertNotIn("_flood._tcp.local", listener.known_types)
+
+        query = build_query(sorted(listener._pending_types))
+        self.assertEqual(struct.unpack_from("!H", query, 4)[0], 1) # One question
+        self.assertIn(name("_matter._tcp.local"), query)
+
+        reply = b"HTTP/1.1 200 OK\r\nLocation: http://192.168.1.41:49152/desc.xml\r\nserver: Linux UPnP/1.0 Sonos/70.3\r\n\r\n"
+        headers = parse_ssdp_headers(reply)
+        self.assertEqual(headers["SERVER"], "Linux UPnP/1.0 Sonos/70.3")
+        self.assertEqual(headers["LOCATION"], "http://192.168.1.41:49152/desc.xml")
+        listener._handle_ssdp("192.168.1.41", reply)
+        self.assertIn("Linux UPnP/1.0 Sonos/70.3", store.get("00:00:00:00:00:41").mdns_services)
+
+if __name__ == '__main__':
+    unittest.main()
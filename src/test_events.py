@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from src.device_store import DeviceStore
+from src.events import EventBus, DeviceEventType
+
+class TestEventBus(unittest.TestCase):
+    def test_coalesces_per_device_and_keeps_original_old_value(self):
+        bus = EventBus()
+        sub = bus.subscribe()
+        bus.emit(DeviceEventType.IP_CHANGED, "aa", old_ip="10.0.0.1", ip="10.0.0.2")
+        bus.emit(DeviceEventType.IP_CHANGED, "aa", old_ip="10.0.0.2", ip="10.0.0.3")
+        events = sub.drain()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].data, {"old_ip": "10.0.0.1", "ip": "10.0.0.3"})
+        self.assertEqual(sub.coalesced, 1)
+
+    def test_bounded_queue_drops_oldest(self):
+        bus = EventBus()
+        sub = bus.subscribe(maxsize=2, coalesce=False)
+        for mac in ("a", "b", "c"):
+            bus.emit(DeviceEventType.ADDED, mac)
+        self.assertEqual([e.mac for e in sub.drain()], ["b", "c"])
+        self.assertEqual(sub.dropped, 1)
+
+    def test_store_publishes_typed_events(self):
+        store = DeviceStore()
+        sub = store.events.subscribe(types=[DeviceEventType.ADDED, DeviceEventType.BLOCKED])
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        store.set_blocked("00:00:00:00:00:10", True)
+        self.assertEqual([e.type for e in sub.drain()], [DeviceEventType.ADDED, DeviceEventType.BLOCKED])
+
+    def test_async_subscriber_wakes_on_publish(self):
+        bus = EventBus()
+        sub = bus.subscribe()
+
+        async def consume():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.01, lambda: loop.run_in_executor(None, bus.emit, DeviceEventType.STALE, "aa"))
+            return await asyncio.wait_for(sub.aget(), timeout=1.0)
+
+        event = asyncio.run(consume())
+        self.assertEqual(event.type, DeviceEventType.STALE)
+
+if __name__ == '__main__':
+    unittest.main()
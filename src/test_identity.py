@@ -0,0 +1,77 @@
+import unittest
+
+from src.device_store import Device
+from src.identity import IdentityResolver, hostname_key, is_randomized_mac
+from src.snapshot import encode_cold
+
+class TestIdentityResolver(unittest.TestCase):
+    def setUp(self):
+        self.resolver = IdentityResolver()
+
+    def test_randomized_macs_with_same_hostname_merge(self):
+        first = Device(ip="192.168.1.20", mac="da:11:22:33:44:01", hostname="Johns-iPhone.local")
+        second = Device(ip="192.168.1.21", mac="7e:11:22:33:44:02", hostname="Johns-iPhone-2.local")
+        self.resolver.refresh([first])
+        changed = self.resolver.refresh([second])
+
+        self.assertEqual(changed, ["7e:11:22:33:44:02"])
+        self.assertEqual(first.logical_id, second.logical_id)
+        merged = self.resolver.logical_devices([first, second])
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0]["macs"], ["7e:11:22:33:44:02", "da:11:22:33:44:01"])
+
+    def test_os_level_fingerprint_alone_does_not_merge(self):
+        first = Device(ip="", mac="da:11:22:33:44:01", fingerprints={"dhcp": "1,121,3,6,15,119,252"})
+        second = Device(ip="", mac="7e:11:22:33:44:02", fingerprints={"dhcp": "1,121,3,6,15,119,252"})
+        self.resolver.refresh([first, second])
+        self.assertNotEqual(first.logical_id, second.logical_id)
+
+    def test_refresh_leaves_snapshot_blobs_undecoded(self):
+        dev = Device(ip="", mac="da:11:22:33:44:01", hostname="Johns-iPhone.local")
+        dev.__dict__["_cold"] = encode_cold({"fingerprints": {"tls": "771,4865-4866"}})
+        del dev.__dict__["fingerprints"]
+        self.resolver.refresh([dev])
+        keys = set(self.resolver.keys_by_mac[dev.key])
+        self.assertTrue(any(key.startswith("tls:") for key in keys))
+        self.assertEqual(self.resolver.refresh([dev]), []) # Unchanged signals are not re-read
+
+        dev.hostname = "Johns-Other-iPhone.local"
+        dev.signals_changed()
+        self.resolver.refresh([dev])
+        self.assertNotEqual(self.resolver.keys_by_mac[dev.key], keys)
+        self.assertFalse(dev.cold_decoded)
+
+    def test_type_level_signals_alone_do_not_merge(self):
+        services = ["mDNS", "_companion-link._tcp", "_rdlink._tcp", "_apple-mobdev2._tcp"]
+        first = Device(ip="", mac="da:11:22:33:44:01", mdns_services=list(services), fingerprints={"dhcp": "1,121,3,6,15,119,252"})
+        second = Device(ip="", mac="7e:11:22:33:44:02", mdns_services=list(services), fingerprints={"dhcp": "1,121,3,6,15,119,252"})
+        self.resolver.refresh([first, second])
+        self.assertNotEqual(first.logical_id, second.logical_id)
+
+    def test_common_domains_count_once(self):
+        domains = ["www.icloud.com", "gateway.apple.com", "is1-ssl.mzstatic.com"]
+        first = Device(ip="", mac="da:11:22:33:44:01", domains=list(domains))
+        second = Device(ip="", mac="7e:11:22:33:44:02", domains=list(domains))
+        self.resolver.refresh([first, second])
+        self.assertNotEqual(first.logical_id, second.logical_id)
+
+    def test_stock_hostnames_do_not_merge(self):
+        phones = [Device(ip="", mac=f"da:11:22:33:44:0{n}", hostname=name)
+                  for n, name in enumerate(["iPhone", "iPhone.local", "iPhone (2)", "Pixel-7", "Galaxy-S21"])]
+        self.resolver.refresh(phones)
+        self.assertEqual(len({d.logical_id for d in phones}), len(phones))
+
+    def test_hostname_keys_strip_only_conflict_suffixes(self):
+        self.assertEqual(hostname_key("Johns-iPhone-2.local"), "johns-iphone")
+        self.assertEqual(hostname_key("John’s MacBook Pro (2)"), "johns-macbook-pro")
+        self.assertNotEqual(hostname_key("Annas-Pixel-7"), hostname_key("Annas-Pixel-8"))
+        self.assertIsNone(hostname_key("Pixel-7"))
+        self.assertIsNone(hostname_key("Galaxy"))
+
+    def test_burned_in_mac_is_its_own_identity(self):
+        self.assertFalse(is_randomized_mac("00:1b:63:00:00:01"))
+        dev = Device(ip="", mac="00:1b:63:00:00:01", hostname="Johns-iPhone")
+        self.assertEqual(self.resolver.resolve(dev), "mac:00:1b:63:00:00:01")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from src.engine.liveness import LivenessTracker
+
+class TestLivenessTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = LivenessTracker(base_interval=30, max_interval=600, full_sweep_interval=1800)
+        self.hosts = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        self.tracker.due(self.hosts, now=1000) # First pass is a full sweep
+
+    def test_skips_passively_seen_addresses(self):
+        self.tracker.record(self.hosts, {"10.0.0.1"}, now=1000)
+        self.tracker.observe("10.0.0.2", 1020)
+        self.assertEqual(self.tracker.due(self.hosts, now=1025), [])
+        self.assertEqual(self.tracker.due(self.hosts, now=1040), ["10.0.0.1"])
+        self.assertEqual(self.tracker.last_skipped, 2)
+
+    def test_dead_addresses_back_off(self):
+        now = 1000
+        for expected in (60, 120, 240, 480, 600, 600):
+            self.tracker.record(["10.0.0.3"], set(), now=now)
+            delay = self.tracker.states["10.0.0.3"].next_probe - now
+            self.assertEqual(delay, expected)
+            now += delay
+
+    def test_arp_who_has_resets_backoff(self):
+        for now in (1000, 1060, 1180, 1420):
+            self.tracker.record(["10.0.0.3"], set(), now=now)
+        self.assertEqual(self.tracker.states["10.0.0.3"].next_probe, 1900)
+        self.tracker.wake("10.0.0.3", now=1500)
+        self.assertEqual(self.tracker.due(["10.0.0.3"], now=1500), ["10.0.0.3"])
+        self.tracker.record(["10.0.0.3"], set(), now=1500)
+        self.assertEqual(self.tracker.states["10.0.0.3"].next_probe, 1560)
+        self.tracker.wake("10.0.0.9", now=1500) # Never probed: already due
+        self.assertEqual(self.tracker.stats()["wakes"], 1)
+
+    def test_flapping_addresses_probe_faster(self):
+        self.tracker.record(["10.0.0.1"], {"10.0.0.1"}, now=1000)
+        self.tracker.record(["10.0.0.1"], set(), now=1030)
+        self.tracker.record(["10.0.0.1"], {"10.0.0.1"}, now=1090)
+        self.assertEqual(self.tracker.states["10.0.0.1"].next_probe, 1100)
+
+if __name__ == '__main__':
+    unittest.main()
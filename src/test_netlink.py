@@ -0,0 +1,129 @@
+import asyncio
+import errno
+import os
+import socket
+import struct
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Mock scapy before import
+sys.modules["scapy"] = MagicMock()
+sys.modules["scapy.all"] = MagicMock()
+sys.modules["scapy.layers.dns"] = MagicMock()
+
+from src.device_store import DeviceStore
+from src.engine import netlink
+from src.engine.manager import EngineCoordinator, EngineGroup
+from src.engine.netlink import NDMSG, NLMSGHDR, RTATTR, RTM_NEWNEIGH, Neighbor, NetworkState, NetworkTracker, iter_messages, parse_neighbor, read_proc_arp
+from src.engine.scanner import NetworkScanner
+
+def attr(rta_type, payload):
+    length = RTATTR.size + len(payload)
+    return RTATTR.pack(length, rta_type) + payload + b"\x00" * (-length % 4)
+
+def newneigh(family, ip, mac, state, ifindex=2):
+    body = NDMSG.pack(family, ifindex, state, 0, 1) + attr(netlink.NDA_DST, socket.inet_pton(family, ip))
+    if mac:
+        body += attr(netlink.NDA_LLADDR, bytes.fromhex(mac.replace(":", "")))
+    return NLMSGHDR.pack(NLMSGHDR.size + len(body), RTM_NEWNEIGH, 2, 1, 0) + body
+
+class TestNetlinkNeighbors(unittest.TestCase):
+    def test_parses_dump_messages(self):
+        buf = (newneigh(socket.AF_INET, "192.168.1.20", "aa:bb:cc:00:00:20", netlink.NUD_REACHABLE)
+               + newneigh(socket.AF_INET6, "fe80::1", "aa:bb:cc:00:00:20", netlink.NUD_STALE)
+               + newneigh(socket.AF_INET, "192.168.1.21", None, netlink.NUD_INCOMPLETE)
+               + newneigh(socket.AF_INET, "192.168.1.22", "aa:bb:cc:00:00:22", netlink.NUD_FAILED))
+        parsed = [parse_neighbor(body) for msg_type, _, body in iter_messages(buf)]
+        self.assertEqual(parsed, [
+            Neighbor("192.168.1.20", "aa:bb:cc:00:00:20", 2, netlink.NUD_REACHABLE),
+            Neighbor("fe80::1", "aa:bb:cc:00:00:20", 2, netlink.NUD_STALE),
+            None,
+            None,
+        ])
+        self.assertFalse(parsed[1].confirmed)
+
+    def test_proc_fallback_skips_incomplete(self):
+        with tempfile.NamedTemporaryFile("w", suffix="arp", delete=False) as f:
+            f.write("IP address       HW type     Flags       HW address            Mask     Device\n"
+                    "192.168.1.30     0x1         0x2         AA:BB:CC:00:00:30     *        lo\n"
+                    "192.168.1.31     0x1         0x0         00:00:00:00:00:00     *        lo\n")
+        try:
+            self.assertEqual([(n.ip, n.mac) for n in read_proc_arp(f.name)], [("192.168.1.30", "aa:bb:cc:00:00:30")])
+        finally:
+            os.unlink(f.name)
+
+    def test_scanner_seeds_store_and_ipv6_targets(self):
+        store = DeviceStore()
+        ipv6_targets = {}
+        scanner = NetworkScanner(store, interface="eth0", ipv6_targets=ipv6_targets)
+        neighbors = [
+            Neighbor("2001:db8::20", "aa:bb:cc:00:00:20", 2, netlink.NUD_REACHABLE),
+            Neighbor("192.168.1.20", "aa:bb:cc:00:00:20", 2, netlink.NUD_REACHABLE),
+            Neighbor("192.168.1.21", "aa:bb:cc:00:00:21", 2, netlink.NUD_STALE),
+            Neighbor("192.168.1.22", "aa:bb:cc:00:00:22", 2, netlink.NUD_PROBE),
+            Neighbor("192.168.1.23", "aa:bb:cc:00:00:23", 2, netlink.NUD_PERMANENT),
+        ]
+        with patch.object(netlink, "read_neighbors", return_value=("netlink", neighbors)):
+            self.assertEqual(scanner.import_neighbors(), 4)
+            for n in (21, 22, 23):
+                store.get(f"aa:bb:cc:00:00:{n}").last_seen = 0
+            scanner.import_neighbors() # Unconfirmed entries don't count as a sighting
+        self.assertEqual(store.get_by_ip("192.168.1.20").mac, "aa:bb:cc:00:00:20")
+        self.assertEqual([store.get(f"aa:bb:cc:00:00:{n}").last_seen for n in (21, 22, 23)], [0, 0, 0])
+        self.assertEqual(ipv6_targets, {"aa:bb:cc:00:00:20": "2001:db8::20"})
+        self.assertEqual(scanner.neighbor_import["source"], "netlink")
+
+    def test_attached_scanner_imports_neighbors_off_the_loop(self):
+        scanner = NetworkScanner(DeviceStore(), interface="eth0")
+        offloaded = []
+        async def offload(fn, *args):
+            offloaded.append(fn)
+            return fn(*args) if fn == scanner.import_neighbors else None
+        scanner.runtime = MagicMock(offload=offload)
+        with patch.object(netlink, "read_neighbors", return_value=("netlink", [])) as read, \
+                patch.object(scanner, "_local_network", return_value=(None, "192.168.1.0/30", None)):
+            asyncio.run(scanner.scan_async())
+        read.assert_called_once() # By the worker, not again by _plan() on the loop
+        self.assertEqual(offloaded[0], scanner.import_neighbors)
+
+class TestNetworkTracking(unittest.TestCase):
+    def state(self, addr, gateway, up=True):
+        return NetworkState({2: {"name": "eth0", "mac": "aa:bb:cc:00:00:01", "up": up}}, {"eth0": [(addr, 24)]}, (gateway, "eth0"))
+
+    def test_change_reconfigures_only_what_moved(self):
+        coordinator = EngineCoordinator(DeviceStore())
+        coordinator.interface, coordinator.gateway_ip = "eth0", "192.168.1.1"
+        group = EngineGroup("", "eth0", "192.168.1.1")
+        group.monitor, group.scanner = MagicMock(), MagicMock()
+        coordinator.groups = [group]
+        old = self.state("192.168.1.5", "192.168.1.1")
+
+        renewed = self.state("192.168.1.5", "192.168.1.1")
+        self.assertEqual(old.diff(renewed), set())
+
+        new = self.state("192.168.1.5", "192.168.1.254")
+        coordinator._on_network_change(old, new, old.diff(new))
+        self.assertEqual(coordinator.monitor.gateway_ip, "192.168.1.254")
+        coordinator.scanner.request_scan.assert_not_called()
+
+        moved = self.state("10.0.0.5", "192.168.1.254")
+        coordinator._on_network_change(new, moved, new.diff(moved))
+        self.assertEqual(coordinator.monitor.host_ip, "10.0.0.5")
+        coordinator.scanner.request_scan.assert_called_once()
+
+    def test_buffer_overrun_schedules_a_refresh(self):
+        tracker = NetworkTracker()
+        if tracker._sock:
+            tracker._sock.close()
+        tracker._sock = MagicMock()
+        tracker._sock.recv.side_effect = [OSError(errno.ENOBUFS, "No buffer space available"), BlockingIOError()]
+        tracker._runtime = MagicMock()
+        tracker._on_readable()
+        tracker._runtime.remove_reader.assert_not_called() # Still listening
+        tracker._runtime.loop.call_later.assert_called_once_with(tracker.debounce, tracker._debounced_refresh)
+        self.assertEqual(tracker.overruns, 1)
+
+if __name__ == '__main__':
+    unittest.main()
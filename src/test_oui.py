@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from src.convert_oui import convert_oui
+from src.engine.oui import OuiIndex, build_index, get_vendor, load_index
+
+class TestOuiIndex(unittest.TestCase):
+    def test_longest_prefix_wins(self):
+        index = OuiIndex(build_index([
+            ("001BC5", "Large Block"),
+            ("001BC50", "Medium Block"),
+            ("001BC5012", "Small Block"),
+            ("286FB9", "Nokia"),
+        ]))
+        self.assertEqual(index.lookup("00:1b:c5:01:23:45"), "Small Block")
+        self.assertEqual(index.lookup("00:1b:c5:0f:00:00"), "Medium Block")
+        self.assertEqual(index.lookup("00:1b:c5:ff:00:00"), "Large Block")
+        self.assertEqual(index.lookup("28-6F-B9-00-00-01"), "Nokia")
+        self.assertIsNone(index.lookup("00:00:01:00:00:00"))
+
+    def test_newer_text_file_rebuilds_the_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            index_path, vendors_path = os.path.join(tmpdir, "mac-vendors.idx"), os.path.join(tmpdir, "mac-vendors.txt")
+            with open(vendors_path, "w") as f:
+                f.write("286FB9:Nokia\n")
+            self.assertEqual(load_index(index_path, vendors_path).lookup("28:6f:b9:00:00:01"), "Nokia")
+            self.assertTrue(os.path.exists(index_path))
+
+            with open(vendors_path, "w") as f:
+                f.write("286FB9:Nokia Solutions\n")
+            os.utime(index_path, (1, 1)) # Compiled long before the edit
+            self.assertEqual(load_index(index_path, vendors_path).lookup("28:6f:b9:00:00:01"), "Nokia Solutions")
+
+    def test_conversion_keeps_block_sizes_without_a_registry_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            vendors_path = os.path.join(tmpdir, "mac-vendors.txt")
+            with open(vendors_path, "w") as f:
+                f.write("286FB9:Old Nokia\n001BC50:Medium Block\n001BC5012:Small Block\n")
+            with open(os.path.join(tmpdir, "oui.csv"), "w") as f:
+                f.write("Registry,Assignment,Organization Name,Organization Address\nMA-L,286FB9,Nokia,Espoo\n")
+            convert_oui(tmpdir, vendors_path)
+            with open(vendors_path) as f:
+                self.assertEqual(sorted(f.read().splitlines()), ["001BC5012:Small Block", "001BC50:Medium Block", "286FB9:Nokia"])
+
+    def test_get_vendor_flags_private_macs(self):
+        self.assertEqual(get_vendor("02:11:22:33:44:55"), "Private/Random")
+
+if __name__ == '__main__':
+    unittest.main()
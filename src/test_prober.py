@@ -0,0 +1,65 @@
+import asyncio
+import socket
+import unittest
+
+from src.device_store import DeviceCategory, DeviceStore
+from src.engine.classifier import DeviceClassifier
+from src.engine.prober import PortProber, ProbeResult
+
+class TestPortProber(unittest.TestCase):
+    def test_probe_finds_open_port_and_banner(self):
+        async def scenario():
+            async def handle(reader, writer):
+                writer.write(b"SSH-2.0-dropbear_2022.83\r\n")
+                await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            open_port = server.sockets[0].getsockname()[1]
+            closed = socket.socket()
+            closed.bind(("127.0.0.1", 0))
+            closed_port = closed.getsockname()[1]
+            closed.close()
+
+            store = DeviceStore()
+            store.add_or_update("127.0.0.1", "00:00:00:00:00:01")
+            prober = PortProber(store, ports=[open_port, closed_port])
+            prober.BANNER_PORTS = {open_port: None}
+            async with server:
+                await prober.probe_device("00:00:00:00:00:01")
+            prober.stop()
+            return store, prober, open_port
+
+        store, prober, open_port = asyncio.run(scenario())
+        self.assertEqual(store.get("00:00:00:00:00:01").open_ports, [open_port])
+        result = prober.cache["00:00:00:00:00:01"]
+        self.assertEqual(result.banners, {open_port: "SSH-2.0-dropbear_2022.83"})
+
+    def test_skips_own_addresses_and_forgets_removed_devices(self):
+        store = DeviceStore()
+        store.add_or_update("10.0.0.1", "00:00:00:00:00:01", "Router")
+        store.add_or_update("10.0.0.2", "00:00:00:00:00:02")
+        prober = PortProber(store, excluded=lambda: ["10.0.0.1", None])
+
+        async def scenario():
+            prober._queue = asyncio.PriorityQueue()
+            prober._enqueue_due()
+            queued = [prober._queue.get_nowait()[2] for _ in range(prober._queue.qsize())]
+            prober.cache["00:00:00:00:00:02"] = ProbeResult("10.0.0.2", [22], {}, 0)
+            follower = asyncio.create_task(prober._follow_events())
+            store.remove_devices(["00:00:00:00:00:02"])
+            await asyncio.sleep(0.05)
+            prober.stop()
+            follower.cancel()
+            return queued
+
+        self.assertEqual(asyncio.run(scenario()), ["00:00:00:00:00:02"])
+        self.assertEqual(prober.cache, {})
+
+    def test_open_ports_feed_classifier(self):
+        store = DeviceStore()
+        dev = store.add_or_update("10.0.0.7", "00:00:00:00:00:07", "Unknown")
+        store.set_open_ports(dev.mac, [80, 9100])
+        self.assertEqual(DeviceClassifier().classify(dev), (DeviceCategory.PRINTER, 95))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from src.device_store import DeviceStore
+from src.engine.restore import restore_budget, restore_targets
+from src.engine.sweep import parse_arp
+
+class TestArpRestore(unittest.TestCase):
+    def setUp(self):
+        self.store = DeviceStore()
+        self.store.add_or_update("192.168.1.1", "aa:bb:cc:00:00:01", "Router")
+        for n in range(2, 5):
+            self.store.add_or_update(f"192.168.1.{n}", f"aa:bb:cc:00:00:0{n}", "Phone")
+
+    def test_frames_are_correct_and_interleaved(self):
+        sent = []
+        targets = ["192.168.1.2", "192.168.1.3", "192.168.1.4", "192.168.1.9", "192.168.1.1", "192.168.1.5"]
+        progress = restore_targets(self.store, "", "eth0", "192.168.1.1", targets, host_ip="192.168.1.5",
+                                   host_mac="aa:bb:cc:00:00:99", budget=0.2, rounds=3, send=sent.append)
+        result = progress.to_dict()
+        self.assertTrue(result["complete"])
+        # The gateway and our own address are never targets; .9 has no known MAC
+        self.assertEqual((result["targets"], result["restored"], result["sent"], result["rounds"]), (4, 3, 18, 3))
+
+        first_round = [parse_arp(frame) for frame in sent[:6]]
+        self.assertEqual(first_round[0], (2, "192.168.1.1", "aa:bb:cc:00:00:01")) # Target learns the real gateway
+        self.assertEqual(first_round[1], (2, "192.168.1.2", "aa:bb:cc:00:00:02")) # Gateway learns the real target
+        self.assertEqual({arp[1] for arp in first_round[1::2]}, {"192.168.1.2", "192.168.1.3", "192.168.1.4"})
+        self.assertEqual(sent[0][:12], bytes.fromhex("aabbcc000002" "aabbcc000099"))
+
+    def test_budget_bounds_large_restores(self):
+        for n in range(10, 250):
+            self.store.add_or_update(f"192.168.1.{n}", f"aa:bb:cc:00:01:{n % 256:02x}", "Phone")
+        sent, refused = [], set()
+        def congested_send(frame):
+            if frame not in refused: # Every frame first meets a full transmit queue
+                refused.add(frame)
+                raise BlockingIOError()
+            time.sleep(0.0005)
+            sent.append(frame)
+        started = time.monotonic()
+        targets = [f"192.168.1.{n}" for n in range(10, 250)]
+        progress = restore_targets(self.store, "", "eth0", "192.168.1.1", targets, host_mac="aa:bb:cc:00:00:99",
+                                   budget=0.2, rounds=5, send=congested_send)
+        self.assertLess(time.monotonic() - started, restore_budget(0.2, 240) + 0.2)
+        self.assertEqual((progress.unsent, progress.unrestored), (0, []))
+        self.assertGreaterEqual(progress.requeued, progress.frames)
+        self.assertLess(progress.sent, progress.frames * 5) # Repeats were cut
+        reached = {frame[:6] for frame in sent}
+        for n in range(10, 250):
+            self.assertIn(bytes.fromhex(f"aabbcc0001{n % 256:02x}"), reached) # Every target got its frame
+
+    def test_blocked_targets_are_reported_within_the_budget(self):
+        def send(frame):
+            if frame[:6] == bytes.fromhex("aabbcc000003"):
+                raise BlockingIOError() # This target's frames never get out
+        started = time.monotonic()
+        progress = restore_targets(self.store, "", "eth0", "192.168.1.1", ["192.168.1.2", "192.168.1.3", "192.168.1.9"],
+                                   host_mac="aa:bb:cc:00:00:99", budget=0.05, rounds=2, send=send)
+        self.assertLess(time.monotonic() - started, 0.2)
+        result = progress.to_dict()
+        self.assertEqual((result["unsent"], sorted(result["unrestored"])), (1, ["192.168.1.3", "192.168.1.9"]))
+        self.assertFalse(result["complete"])
+
+    def test_unsent_frames_mark_the_restore_incomplete(self):
+        def refusing_send(frame):
+            if frame[:6] == bytes.fromhex("aabbcc000003"):
+                raise OSError("No buffer space available")
+        progress = restore_targets(self.store, "", "eth0", "192.168.1.1", ["192.168.1.2", "192.168.1.3"],
+                                   host_mac="aa:bb:cc:00:00:99", budget=0.05, rounds=2, send=refusing_send)
+        result = progress.to_dict()
+        self.assertEqual((result["unsent"], result["failed"], result["sent"]), (1, 2, 6))
+        self.assertFalse(result["complete"])
+
+    def test_unknown_gateway_is_reported(self):
+        with patch("src.engine.restore._kernel_mac", return_value=None):
+            progress = restore_targets(self.store, "", "eth0", "192.168.1.254", ["192.168.1.2"], send=lambda f: None)
+        self.assertFalse(progress.to_dict()["complete"])
+        self.assertIn("192.168.1.254", progress.error)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import time
+import unittest
+
+from src.device_store import Device
+from src.retention import RetentionPolicy
+
+class TestRetentionPolicy(unittest.TestCase):
+    def setUp(self):
+        self.now = time.time()
+        self.day = 86400
+
+    def _dev(self, mac, days_ago, **kwargs):
+        return Device(ip="", mac=mac, last_seen=self.now - days_ago * self.day, **kwargs)
+
+    def test_evicts_old_anonymous_devices_only(self):
+        policy = RetentionPolicy(retention_days=30)
+        devices = [
+            self._dev("aa:00:00:00:00:01", 45),
+            self._dev("aa:00:00:00:00:02", 45, hostname="kitchen-tv"),
+            self._dev("aa:00:00:00:00:03", 45, is_blocked=True),
+            self._dev("aa:00:00:00:00:04", 2),
+        ]
+        self.assertEqual(policy.select_evictions(devices, self.now), ["aa:00:00:00:00:01"])
+
+    def test_cap_evicts_least_recently_seen(self):
+        policy = RetentionPolicy(retention_days=365, max_devices=2)
+        devices = [
+            self._dev("aa:00:00:00:00:01", 3),
+            self._dev("aa:00:00:00:00:02", 1),
+            self._dev("aa:00:00:00:00:03", 5, schedule_start="22:00", schedule_end="06:00"),
+            self._dev("aa:00:00:00:00:04", 4),
+        ]
+        evicted = policy.select_evictions(devices, self.now)
+        self.assertEqual(sorted(evicted), ["aa:00:00:00:00:01", "aa:00:00:00:00:04"])
+
+if __name__ == '__main__':
+    unittest.main()
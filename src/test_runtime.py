@@ -0,0 +1,104 @@
+import asyncio
+import socket
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+# Mock scapy before import
+sys.modules["scapy"] = MagicMock()
+sys.modules["scapy.all"] = MagicMock()
+sys.modules["scapy.layers.dns"] = MagicMock()
+
+from src.device_store import DeviceStore
+from src.engine.monitor import BandwidthMonitor
+from src.engine.netlink import NLMSGHDR, RTM_NEWADDR, NetworkTracker
+from src.engine.runtime import EngineRuntime
+from src.engine.sweep import parse_arp
+
+class Wire:
+    def __init__(self):
+        self.frames = []
+
+    def send(self, frame):
+        self.frames.append(frame)
+
+class TestEngineRuntime(unittest.TestCase):
+    def setUp(self):
+        self.runtime = EngineRuntime()
+        self.runtime.start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_tasks_readers_and_offload_share_one_loop(self):
+        seen = []
+        done = threading.Event()
+        a, b = socket.socketpair()
+        self.runtime.add_reader(a, lambda: seen.append(("read", a.recv(16), threading.current_thread().name)))
+
+        async def worker():
+            result = await self.runtime.offload(sum, [1, 2, 3])
+            seen.append(("offload", result, threading.current_thread().name))
+            done.set()
+            await asyncio.sleep(3600)
+        self.runtime.spawn("worker", worker)
+        b.send(b"ping")
+        self.assertTrue(done.wait(2))
+        time.sleep(0.1)
+        self.assertIn(("offload", 6, "engine-runtime"), seen)
+        self.assertIn(("read", b"ping", "engine-runtime"), seen)
+        self.assertEqual(self.runtime.stats()["tasks"], ["heartbeat", "worker"])
+
+        started = time.monotonic()
+        self.runtime.stop(timeout=2.0)
+        self.assertLess(time.monotonic() - started, 1.0) # Sleeping tasks are cancelled, not waited out
+        self.assertFalse(self.runtime.is_alive())
+        self.assertEqual(a.fileno(), -1) # Reader sockets are closed on stop
+        b.close()
+
+    def test_network_tracker_debounces_a_burst(self):
+        tracker = NetworkTracker(debounce=0.2)
+        if tracker._sock:
+            tracker._sock.close()
+        tracker._sock, peer = socket.socketpair()
+        tracker.refresh = MagicMock(side_effect=lambda: refreshed_on.append(threading.current_thread().name))
+        refreshed_on = []
+        tracker.attach(self.runtime)
+        message = NLMSGHDR.pack(NLMSGHDR.size, RTM_NEWADDR, 0, 0, 0)
+        for _ in range(5):
+            peer.send(message)
+            time.sleep(0.02)
+        time.sleep(0.4)
+        tracker.refresh.assert_called_once() # One re-dump for the whole burst
+        self.assertNotEqual(refreshed_on, ["engine-runtime"]) # Blocking dumps stay off the loop
+        self.assertEqual(tracker.events_seen, 5)
+        peer.close()
+
+class TestAttachedMonitor(unittest.TestCase):
+    def test_arp_goes_out_as_raw_frames(self):
+        store = DeviceStore()
+        store.add_or_update("192.168.1.1", "aa:bb:cc:00:00:01", "Router")
+        store.add_or_update("192.168.1.20", "aa:bb:cc:00:00:20", "Phone")
+        monitor = BandwidthMonitor(store, gateway_ip="192.168.1.1", interface="eth0")
+        monitor.host_mac, monitor.host_ip = "aa:bb:cc:00:00:99", "192.168.1.5"
+        monitor._inject = Wire()
+
+        monitor._spoof_with_mac("192.168.1.20", "aa:bb:cc:00:00:20", "192.168.1.1")
+        frames = monitor._inject.frames
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(parse_arp(frames[0]), (2, "192.168.1.1", "aa:bb:cc:00:00:99"))
+        self.assertEqual(frames[0][:6], bytes.fromhex("aabbcc000020")) # Unicast to the target
+        self.assertEqual(parse_arp(frames[1]), (2, "192.168.1.20", "aa:bb:cc:00:00:99"))
+
+        # Unknown targets are resolved with a non-blocking who-has, at most every 5s
+        frames.clear()
+        self.assertEqual(monitor._get_macs("192.168.1.30"), [])
+        self.assertEqual(monitor._get_macs("192.168.1.30"), [])
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(parse_arp(frames[0]), (1, "192.168.1.5", "aa:bb:cc:00:00:99"))
+        self.assertEqual(frames[0][:6], b"\xff" * 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from src.startup import StartupProfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestStartupProfile(unittest.TestCase):
+    def test_concurrent_phases_are_timed_separately(self):
+        profile = StartupProfile()
+        gate = threading.Event()
+        slow = profile.run("slow", lambda: gate.wait(1))
+        with profile.phase("fast"):
+            time.sleep(0.05)
+        self.assertFalse(profile.done("slow"))
+        gate.set()
+        slow.join()
+
+        def broken():
+            raise ImportError("No module named 'scapy'")
+        profile.run("broken", broken).join()
+
+        stats = profile.stats()
+        self.assertTrue(profile.done("slow") and profile.done("fast"))
+        self.assertFalse(profile.done("broken"))
+        self.assertEqual(stats["phases"]["broken"]["error"], "No module named 'scapy'")
+        self.assertGreaterEqual(stats["phases"]["slow"]["seconds"], 0.05) # Overlapped "fast"
+        self.assertGreaterEqual(stats["elapsed"], stats["phases"]["slow"]["seconds"])
+
+    def test_engine_modules_import_without_scapy(self):
+        # The coordinator is imported by the server at startup; Scapy must only load in the background
+        code = "import sys, src.engine.manager, src.device_store; print('scapy' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=30)
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
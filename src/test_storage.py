@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.device_store import DeviceStore
+
+class TestIncrementalStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "devices.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_flush_journals_only_dirty_devices(self):
+        store = DeviceStore()
+        store.save_to_file(self.path)
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10", "Vendor A")
+        store.add_or_update("192.168.1.11", "00:00:00:00:00:11", "Vendor B")
+        store.flush()
+        self.assertEqual(store.storage.journal_records, 2)
+
+        store.devices["00:00:00:00:00:10"].hostname = "laptop"
+        store.mark_dirty("00:00:00:00:00:10")
+        store.flush()
+        self.assertEqual(store.storage.journal_records, 3)
+
+        # Nothing dirty -> nothing written
+        store.flush()
+        self.assertEqual(store.storage.journal_records, 3)
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        self.assertEqual(len(restored.devices), 2)
+        self.assertEqual(restored.devices["00:00:00:00:00:10"].hostname, "laptop")
+
+    def test_torn_journal_tail_is_ignored(self):
+        store = DeviceStore()
+        store.save_to_file(self.path)
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        store.flush()
+        with open(self.path + ".journal", "a") as f:
+            f.write('{"mac": "00:00:00:00:00:11", "dev')
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        self.assertEqual(list(restored.devices), ["00:00:00:00:00:10"])
+
+    def test_appends_after_a_torn_tail_survive(self):
+        store = DeviceStore()
+        store.save_to_file(self.path)
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        store.flush()
+        with open(self.path + ".journal", "a") as f:
+            f.write('{"mac": "00:00:00:00:00:11", "dev') # Crash mid-write
+
+        restarted = DeviceStore()
+        restarted.load_from_file(self.path)
+        restarted.add_or_update("192.168.1.12", "00:00:00:00:00:12")
+        restarted.flush()
+
+        again = DeviceStore()
+        again.load_from_file(self.path)
+        self.assertEqual(sorted(again.devices), ["00:00:00:00:00:10", "00:00:00:00:00:12"])
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        store = DeviceStore()
+        store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        store.save_to_file(self.path)
+        store.devices["00:00:00:00:00:10"].is_blocked = True
+        store.mark_dirty("00:00:00:00:00:10")
+        store.flush()
+
+        store.save_to_file(self.path)
+        self.assertEqual(os.path.getsize(self.path + ".journal"), 0)
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        self.assertTrue(restored.devices["00:00:00:00:00:10"].is_blocked)
+
+    def test_binary_snapshot_defers_cold_fields(self):
+        store = DeviceStore()
+        dev = store.add_or_update("192.168.1.10", "00:00:00:00:00:10", "Vendor A")
+        dev.domains.extend(["example.com", "example.org"])
+        dev.total_up = 1234
+        store.save_to_file(self.path)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "devices.snap")))
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        loaded = restored.devices["00:00:00:00:00:10"]
+        self.assertIn("_cold", loaded.__dict__)
+        self.assertEqual(loaded.total_up, 1234)
+        self.assertEqual(loaded.domains, ["example.com", "example.org"])
+        self.assertNotIn("_cold", loaded.__dict__)
+
+    def test_assigning_a_cold_field_survives_the_next_snapshot(self):
+        store = DeviceStore()
+        dev = store.add_or_update("192.168.1.10", "00:00:00:00:00:10", "Vendor A")
+        dev.open_ports.append(22)
+        store.save_to_file(self.path)
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        restored.devices["00:00:00:00:00:10"].domains = ["example.com"] # Before anything decoded the blob
+        restored.save_to_file(self.path)
+
+        again = DeviceStore()
+        again.load_from_file(self.path)
+        loaded = again.devices["00:00:00:00:00:10"]
+        self.assertEqual((loaded.domains, loaded.open_ports), (["example.com"], [22]))
+
+    def test_long_multibyte_strings_are_clipped_on_a_character(self):
+        store = DeviceStore()
+        dev = store.add_or_update("192.168.1.10", "00:00:00:00:00:10")
+        dev.hostname = "a" + "é" * 40000 # 80001 bytes: the byte limit falls mid-character
+        store.save_to_file(self.path)
+
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        hostname = restored.devices["00:00:00:00:00:10"].hostname
+        self.assertEqual(hostname, "a" + "é" * 32767)
+
+    def test_legacy_json_is_migrated(self):
+        legacy = {"00:00:00:00:00:10": {"ip": "", "mac": "00:00:00:00:00:10", "hostname": "tv", "domains": ["a.com"]}}
+        with open(self.path, "w") as f:
+            json.dump(legacy, f)
+
+        store = DeviceStore()
+        store.load_from_file(self.path)
+        self.assertTrue(store.loaded.is_set())
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, "devices.snap")))
+
+        os.remove(self.path)
+        restored = DeviceStore()
+        restored.load_from_file(self.path)
+        self.assertEqual(restored.devices["00:00:00:00:00:10"].hostname, "tv")
+        self.assertEqual(restored.devices["00:00:00:00:00:10"].domains, ["a.com"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import socket
+import unittest
+
+from src.engine.sweep import ARP_FRAME_LEN, TPA_OFFSET, SweepProgress, build_arp_template, parse_arp_reply, parse_arp_target, subnet_hosts
+
+class TestArpSweep(unittest.TestCase):
+    def test_template_is_broadcast_who_has(self):
+        frame = build_arp_template("aa:bb:cc:dd:ee:ff", "192.168.1.2")
+        self.assertEqual(len(frame), ARP_FRAME_LEN)
+        self.assertEqual(frame[:6], b"\xff" * 6)
+        self.assertEqual(frame[20:22], b"\x00\x01")
+        frame[TPA_OFFSET:TPA_OFFSET + 4] = socket.inet_aton("192.168.1.77")
+        self.assertEqual(socket.inet_ntoa(frame[38:42]), "192.168.1.77")
+        self.assertIsNone(parse_arp_reply(bytes(frame))) # Requests aren't replies
+        self.assertEqual(parse_arp_target(bytes(frame)), "192.168.1.77")
+
+    def test_parses_reply(self):
+        frame = build_arp_template("11:22:33:44:55:66", "192.168.1.77")
+        frame[20:22] = b"\x00\x02"
+        self.assertEqual(parse_arp_reply(bytes(frame)), ("192.168.1.77", "11:22:33:44:55:66"))
+        self.assertIsNone(parse_arp_target(bytes(frame)))
+
+    def test_progress_and_hosts(self):
+        self.assertEqual(len(subnet_hosts("10.0.0.0/22")), 1022)
+        progress = SweepProgress(4)
+        progress.sent, progress.replies = 4, 1
+        stats = progress.to_dict()
+        self.assertEqual(stats["progress"], 1.0)
+        self.assertEqual(stats["response_rate"], 0.25)
+        self.assertTrue(stats["running"])
+
+if __name__ == '__main__':
+    unittest.main()
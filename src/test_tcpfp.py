@@ -0,0 +1,32 @@
+import unittest
+
+from src.device_store import Device, DeviceCategory
+from src.engine.classifier import DeviceClassifier
+from src.engine.tcpfp import TcpFingerprintDB, initial_ttl, syn_signature
+
+WINDOWS_OPTIONS = [("MSS", 1460), ("NOP", None), ("WScale", 8), ("NOP", None), ("NOP", None), ("SAckOK", b"")]
+LINUX_OPTIONS = [("MSS", 1460), ("SAckOK", b""), ("Timestamp", (1, 0)), ("NOP", None), ("WScale", 7)]
+
+class TestTcpFingerprint(unittest.TestCase):
+    def test_signature_normalizes_ttl(self):
+        self.assertEqual(initial_ttl(57), 64)
+        self.assertEqual(initial_ttl(116), 128)
+        self.assertEqual(syn_signature(61, 14600, LINUX_OPTIONS), "64:14600:1460:7:mss,sok,ts,nop,ws")
+
+    def test_lookup_exact_then_relaxed(self):
+        db = TcpFingerprintDB()
+        self.assertEqual(db.lookup(syn_signature(128, 64240, WINDOWS_OPTIONS)), "Windows 10/11")
+        self.assertEqual(db.lookup(syn_signature(120, 12345, WINDOWS_OPTIONS)), "Windows")
+        self.assertEqual(db.lookup(syn_signature(64, 13480, [("MSS", 1348)] + LINUX_OPTIONS[1:])), "Linux")
+        self.assertIsNone(db.lookup(syn_signature(64, 1024, [("NOP", None)])))
+
+    def test_os_guess_feeds_classifier(self):
+        dev = Device(ip="10.0.0.9", mac="02:00:00:00:00:09", vendor="Private/Random")
+        classifier = DeviceClassifier()
+        self.assertEqual(classifier.classify(dev), (DeviceCategory.MOBILE, 60))
+        self.assertEqual(classifier.classify(dev, tcp_signature={"os": "Windows 10/11"}), (DeviceCategory.PC, 85))
+        dev.os_guess = "macOS/iOS" # Ambiguous, keeps the vendor guess
+        self.assertEqual(classifier.classify(dev), (DeviceCategory.MOBILE, 60))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+
+from src.device_store import DeviceCategory, DeviceStore
+from src.engine.classifier import DeviceClassifier
+from src.engine.upnp import DescriptionFetcher, HttpPool, UpnpError, parse_description
+
+DESCRIPTION = b"""<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:ZonePlayer:1</deviceType>
+    <friendlyName>Kitchen</friendlyName>
+    <manufacturer>Sonos, Inc.</manufacturer>
+    <modelName>Sonos One</modelName>
+    <deviceList><device><friendlyName>Kitchen Media Renderer</friendlyName></device></deviceList>
+  </device>
+</root>"""
+
+class TestUpnp(unittest.TestCase):
+    def test_parse_description_reads_root_device(self):
+        info = parse_description(DESCRIPTION)
+        self.assertEqual(info["friendlyName"], "Kitchen")
+        self.assertEqual(info["manufacturer"], "Sonos, Inc.")
+        self.assertEqual(info["deviceType"], "urn:schemas-upnp-org:device:ZonePlayer:1")
+        with self.assertRaises(UpnpError):
+            parse_description(b'<!DOCTYPE r [<!ENTITY a "aaaa">]><root><device/></root>')
+
+    def test_fetcher_pools_connections_and_caches_by_usn(self):
+        async def scenario():
+            requests = []
+            async def handle(reader, writer):
+                while True: # Keep-alive: serve until the client hangs up
+                    try:
+                        head = await reader.readuntil(b"\r\n\r\n")
+                    except asyncio.IncompleteReadError:
+                        break
+                    requests.append(head.split(b" ")[1])
+                    if head.startswith(b"GET /big"):
+                        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 999999\r\n\r\n")
+                    else:
+                        # Chunked, as many embedded UPnP servers reply
+                        writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+                        for i in range(0, len(DESCRIPTION), 100):
+                            chunk = DESCRIPTION[i:i + 100]
+                            writer.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+                        writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            store = DeviceStore()
+            store.add_or_update("127.0.0.1", "00:00:00:00:00:31")
+            fetcher = DescriptionFetcher(store, pool=HttpPool(max_bytes=4096))
+            headers = {"LOCATION": f"http://127.0.0.1:{port}/desc.xml", "USN": "uuid:RINCON_1::urn:schemas-upnp-org:device:ZonePlayer:1"}
+            async with server:
+                for _ in range(3): # Repeated NOTIFYs while the first fetch is in flight
+                    fetcher.submit("127.0.0.1", headers)
+                while fetcher._inflight:
+                    await asyncio.sleep(0.01)
+                fetcher.submit("127.0.0.1", headers) # Cached now
+                # A reboot (new BOOTID) refetches, over the pooled connection
+                fetcher.submit("127.0.0.1", dict(headers, **{"BOOTID.UPNP.ORG": "2"}))
+                fetcher.submit("127.0.0.1", {"LOCATION": f"http://127.0.0.1:{port}/big", "USN": "uuid:other"})
+                fetcher.submit("127.0.0.1", {"LOCATION": "http://10.9.9.9/desc.xml", "USN": "uuid:elsewhere"})
+                while fetcher._inflight:
+                    await asyncio.sleep(0.01)
+                fetcher.close()
+            return store, fetcher, requests
+
+        store, fetcher, requests = asyncio.run(scenario())
+        self.assertEqual(sorted(requests), [b"/big", b"/desc.xml", b"/desc.xml"])
+        stats = fetcher.stats()
+        self.assertEqual((stats["fetches"], stats["failures"], stats["cache_hits"]), (3, 1, 1))
+        self.assertGreaterEqual(stats["connections_reused"], 1)
+
+        dev = store.get("00:00:00:00:00:31")
+        self.assertEqual(dev.hostname, "Kitchen")
+        self.assertEqual(dev.model, "Sonos, Inc. Sonos One")
+        self.assertEqual(DeviceClassifier().classify(dev), (DeviceCategory.MEDIA, 95))
+
+if __name__ == '__main__':
+    unittest.main()
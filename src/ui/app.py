@@ -7,6 +7,8 @@ from src.device_store import DeviceStore, Device
 from src.engine.scanner import NetworkScanner
 from src.engine.monitor import BandwidthMonitor
 from src.engine.discovery import DiscoveryListener
+from src.engine.classification import ClassificationWorker
+from src.retention import RetentionJob
 import threading
 import time
 
@@ -131,6 +133,8 @@ class NetworkApp(App):
             
         self.monitor = BandwidthMonitor(self.device_store, gateway_ip=gateway_ip) 
         self.discovery = DiscoveryListener(self.device_store)
+        self.classification = ClassificationWorker(self.device_store)
+        self.retention = RetentionJob(self.device_store)
         
         # Add Self
         import netifaces
@@ -141,13 +145,11 @@ class NetworkApp(App):
                 mac = addrs[netifaces.AF_LINK][0]['addr']
                 ip = addrs[netifaces.AF_INET][0]['addr']
                 myself = self.device_store.add_or_update(ip, mac, "Apple (Host)")
-                try:
-                    myself.category = self.device_store.devices[mac].category 
-                except:
-                    pass
                 from src.device_store import DeviceCategory
-                myself.category = DeviceCategory.PC
-                myself.hostname = "My Mac"
+                from src.engine.classification import MANUAL_CONFIDENCE
+                # Through the store, so the change is persisted and the worker leaves it alone
+                self.device_store.update_discovery_info(myself.key, hostname="My Mac")
+                self.device_store.set_classification(myself.key, DeviceCategory.PC, MANUAL_CONFIDENCE)
         except:
             pass
         
@@ -193,11 +195,16 @@ class NetworkApp(App):
         self.scanner.start()
         self.monitor.start() # Safe to start, won't spoof until enabled
         self.discovery.start()
+        self.classification.start()
+        self.retention.start()
         self.set_interval(1, self.update_ui)
-        self.set_interval(30, self.auto_save)
+        self.set_interval(5, self.auto_save)
 
-    def auto_save(self):
-        self.device_store.save_to_file("devices.json")
+    def auto_save(self, mac=None):
+        # Journal only what changed; the full snapshot is written on exit
+        if mac:
+            self.device_store.mark_dirty(mac)
+        self.device_store.flush()
         
     def action_toggle_block(self):
         table = self.query_one(DeviceTable)
@@ -208,10 +215,10 @@ class NetworkApp(App):
                  row_key = cell_key.row_key
                  
                  if row_key:
-                     mac = row_key.value # row_key is a RowKey object, value is the MAC string
-                     if mac in self.device_store.devices:
-                         dev = self.device_store.devices[mac]
-                         dev.is_blocked = not dev.is_blocked
+                     mac = row_key.value # row_key is a RowKey object, value is the device key
+                     current = self.device_store.get(mac)
+                     if current:
+                         dev = self.device_store.set_blocked(mac, not current.is_blocked)
                          
                          if dev.is_blocked:
                              status = "BLOCKED 🚫"
@@ -234,10 +241,10 @@ class NetworkApp(App):
              row_key = cell_key.row_key
              if row_key:
                  mac = row_key.value
-                 if mac in self.device_store.devices:
-                     dev = self.device_store.devices[mac]
+                 dev = self.device_store.get(mac)
+                 if dev:
                      # Pass save callback to persist schedule immediately
-                     self.push_screen(DeviceDetailScreen(dev, on_save_callback=self.auto_save))
+                     self.push_screen(DeviceDetailScreen(dev, on_save_callback=lambda: self.auto_save(mac)))
 
     def update_ui(self):
         table = self.query_one(DeviceTable)
@@ -258,7 +265,7 @@ class NetworkApp(App):
         total_down_rate = 0.0
 
         # Update Table
-        active_macs = {dev.mac for dev in devices}
+        active_macs = {dev.key for dev in devices}
         rows_to_remove = []
         for row_key in table.rows:
             if row_key.value not in active_macs:
@@ -266,6 +273,7 @@ class NetworkApp(App):
         
         for rk in rows_to_remove:
             table.remove_row(rk)
+            self.device_snapshots.pop(rk.value, None)
 
         existing_keys = {row_key.value for row_key in table.rows}
         
@@ -275,7 +283,7 @@ class NetworkApp(App):
                 self.monitor.enable_monitoring(dev.ip)
 
             # Calculate Rate
-            last_stats = self.device_snapshots.get(dev.mac, (0, 0))
+            last_stats = self.device_snapshots.get(dev.key, (0, 0))
             delta_up = dev.total_up - last_stats[0]
             delta_down = dev.total_down - last_stats[1]
             
@@ -296,7 +304,7 @@ class NetworkApp(App):
             if len(dev.history_down) > 60: dev.history_down.pop(0)
             
             # Update Snapshot
-            self.device_snapshots[dev.mac] = (dev.total_up, dev.total_down)
+            self.device_snapshots[dev.key] = (dev.total_up, dev.total_down)
             
             # Determine Category Display (Blocked status overrides)
             category_display = dev.category.value
@@ -325,20 +333,20 @@ class NetworkApp(App):
                 f"{down_kbs:.1f}"
             ]
             
-            if dev.mac in existing_keys:
+            if dev.key in existing_keys:
                 # Update row
                 cols = list(table.columns.keys())
                 
                 # Update specific cells
-                table.update_cell(dev.mac, cols[0], display_ip)
-                table.update_cell(dev.mac, cols[2], dev.vendor[:15])
-                table.update_cell(dev.mac, cols[3], category_display)
-                table.update_cell(dev.mac, cols[4], f"{dev.confidence}%")
-                table.update_cell(dev.mac, cols[5], dev.last_sni[:25])
-                table.update_cell(dev.mac, cols[6], f"{up_kbs:.1f}")
-                table.update_cell(dev.mac, cols[7], f"{down_kbs:.1f}")
+                table.update_cell(dev.key, cols[0], display_ip)
+                table.update_cell(dev.key, cols[2], dev.vendor[:15])
+                table.update_cell(dev.key, cols[3], category_display)
+                table.update_cell(dev.key, cols[4], f"{dev.confidence}%")
+                table.update_cell(dev.key, cols[5], dev.last_sni[:25])
+                table.update_cell(dev.key, cols[6], f"{up_kbs:.1f}")
+                table.update_cell(dev.key, cols[7], f"{down_kbs:.1f}")
             else:
-                table.add_row(*row_data, key=dev.mac)
+                table.add_row(*row_data, key=dev.key)
 
         # Update Totals
         self.query_one("#lbl_total_up", Label).update(f"Total Up: {total_up_rate:.1f} KB/s")
@@ -350,6 +358,8 @@ class NetworkApp(App):
         self.scanner.stop()
         self.monitor.running = False
         self.discovery.stop()
+        self.classification.stop()
+        self.retention.stop()
         self.device_store.save_to_file("devices.json")
 
 if __name__ == "__main__":